@@ -0,0 +1,343 @@
+from decimal import Decimal
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from django.conf import settings
+from django.db.models import Sum, Count, F, Min, Max, Window
+from django.db.models.functions import DenseRank
+
+from data_management import archive, sketches
+from data_management.fields import CENT, hour_of
+from data_management.models import PassengerFlow, Station
+
+
+def filtered_flows(start_date=None, end_date=None, station_ids=None, route_ids=None, train_ids=None):
+    """按日期范围与站点/线路/列车构建客运记录查询集"""
+    queryset = PassengerFlow.objects.using(settings.ANALYTICS_DATABASE)
+    if start_date and end_date:
+        queryset = queryset.filter(operation_date__range=[start_date, end_date])
+    if station_ids:
+        queryset = queryset.filter(station_id__in=station_ids)
+    if route_ids:
+        queryset = queryset.filter(route_id__in=route_ids)
+    if train_ids:
+        queryset = queryset.filter(train_id__in=train_ids)
+    return queryset
+
+
+def reader(queryset):
+    """将查询切换到分析只读连接"""
+    return queryset.using(settings.ANALYTICS_DATABASE)
+
+
+def cold_flows(queryset, columns):
+    """查询集条件下的已归档记录（Arrow 表）；没有相关归档或无匹配记录时为 None"""
+    table = archive.scan_queryset(queryset, columns)
+    return table if table is not None and table.num_rows else None
+
+
+def _decimal(value):
+    """归档中的收入为整数分，转换为与数据库聚合结果一致的两位小数"""
+    return None if value is None else Decimal(value) * CENT
+
+
+def _add(hot, cold):
+    """合并可加的聚合值（任一侧为空时取另一侧）"""
+    if hot is None:
+        return cold
+    if cold is None:
+        return hot
+    return hot + cold
+
+
+def sketch_range(queryset, exact=False):
+    """可由每日去重草图回答去重计数时返回日期区间（只按运行日期过滤且未要求 exact），否则返回 None"""
+    return None if exact else sketches.date_range(queryset)
+
+
+def totals(queryset, exact=False):
+    """区间总体指标（含已归档月份）；只按日期过滤时去重计数由每日草图合并，exact 时扫描记录"""
+    sums = dict(
+        passengers_in=Sum('passengers_in'),
+        passengers_out=Sum('passengers_out'),
+        total_revenue=Sum('revenue'),
+        min_date=Min('operation_date'),
+        max_date=Max('operation_date'),
+    )
+    days = sketch_range(queryset, exact)
+    columns = ['operation_date', 'passengers_in', 'passengers_out', 'revenue']
+    cold = cold_flows(queryset, columns if days is not None else [*columns, 'train_id', 'station_id'])
+    if days is not None:
+        result = reader(queryset).aggregate(**sums)
+        counts = sketches.distinct_counts(*days).get(None, sketches.EMPTY)
+        result['train_count'], result['station_count'] = counts.trains, counts.stations
+    elif cold is None:
+        result = reader(queryset).aggregate(
+            **sums,
+            train_count=Count('train', distinct=True),
+            station_count=Count('station', distinct=True),
+        )
+    else:
+        # 去重计数无法相加，分别取冷热两侧的ID集合求并集
+        result = reader(queryset).aggregate(**sums)
+        for key, column in (('train_count', 'train_id'), ('station_count', 'station_id')):
+            hot_ids = set(reader(queryset).order_by().values_list(column, flat=True).distinct())
+            result[key] = len(hot_ids.union(pc.unique(cold[column]).to_pylist()))
+    if cold is not None:
+        result['passengers_in'] = _add(result['passengers_in'], pc.sum(cold['passengers_in']).as_py())
+        result['passengers_out'] = _add(result['passengers_out'], pc.sum(cold['passengers_out']).as_py())
+        result['total_revenue'] = _add(result['total_revenue'], _decimal(pc.sum(cold['revenue']).as_py()))
+        cold_range = pc.min_max(cold['operation_date']).as_py()
+        result['min_date'] = min(filter(None, [result['min_date'], cold_range['min']]))
+        result['max_date'] = max(filter(None, [result['max_date'], cold_range['max']]))
+    passengers_in = result['passengers_in'] or 0
+    passengers_out = result['passengers_out'] or 0
+    return {
+        'total_passengers': passengers_in + passengers_out,
+        'passengers_in': passengers_in,
+        'passengers_out': passengers_out,
+        'total_revenue': float(result['total_revenue'] or 0),
+        'train_count': result['train_count'],
+        'station_count': result['station_count'],
+        'min_date': result['min_date'],
+        'max_date': result['max_date'],
+    }
+
+
+def daily_summary(queryset, exact=False):
+    """按日期分组汇总（含已归档月份）；只按日期过滤时每日去重计数读取草图，exact 时扫描记录"""
+    days = sketch_range(queryset, exact)
+    sums = dict(
+        total_passengers=Sum(F('passengers_in') + F('passengers_out')),
+        total_revenue=Sum('revenue'),
+    )
+    if days is not None:
+        rows = list(reader(queryset).values('operation_date').annotate(**sums).order_by('operation_date'))
+    else:
+        rows = list(reader(queryset).values('operation_date').annotate(
+            **sums,
+            train_count=Count('train', distinct=True),
+            station_count=Count('station', distinct=True)
+        ).annotate(
+            avg_passengers_per_train=F('total_passengers') / F('train_count')
+        ).order_by('operation_date'))
+
+    counted = ['train_id', 'station_id'] if days is None else []
+    cold = cold_flows(queryset, ['operation_date', *counted, 'passengers_in', 'passengers_out', 'revenue'])
+    if cold is not None:
+        rows = _merge_daily(rows, cold, counted, queryset)
+    if days is not None:
+        counts = sketches.distinct_counts(*days, period=lambda day: day)
+        for row in rows:
+            day_counts = counts.get(row['operation_date'], sketches.EMPTY)
+            row['train_count'], row['station_count'] = day_counts.trains, day_counts.stations
+            row['avg_passengers_per_train'] = (
+                None if row['total_passengers'] is None else row['total_passengers'] // (row['train_count'] or 1)
+            )
+    return rows
+
+
+def _merge_daily(rows, cold, counted, queryset):
+    """把归档记录的每日汇总并入数据库结果；counted 为需要去重计数的ID列"""
+    by_date = {row['operation_date']: row for row in rows}
+    grouped = cold.group_by('operation_date').aggregate([
+        ('passengers_in', 'sum'), ('passengers_out', 'sum'), ('revenue', 'sum'),
+        *((column, 'count_distinct') for column in counted),
+    ])
+    # 归档时整月移出，通常同一日期只在一侧；重新导入已归档月份后两侧都有的日期按合并的ID集合去重计数
+    combined = _combined_distinct(
+        queryset, cold, counted, [day for day in grouped['operation_date'].to_pylist() if day in by_date]
+    ) if counted else {}
+    for day, passengers_in, passengers_out, revenue, *distinct in zip(
+        *(grouped[column].to_pylist() for column in (
+            'operation_date', 'passengers_in_sum', 'passengers_out_sum', 'revenue_sum',
+            *(f'{column}_count_distinct' for column in counted),
+        ))
+    ):
+        row = by_date.setdefault(day, {
+            'operation_date': day, 'total_passengers': None, 'total_revenue': None,
+            **({'train_count': 0, 'station_count': 0} if counted else {}),
+        })
+        row['total_passengers'] = _add(row['total_passengers'], passengers_in + passengers_out)
+        row['total_revenue'] = _add(row['total_revenue'], _decimal(revenue))
+        if counted:
+            row['train_count'], row['station_count'] = combined.get(day, distinct)
+            row['avg_passengers_per_train'] = row['total_passengers'] // row['train_count']
+    return [by_date[day] for day in sorted(by_date)]
+
+
+def _combined_distinct(queryset, cold, counted, days):
+    """冷热两侧都有记录的日期，按两侧ID集合的并集去重计数，返回 {日期: [各列的去重数]}"""
+    if not days:
+        return {}
+    ids = {day: [set() for _ in counted] for day in days}
+    in_days = pc.is_in(cold['operation_date'], value_set=pa.array(days, cold['operation_date'].type))
+    cold_rows = zip(*(cold.filter(in_days)[column].to_pylist() for column in ['operation_date', *counted]))
+    hot_rows = reader(queryset).filter(operation_date__in=days).order_by().values_list(
+        'operation_date', *counted).distinct()
+    for rows in (cold_rows, hot_rows):
+        for day, *values in rows:
+            for id_set, value in zip(ids[day], values):
+                id_set.add(value)
+    return {day: [len(id_set - {None}) for id_set in id_sets] for day, id_sets in ids.items()}
+
+
+# 排名指标：接口参数 -> 汇总字段
+RANKING_METRICS = {
+    'total': 'total_passengers',
+    'in': 'passengers_in',
+    'out': 'passengers_out',
+    'revenue': 'total_revenue',
+}
+
+# 排名分组：接口参数 -> (分组字段, 输出的ID字段)
+RANKING_GROUPS = {
+    'station': ('station__id', 'station_id'),
+    'travel_area_id': ('station__travel_area_id', 'travel_area_id'),
+}
+
+
+def station_ranking(queryset, metric='total', limit=None, offset=0, group_by='station'):
+    """按站点（或旅行区）分组汇总并按指标密集排名（含已归档月份）
+
+    没有相关归档时排名（DENSE_RANK 窗口函数）与分页（LIMIT/OFFSET）都在SQL中完成；
+    有归档记录时冷热两侧先合并再排名。指标相同的分组名次相同，同名次内按分组ID排序。
+    """
+    field = RANKING_METRICS[metric]
+    group, key = RANKING_GROUPS[group_by]
+    sums = dict(
+        total_passengers=Sum(F('passengers_in') + F('passengers_out')),
+        passengers_in=Sum('passengers_in'),
+        passengers_out=Sum('passengers_out'),
+        total_revenue=Sum('revenue'),
+    )
+    columns = [group, 'station__name', 'station__telecode'] if group_by == 'station' else [group]
+
+    cold = cold_flows(queryset, ['station_id', 'passengers_in', 'passengers_out', 'revenue'])
+    if cold is None:
+        order = [F(field).desc(nulls_last=True), F(group).asc(nulls_last=True)]
+        group_stats = reader(queryset).values(*columns).annotate(**sums).annotate(
+            ranking=Window(DenseRank(), order_by=F(field).desc(nulls_last=True))
+        ).order_by(*order)
+        group_stats = list(group_stats[offset:offset + limit] if limit else group_stats[offset:])
+    else:
+        hot = reader(queryset).order_by().values(*columns).annotate(**sums)
+        group_stats = _merge_ranking_stats(list(hot), cold, group_by)
+        group_stats.sort(key=lambda stat: (
+            stat[field] is None, -(stat[field] or 0), stat[group] is None, stat[group] or 0,
+        ))
+        ranking, previous = 0, object()
+        for stat in group_stats:
+            if stat[field] != previous:
+                ranking, previous = ranking + 1, stat[field]
+            stat['ranking'] = ranking
+        group_stats = group_stats[offset:offset + limit] if limit else group_stats[offset:]
+
+    ranked_data = []
+    for stat in group_stats:
+        row = {key: stat[group]}
+        if group_by == 'station':
+            row.update(station_name=stat['station__name'], station_telecode=stat['station__telecode'])
+        row.update(
+            total_passengers=stat['total_passengers'] or 0,
+            passengers_in=stat['passengers_in'] or 0,
+            passengers_out=stat['passengers_out'] or 0,
+            total_revenue=stat['total_revenue'] or 0,
+            ranking=stat['ranking'],
+        )
+        ranked_data.append(row)
+    return ranked_data
+
+
+def _merge_ranking_stats(stats, cold, group_by):
+    """把归档记录按站点（或旅行区）的汇总并入数据库结果"""
+    group = RANKING_GROUPS[group_by][0]
+    by_group = {stat[group]: stat for stat in stats}
+    grouped = cold.group_by('station_id').aggregate([
+        ('passengers_in', 'sum'), ('passengers_out', 'sum'), ('revenue', 'sum'),
+    ])
+    cold_rows = list(zip(*(grouped[column].to_pylist() for column in (
+        'station_id', 'passengers_in_sum', 'passengers_out_sum', 'revenue_sum',
+    ))))
+
+    # 冷数据中的站点ID映射为分组键，并补齐数据库结果中没有的分组
+    stations = {
+        station['id']: station
+        for station in Station.objects.using(settings.ANALYTICS_DATABASE).filter(
+            id__in=[station_id for station_id, *_ in cold_rows]
+        ).values('id', 'name', 'telecode', 'travel_area_id')
+    }
+    for station_id, passengers_in, passengers_out, revenue in cold_rows:
+        station = stations.get(station_id)
+        if station is None:
+            continue
+        group_key = station_id if group_by == 'station' else station['travel_area_id']
+        stat = by_group.setdefault(group_key, {
+            group: group_key, 'station__name': station['name'], 'station__telecode': station['telecode'],
+            'total_passengers': None, 'passengers_in': None, 'passengers_out': None, 'total_revenue': None,
+        })
+        stat['passengers_in'] = _add(stat['passengers_in'], passengers_in)
+        stat['passengers_out'] = _add(stat['passengers_out'], passengers_out)
+        stat['total_passengers'] = _add(stat['total_passengers'], passengers_in + passengers_out)
+        stat['total_revenue'] = _add(stat['total_revenue'], _decimal(revenue))
+    return list(by_group.values())
+
+
+def time_distribution(queryset):
+    """按到达小时分组汇总（单次分组查询，含已归档月份）"""
+    hourly = {
+        row['hour']: row
+        for row in reader(queryset).filter(arrival_time__isnull=False).annotate(
+            hour=hour_of('arrival_time')
+        ).values('hour').annotate(
+            total_passengers=Sum(F('passengers_in') + F('passengers_out')),
+            passengers_in=Sum('passengers_in'),
+            passengers_out=Sum('passengers_out'),
+            record_count=Count('id')
+        ).order_by()
+    }
+
+    cold = cold_flows(queryset.filter(arrival_time__isnull=False),
+                      ['arrival_time', 'passengers_in', 'passengers_out'])
+    if cold is not None:
+        _merge_hourly(hourly, cold)
+
+    hourly_stats = []
+    for hour in range(24):
+        row = hourly.get(hour, {})
+        total_passengers = row.get('total_passengers') or 0
+        hourly_stats.append({
+            'hour': hour,
+            'total_passengers': total_passengers,
+            'passengers_in': row.get('passengers_in') or 0,
+            'passengers_out': row.get('passengers_out') or 0,
+            'avg_passengers': total_passengers / (row.get('record_count') or 1),
+            'percentage': 0
+        })
+
+    # 计算百分比
+    total = sum(stat['total_passengers'] for stat in hourly_stats)
+    if total > 0:
+        for stat in hourly_stats:
+            stat['percentage'] = (stat['total_passengers'] / total) * 100
+    return hourly_stats
+
+
+def _merge_hourly(hourly, cold):
+    """把归档记录的小时汇总并入数据库结果"""
+    hours = pc.divide(cold['arrival_time'], 60)
+    grouped = pa.table({
+        'hour': hours, 'passengers_in': cold['passengers_in'], 'passengers_out': cold['passengers_out'],
+    }).group_by('hour').aggregate([
+        ('passengers_in', 'sum'), ('passengers_out', 'sum'), ('passengers_in', 'count'),
+    ])
+    for hour, passengers_in, passengers_out, record_count in zip(*(grouped[column].to_pylist() for column in (
+        'hour', 'passengers_in_sum', 'passengers_out_sum', 'passengers_in_count',
+    ))):
+        row = hourly.setdefault(hour, {
+            'total_passengers': None, 'passengers_in': None, 'passengers_out': None, 'record_count': 0,
+        })
+        row['total_passengers'] = _add(row['total_passengers'], passengers_in + passengers_out)
+        row['passengers_in'] = _add(row['passengers_in'], passengers_in)
+        row['passengers_out'] = _add(row['passengers_out'], passengers_out)
+        row['record_count'] += record_count
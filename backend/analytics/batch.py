@@ -0,0 +1,310 @@
+"""仪表盘批量查询
+
+一次请求携带多个命名子查询，共用同一份过滤条件。规划时先收集子查询依赖的分组扫描：
+按日期×站点汇总、日期×列车去重、到达小时×列车×站点汇总；每种扫描只执行一次，
+与趋势查询一起在分析线程池中并发执行，再由扫描结果派生各子查询的结果。
+已归档月份按相同分组向量化扫描后并入，冷热两侧的分组结果可直接相加。
+"""
+from datetime import time
+
+import pandas as pd
+import pyarrow.compute as pc
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from data_management.fields import hour_of
+from data_management.models import Station
+
+from .aggregates import RANKING_METRICS, cold_flows, filtered_flows, reader
+from .services import TrendAnalysisService
+
+# 列表结果的列（?layout=columnar 时的列名）
+COLUMNS = {
+    'summary': ['operation_date', 'total_passengers', 'total_revenue', 'train_count', 'station_count',
+                'avg_passengers_per_train'],
+    'station_ranking': ['station_id', 'station_name', 'station_telecode', 'total_passengers',
+                        'passengers_in', 'passengers_out', 'total_revenue', 'ranking'],
+    'time_distribution': ['hour', 'total_passengers', 'passengers_in', 'passengers_out',
+                          'avg_passengers', 'percentage'],
+    'flow': ['time_period', 'total_passengers', 'passengers_in', 'passengers_out',
+             'total_revenue', 'train_count', 'station_count', 'avg_passengers_per_train'],
+    'trend': TrendAnalysisService.COLUMNS,
+}
+
+# 客流分析的日期粒度对应的 pandas 周期（周以周一为起始）
+FLOW_PERIODS = {'day': 'D', 'week': 'W-SUN', 'month': 'M', 'quarter': 'Q', 'year': 'Y'}
+
+
+def required_scans(query):
+    """子查询依赖的分组扫描"""
+    kind = query['type']
+    if kind in ('totals', 'summary'):
+        return ('date_station', 'date_train')
+    if kind == 'station_ranking':
+        return ('date_station',)
+    if kind == 'time_distribution':
+        return ('hour',)
+    if kind == 'flow':
+        return ('hour',) if query['granularity'] == 'hour' else ('date_station', 'date_train')
+    return ()
+
+
+def plan(queries):
+    """去重后的扫描列表（按名称排序，保证执行顺序稳定）"""
+    return sorted({scan for query in queries for scan in required_scans(query)})
+
+
+def _frame(records, columns):
+    return pd.DataFrame.from_records(list(records), columns=columns)
+
+
+# 归档数据的分组聚合，输出列与数据库侧一致
+COLD_AGGREGATIONS = {
+    'passengers_in': ('passengers_in', 'sum'),
+    'passengers_out': ('passengers_out', 'sum'),
+    'revenue': ('revenue', 'sum'),
+    'records': ('passengers_in', 'count'),
+}
+
+
+def _combine(hot, cold, keys, columns):
+    """按相同分组汇总归档数据并与数据库结果相加"""
+    if cold is None:
+        return hot
+    grouped = cold.group_by(keys).aggregate([COLD_AGGREGATIONS[column] for column in columns])
+    grouped = grouped.rename_columns(keys + columns).to_pandas()
+    if 'revenue' in columns:
+        # 归档中的收入为整数分
+        grouped['revenue'] = grouped['revenue'] / 100
+    frame = pd.concat([hot, grouped], ignore_index=True)
+    if not columns:
+        return frame.drop_duplicates(keys, ignore_index=True)
+    return frame.groupby(keys, as_index=False, dropna=False)[columns].sum(min_count=1)
+
+
+def scan_date_station(filters):
+    """按日期×站点汇总上下客量、收入与记录数"""
+    queryset = filtered_flows(**filters)
+    columns = ['passengers_in', 'passengers_out', 'revenue', 'records']
+    hot = _frame(
+        reader(queryset).values_list('operation_date', 'station_id').annotate(
+            passengers_in=Sum('passengers_in'),
+            passengers_out=Sum('passengers_out'),
+            revenue=Sum('revenue'),
+            records=Count('id'),
+        ).order_by(),
+        ['operation_date', 'station_id', *columns],
+    )
+    hot['revenue'] = hot['revenue'].astype('float64')
+
+    cold = cold_flows(queryset, ['operation_date', 'station_id', 'passengers_in', 'passengers_out', 'revenue'])
+    return _combine(hot, cold, ['operation_date', 'station_id'], columns)
+
+
+def scan_date_train(filters):
+    """按日期去重的列车（用于各日期及整个区间的列车数）"""
+    queryset = filtered_flows(**filters)
+    hot = _frame(
+        reader(queryset).values_list('operation_date', 'train_id').distinct().order_by(),
+        ['operation_date', 'train_id'],
+    )
+    cold = cold_flows(queryset, ['operation_date', 'train_id'])
+    return _combine(hot, cold, ['operation_date', 'train_id'], [])
+
+
+def scan_hour(filters):
+    """按到达小时×列车×站点汇总（运行图固定时规模约为列车停站数，与日期跨度无关）"""
+    queryset = filtered_flows(**filters)
+    columns = ['passengers_in', 'passengers_out', 'revenue', 'records']
+    hot = _frame(
+        reader(queryset).annotate(
+            hour=hour_of('arrival_time')
+        ).values_list('hour', 'train_id', 'station_id').annotate(
+            passengers_in=Sum('passengers_in'),
+            passengers_out=Sum('passengers_out'),
+            revenue=Sum('revenue'),
+            records=Count('id'),
+        ).order_by(),
+        ['hour', 'train_id', 'station_id', *columns],
+    )
+    hot['revenue'] = hot['revenue'].astype('float64')
+
+    cold = cold_flows(queryset, ['arrival_time', 'train_id', 'station_id',
+                                 'passengers_in', 'passengers_out', 'revenue'])
+    if cold is not None:
+        cold = cold.append_column('hour', pc.divide(cold['arrival_time'].cast('int64'), 60))
+    return _combine(hot, cold, ['hour', 'train_id', 'station_id'], columns)
+
+
+SCANS = {
+    'date_station': scan_date_station,
+    'date_train': scan_date_train,
+    'hour': scan_hour,
+}
+
+
+def run_trend(query, filters):
+    """趋势查询自带上期扫描区间，单独执行"""
+    return TrendAnalysisService(frequency=query['frequency'], compare=query['compare']).get_trend(
+        filters['start_date'], filters['end_date'],
+        station_ids=filters.get('station_ids'),
+        route_ids=filters.get('route_ids'),
+        train_ids=filters.get('train_ids'),
+    )
+
+
+def _records(frame):
+    return frame.to_dict('records')
+
+
+def _revenue(value):
+    return 0.0 if pd.isna(value) else float(value)
+
+
+def derive_totals(scans):
+    by_station, by_train = scans['date_station'], scans['date_train']
+    passengers_in = int(by_station['passengers_in'].sum())
+    passengers_out = int(by_station['passengers_out'].sum())
+    dates = by_station['operation_date']
+    return {
+        'total_passengers': passengers_in + passengers_out,
+        'passengers_in': passengers_in,
+        'passengers_out': passengers_out,
+        'total_revenue': _revenue(by_station['revenue'].sum()),
+        'train_count': by_train['train_id'].nunique(),
+        'station_count': by_station['station_id'].nunique(),
+        'min_date': dates.min() if len(dates) else None,
+        'max_date': dates.max() if len(dates) else None,
+    }
+
+
+def _period_counts(scans, period):
+    """按周期汇总客流并统计去重的列车数、站点数；period 将日期列映射为周期"""
+    by_station = scans['date_station'].assign(period=period(scans['date_station']['operation_date']))
+    by_train = scans['date_train'].assign(period=period(scans['date_train']['operation_date']))
+    grouped = by_station.groupby('period').agg(
+        passengers_in=('passengers_in', 'sum'),
+        passengers_out=('passengers_out', 'sum'),
+        total_revenue=('revenue', 'sum'),
+        records=('records', 'sum'),
+        station_count=('station_id', 'nunique'),
+    )
+    grouped['train_count'] = by_train.groupby('period')['train_id'].nunique()
+    grouped['train_count'] = grouped['train_count'].fillna(0).astype('int64')
+    grouped['total_passengers'] = grouped['passengers_in'] + grouped['passengers_out']
+    return grouped.sort_index()
+
+
+def derive_summary(scans):
+    grouped = _period_counts(scans, lambda dates: dates)
+    grouped['avg_passengers_per_train'] = grouped['total_passengers'] // grouped['train_count'].replace(0, 1)
+    return _records(grouped.rename_axis('operation_date').reset_index()[COLUMNS['summary']])
+
+
+def derive_station_ranking(scans, limit=None, offset=0, metric='total'):
+    """与 aggregates.station_ranking 相同的密集排名：指标降序，同名次按站点ID排序"""
+    grouped = scans['date_station'].groupby('station_id', as_index=False).agg(
+        passengers_in=('passengers_in', 'sum'),
+        passengers_out=('passengers_out', 'sum'),
+        total_revenue=('revenue', 'sum'),
+    )
+    grouped['total_passengers'] = grouped['passengers_in'] + grouped['passengers_out']
+    field = RANKING_METRICS[metric]
+    grouped = grouped.sort_values([field, 'station_id'], ascending=[False, True], kind='stable')
+    grouped['ranking'] = grouped[field].rank(method='dense', ascending=False).astype('int64')
+    grouped = grouped.iloc[offset:offset + limit] if limit else grouped.iloc[offset:]
+
+    stations = {
+        station['id']: station
+        for station in Station.objects.using(settings.ANALYTICS_DATABASE).filter(
+            id__in=grouped['station_id'].tolist()
+        ).values('id', 'name', 'telecode')
+    }
+    ranked_data = []
+    for row in grouped.itertuples(index=False):
+        station = stations.get(row.station_id, {})
+        ranked_data.append({
+            'station_id': row.station_id,
+            'station_name': station.get('name'),
+            'station_telecode': station.get('telecode'),
+            'total_passengers': int(row.total_passengers),
+            'passengers_in': int(row.passengers_in),
+            'passengers_out': int(row.passengers_out),
+            'total_revenue': _revenue(row.total_revenue),
+            'ranking': int(row.ranking),
+        })
+    return ranked_data
+
+
+def derive_time_distribution(scans):
+    by_hour = scans['hour'].dropna(subset=['hour']).groupby('hour')[
+        ['passengers_in', 'passengers_out', 'records']
+    ].sum()
+    total = int(by_hour['passengers_in'].sum() + by_hour['passengers_out'].sum())
+
+    hourly_stats = []
+    for hour in range(24):
+        passengers_in = int(by_hour['passengers_in'].get(hour, 0))
+        passengers_out = int(by_hour['passengers_out'].get(hour, 0))
+        total_passengers = passengers_in + passengers_out
+        hourly_stats.append({
+            'hour': hour,
+            'total_passengers': total_passengers,
+            'passengers_in': passengers_in,
+            'passengers_out': passengers_out,
+            'avg_passengers': total_passengers / (int(by_hour['records'].get(hour, 0)) or 1),
+            'percentage': total_passengers / total * 100 if total else 0,
+        })
+    return hourly_stats
+
+
+def derive_flow(scans, granularity):
+    """与客流分析接口（/api/analytics/flow/）相同的周期汇总"""
+    if granularity == 'hour':
+        frame = scans['hour']
+        grouped = frame.groupby('hour', dropna=False).agg(
+            passengers_in=('passengers_in', 'sum'),
+            passengers_out=('passengers_out', 'sum'),
+            total_revenue=('revenue', 'sum'),
+            records=('records', 'sum'),
+            train_count=('train_id', 'nunique'),
+            station_count=('station_id', 'nunique'),
+        )
+        grouped['total_passengers'] = grouped['passengers_in'] + grouped['passengers_out']
+        # 与 SQL 排序一致：无到达时间的记录排在最前
+        grouped = grouped.sort_index(na_position='first')
+        grouped.index = [None if pd.isna(hour) else time(int(hour)) for hour in grouped.index]
+    else:
+        frequency = FLOW_PERIODS[granularity]
+        grouped = _period_counts(
+            scans,
+            lambda dates: pd.to_datetime(dates).dt.to_period(frequency).dt.start_time.dt.date,
+        )
+
+    grouped['total_revenue'] = grouped['total_revenue'].fillna(0.0)
+    grouped['avg_passengers_per_train'] = grouped['total_passengers'] / grouped['train_count'].replace(0, 1)
+    data = _records(grouped.rename_axis('time_period').reset_index()[COLUMNS['flow']])
+    return {
+        'data': data,
+        'summary': {
+            'total_records': int(grouped['records'].sum()),
+            'time_periods': len(data),
+            'time_granularity': granularity,
+        },
+    }
+
+
+def derive(query, scans):
+    """由扫描结果派生单个子查询的结果"""
+    kind = query['type']
+    if kind == 'totals':
+        return derive_totals(scans)
+    if kind == 'summary':
+        return derive_summary(scans)
+    if kind == 'station_ranking':
+        return derive_station_ranking(scans, query.get('limit'), query['offset'], query['metric'])
+    if kind == 'time_distribution':
+        return derive_time_distribution(scans)
+    if kind == 'flow':
+        return derive_flow(scans, query['granularity'])
+    raise ValueError(f'未知的子查询类型: {kind}')
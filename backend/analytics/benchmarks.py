@@ -0,0 +1,198 @@
+import json
+import platform
+import shutil
+import statistics
+import time
+from pathlib import Path
+
+import django
+from django.db import connection, reset_queries, transaction
+from django.db.models import Max
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+
+from data_management.models import PassengerFlow
+from data_management.services import DataImportService
+from data_management.signals import data_imported
+from data_management.synthetic import SyntheticFlowGenerator, CSV_COLUMNS, CSV_DESCRIPTIONS
+import logging
+
+logger = logging.getLogger(__name__)
+
+# 导入阶段，按 DataImportService.import_all_data 的顺序
+IMPORT_STAGES = ['stations', 'trains', 'routes', 'route_stations', 'passenger_flow']
+
+# 拓扑文件（夹具目录中与生成的客运记录放在一起）
+TOPOLOGY_FILES = ['stations.csv', 'trains.csv', 'route_stations.csv']
+
+
+def endpoint_cases(start_date, end_date):
+    """各分析接口的基准用例：(名称, 方法, 路径, 参数)"""
+    start, end = start_date.isoformat(), end_date.isoformat()
+    return [
+        ('summary', 'get', '/api/passenger-flows/summary/',
+         {'start_date': start, 'end_date': end}),
+        ('station_ranking', 'get', '/api/passenger-flows/station_ranking/',
+         {'start_date': start, 'end_date': end}),
+        ('time_distribution', 'get', '/api/passenger-flows/time_distribution/',
+         {'start_date': start, 'end_date': end}),
+        ('flow_analysis_day', 'post', '/api/analytics/flow/',
+         {'start_date': start, 'end_date': end, 'time_granularity': 'day'}),
+        ('flow_analysis_month', 'post', '/api/analytics/flow/',
+         {'start_date': start, 'end_date': end, 'time_granularity': 'month'}),
+        ('trend_daily', 'get', '/api/analytics/trend/',
+         {'startDate': start, 'endDate': end, 'frequency': 'daily'}),
+        ('overview', 'get', '/api/analytics/overview/',
+         {'startDate': start, 'endDate': end}),
+        ('data_records', 'get', '/api/data/records/',
+         {'page': 2, 'pageSize': 20, 'startDate': start, 'endDate': end}),
+        ('data_stats', 'get', '/api/data/stats/', {}),
+    ]
+
+
+class BenchmarkRunner:
+    """在独立的临时数据库中导入固定规模夹具并测量导入与接口耗时"""
+
+    def __init__(self, rows, seed=42, repeat=5, fixture_dir=None, db_path=None, data_dir=None, stdout=None):
+        self.rows = rows
+        self.seed = seed
+        # 拓扑CSV所在目录，默认 db/
+        self.data_dir = data_dir
+        self.repeat = repeat
+        self.fixture_root = Path(fixture_dir or Path(__file__).parent.parent / 'db' / 'benchmarks')
+        self.db_path = Path(db_path or self.fixture_root / 'benchmark.sqlite3')
+        self.stdout = stdout
+        self.start_date = SyntheticFlowGenerator.DEFAULT_START_DATE
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+        logger.info(message)
+
+    def prepare_fixture(self):
+        """生成（或复用已缓存的）固定规模夹具目录"""
+        fixture_dir = self.fixture_root / f'rows{self.rows}_seed{self.seed}'
+        flow_file = fixture_dir / 'passenger_flow.csv'
+        if flow_file.exists():
+            self.log(f'复用夹具 {fixture_dir}')
+            return fixture_dir
+
+        self.log(f'生成夹具 {fixture_dir} ...')
+        fixture_dir.mkdir(parents=True, exist_ok=True)
+        generator = SyntheticFlowGenerator(data_dir=self.data_dir, seed=self.seed)
+        for name in TOPOLOGY_FILES:
+            shutil.copy(generator.data_dir / name, fixture_dir / name)
+
+        partial = flow_file.with_suffix('.partial')
+        with open(partial, 'w', newline='', encoding='utf-8') as f:
+            f.write(','.join(CSV_COLUMNS) + '\n')
+            f.write(','.join(CSV_DESCRIPTIONS) + '\n')
+            for chunk in generator.generate(self.rows, self.start_date):
+                chunk[CSV_COLUMNS].to_csv(f, header=False, index=False)
+        partial.rename(flow_file)
+        return fixture_dir
+
+    def run(self):
+        """执行完整基准，返回结果字典"""
+        fixture_dir = self.prepare_fixture()
+
+        # 在临时数据库中运行，分析查询也走同一连接
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = str(self.db_path)
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=False)
+        try:
+            with override_settings(ANALYTICS_DATABASE='default'):
+                metrics = {}
+                metrics.update(self.time_import(fixture_dir))
+                metrics.update(self.time_endpoints())
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        return {
+            'meta': {
+                'rows': self.rows,
+                'seed': self.seed,
+                'repeat': self.repeat,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+            },
+            'metrics': metrics,
+        }
+
+    def time_import(self, fixture_dir):
+        """逐阶段计时 DataImportService"""
+        service = DataImportService(data_dir=fixture_dir)
+        metrics = {}
+        for stage in IMPORT_STAGES:
+            started = time.perf_counter()
+            with transaction.atomic():
+                getattr(service, f'import_{stage}')()
+            metrics[f'import.{stage}.seconds'] = time.perf_counter() - started
+            self.log(f'  import.{stage}: {metrics[f"import.{stage}.seconds"]:.2f}s')
+
+        started = time.perf_counter()
+        data_imported.send(sender=DataImportService)
+        metrics['import.derived.seconds'] = time.perf_counter() - started
+        self.log(f'  import.derived: {metrics["import.derived.seconds"]:.2f}s')
+        return metrics
+
+    def time_endpoints(self):
+        """通过 Django 测试客户端计时各接口（取中位数与最小值）"""
+        client = Client()
+        end_date = PassengerFlow.objects.aggregate(max_date=Max('operation_date'))['max_date']
+        metrics = {}
+        for name, method, url, params in endpoint_cases(self.start_date, end_date):
+            request = self._request(client, method, url, params)
+            # queries_log 为定长队列，导入后已写满，需先清空再统计
+            reset_queries()
+            with CaptureQueriesContext(connection) as ctx:
+                request()  # 预热并统计查询数
+            samples = []
+            for _ in range(self.repeat):
+                started = time.perf_counter()
+                response = request()
+                samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f'{name} 返回 {response.status_code}: {response.content[:200]}')
+            metrics[f'endpoint.{name}.median_seconds'] = statistics.median(samples)
+            metrics[f'endpoint.{name}.min_seconds'] = min(samples)
+            metrics[f'endpoint.{name}.queries'] = len(ctx.captured_queries)
+            self.log(f'  endpoint.{name}: median {statistics.median(samples) * 1000:.1f}ms, '
+                     f'{len(ctx.captured_queries)} 条SQL')
+        return metrics
+
+    @staticmethod
+    def _request(client, method, url, params):
+        if method == 'post':
+            return lambda: client.post(url, params, content_type='application/json')
+        return lambda: client.get(url, params)
+
+
+def compare_results(current, baseline, threshold, min_delta=0.0):
+    """对比两次基准结果，返回 (指标, 基准值, 当前值, 比值, 是否退化) 列表
+
+    耗时类指标需同时超过比例阈值与 min_delta 秒才视为退化，避免毫秒级抖动误报。
+    """
+    rows = []
+    for metric, base_value in sorted(baseline['metrics'].items()):
+        value = current['metrics'].get(metric)
+        if value is None or not base_value:
+            continue
+        ratio = value / base_value
+        regressed = ratio > 1 + threshold
+        if metric.endswith('seconds'):
+            regressed = regressed and value - base_value > min_delta
+        rows.append((metric, base_value, value, ratio, regressed))
+    return rows
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,33 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# 分析查询专用的有界线程池，每个工作线程持有各自的数据库连接，
+# 线程数即为分析查询可同时占用的连接数上限
+_executor = ThreadPoolExecutor(
+    max_workers=settings.ANALYTICS_QUERY_WORKERS,
+    thread_name_prefix='analytics-query'
+)
+
+
+def _run_query(func):
+    """在工作线程中执行查询，前后清理失效连接"""
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+async def gather_queries(**queries):
+    """并发执行相互独立的同步查询，按名称返回结果
+
+    queries 的值为无参可调用对象（通常是 functools.partial），
+    查询集必须在可调用对象内部求值。
+    """
+    run = sync_to_async(_run_query, thread_sensitive=False, executor=_executor)
+    results = await asyncio.gather(*(run(func) for func in queries.values()))
+    return dict(zip(queries.keys(), results))
@@ -0,0 +1,185 @@
+"""数据变更推送（server-sent events）
+
+数据导入、接口写入、归档都会递增 data_version 表中对应表的版本，其他进程与管理命令的写入也不例外。
+每个进程只有一个 ChangeFeed：有订阅者时按 EVENTS_POLL_INTERVAL 轮询这张小表，版本变化后只重新计算
+一次全局 KPI，再把变化的表、新版本号与 KPI 增量推送给本进程的全部订阅者。数据库负载与连接的
+客户端数量无关，仪表盘无需轮询重型分析接口。
+
+WSGI（开发服务器）下没有事件循环可共享，每个连接在自己的线程中按同样的间隔轮询。
+"""
+import asyncio
+import contextvars
+import logging
+import time
+
+from django.conf import settings
+
+from data_management.versioning import DATA_TABLES, get_versions
+from railway_backend.renderers import ORJSONRenderer
+
+from . import aggregates
+from .concurrency import gather_queries
+
+logger = logging.getLogger(__name__)
+
+# 这些表变化时重新计算 KPI（列车数、站点数均按客运记录统计）
+KPI_TABLES = {'passenger_flow'}
+KPI_FIELDS = ('total_passengers', 'passengers_in', 'passengers_out', 'total_revenue',
+              'train_count', 'station_count')
+
+# 单个订阅者最多积压的事件数，超出时丢弃最旧的事件（事件中的 KPI 为全量值，丢弃不影响最终状态）
+QUEUE_SIZE = 16
+
+_renderer = ORJSONRenderer()
+
+
+def load_versions():
+    return {table: version for table, (version, _) in get_versions(DATA_TABLES).items()}
+
+
+def compute_kpis():
+    """全部数据（含已归档月份）的总体指标"""
+    result = aggregates.totals(aggregates.filtered_flows())
+    passengers_in = result['passengers_in'] or 0
+    passengers_out = result['passengers_out'] or 0
+    return {
+        'total_passengers': passengers_in + passengers_out,
+        'passengers_in': passengers_in,
+        'passengers_out': passengers_out,
+        'total_revenue': float(result['total_revenue'] or 0),
+        'train_count': result['train_count'],
+        'station_count': result['station_count'],
+        'min_date': result['min_date'],
+        'max_date': result['max_date'],
+    }
+
+
+def kpi_deltas(previous, current):
+    """发生变化的 KPI 的增量"""
+    deltas = {}
+    for key in KPI_FIELDS:
+        if current[key] != previous[key]:
+            deltas[key] = current[key] - previous[key]
+            if isinstance(deltas[key], float):
+                deltas[key] = round(deltas[key], 2)
+    return deltas
+
+
+def snapshot():
+    """订阅时发送的当前状态"""
+    return {'versions': load_versions(), 'kpis': compute_kpis()}
+
+
+def next_change(state):
+    """对比 state 中的版本，有变化时更新 state 并返回变更事件，否则返回 None"""
+    versions = load_versions()
+    changed = sorted(table for table, version in versions.items() if version != state['versions'].get(table))
+    if not changed:
+        return None
+    event = {'tables': changed, 'versions': versions}
+    if KPI_TABLES.intersection(changed):
+        kpis = compute_kpis()
+        event['kpis'] = kpis
+        event['deltas'] = kpi_deltas(state['kpis'], kpis)
+        state['kpis'] = kpis
+    state['versions'] = versions
+    return event
+
+
+def format_event(event, data):
+    return b'event: ' + event.encode() + b'\ndata: ' + _renderer.render(data) + b'\n\n'
+
+
+# 断线后浏览器 EventSource 的重连间隔（毫秒）
+RETRY = b'retry: 3000\n\n'
+KEEPALIVE = b': keepalive\n\n'
+
+
+class ChangeFeed:
+    """进程内的变更广播：第一个订阅者启动轮询任务，最后一个订阅者离开后任务结束"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._task = None
+        self._loop = None
+        self.state = None
+
+    async def subscribe(self):
+        """返回 (事件队列, 当前状态)"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # 事件循环更换（如测试中每次请求新建循环）后，旧循环上的任务与队列均已失效
+            self._subscribers, self._task, self._loop, self.state = set(), None, loop, None
+        if self._task is None or self.state is None:
+            self.state = (await gather_queries(snapshot=snapshot))['snapshot']
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self._subscribers.add(queue)
+        if self._task is None:
+            # 在空白上下文中运行，轮询查询不计入发起订阅的请求的剖析数据
+            self._task = loop.create_task(self._run(), context=contextvars.Context())
+        return queue, dict(self.state)
+
+    def unsubscribe(self, queue):
+        self._subscribers.discard(queue)
+
+    def publish(self, event):
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+                try:
+                    event = (await gather_queries(change=lambda: next_change(self.state)))['change']
+                except Exception:
+                    logger.exception('检查数据版本失败')
+                    continue
+                if event is not None:
+                    self.publish(event)
+        finally:
+            self._task = None
+
+
+feed = ChangeFeed()
+
+
+async def stream_async():
+    """ASGI 下的事件流：订阅进程内的广播"""
+    queue, current = await feed.subscribe()
+    loop = asyncio.get_running_loop()
+    # 流在 EVENTS_STREAM_SECONDS 后结束并由浏览器自动重连，
+    # 断开的客户端（服务器未必通知应用）不会一直占用订阅
+    deadline = loop.time() + settings.EVENTS_STREAM_SECONDS
+    try:
+        yield RETRY + format_event('snapshot', current)
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), timeout=min(settings.EVENTS_KEEPALIVE_SECONDS, remaining)
+                )
+            except asyncio.TimeoutError:
+                yield KEEPALIVE
+            else:
+                yield format_event('change', event)
+    finally:
+        feed.unsubscribe(queue)
+
+
+def stream_sync():
+    """WSGI 下的事件流：在当前线程中轮询"""
+    state = snapshot()
+    deadline = time.monotonic() + settings.EVENTS_STREAM_SECONDS
+    last_sent = time.monotonic()
+    yield RETRY + format_event('snapshot', state)
+    while time.monotonic() < deadline:
+        time.sleep(settings.EVENTS_POLL_INTERVAL)
+        event = next_change(state)
+        if event is not None:
+            last_sent = time.monotonic()
+            yield format_event('change', event)
+        elif time.monotonic() - last_sent >= settings.EVENTS_KEEPALIVE_SECONDS:
+            last_sent = time.monotonic()
+            yield KEEPALIVE
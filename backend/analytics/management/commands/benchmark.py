@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from analytics.benchmarks import BenchmarkRunner, compare_results, load_results, save_results
+from data_management.management.commands.generate_flows import SCALES
+
+
+class Command(BaseCommand):
+    help = '基准测试：在临时数据库中导入固定规模夹具，计时导入各阶段与各分析接口，可与基线对比'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            default='100k',
+            help='夹具客运记录行数，可用预设 100k/1m 或具体数字',
+        )
+        parser.add_argument('--seed', type=int, default=42, help='夹具随机种子')
+        parser.add_argument('--repeat', type=int, default=5, help='每个接口的计时次数')
+        parser.add_argument('--output', default='benchmark.json', help='结果JSON路径')
+        parser.add_argument('--fixture-dir', default=None, help='夹具缓存目录，默认 db/benchmarks/')
+        parser.add_argument('--db-path', default=None, help='临时SQLite数据库路径')
+        parser.add_argument('--data-dir', default=None, help='生成夹具所用的拓扑CSV目录，默认 db/')
+        parser.add_argument('--compare', default=None, help='基线结果JSON，超过阈值即失败')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=0.2,
+            help='允许的退化比例（0.2 表示慢 20%% 以内）',
+        )
+        parser.add_argument(
+            '--min-delta',
+            type=float,
+            default=0.005,
+            help='耗时指标判定退化所需的最小绝对增量（秒）',
+        )
+        parser.add_argument(
+            '--compare-only',
+            default=None,
+            help='不运行基准，直接将该结果JSON与 --compare 基线对比',
+        )
+
+    def handle(self, *args, **options):
+        if options['compare_only']:
+            results = load_results(options['compare_only'])
+        else:
+            rows_option = str(options['rows']).lower()
+            try:
+                rows = SCALES.get(rows_option) or int(rows_option.replace('_', ''))
+            except ValueError as e:
+                raise CommandError(f'参数错误: {e}')
+
+            runner = BenchmarkRunner(
+                rows,
+                seed=options['seed'],
+                repeat=options['repeat'],
+                fixture_dir=options['fixture_dir'],
+                db_path=options['db_path'],
+                data_dir=options['data_dir'],
+                stdout=self.stdout,
+            )
+            results = runner.run()
+            save_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f'基准结果已写入 {options["output"]}'))
+
+        if options['compare']:
+            self.compare(results, load_results(options['compare']), options['threshold'], options['min_delta'])
+
+    def compare(self, results, baseline, threshold, min_delta):
+        """输出对比表，任一指标退化超过阈值时以非零状态退出"""
+        if results['meta'].get('rows') != baseline['meta'].get('rows'):
+            self.stdout.write(self.style.WARNING('注意：两次结果的夹具规模不同'))
+
+        regressions = []
+        for metric, base_value, value, ratio, regressed in compare_results(results, baseline, threshold, min_delta):
+            line = f'{metric:<48} {base_value:>12.4f} {value:>12.4f} {ratio:>7.2f}x'
+            if regressed:
+                regressions.append(metric)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f'{len(regressions)} 项指标退化超过 {threshold:.0%}: {", ".join(regressions)}')
+        self.stdout.write(self.style.SUCCESS('未发现超过阈值的性能退化'))
@@ -0,0 +1,52 @@
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = '对指定接口进行并发压测，输出 p50/p90/p99 延迟（用于对比 WSGI 与 ASGI 部署）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='压测地址，如 http://127.0.0.1:8000/api/analytics/overview/?...')
+        parser.add_argument('--concurrency', type=int, default=16, help='并发客户端数')
+        parser.add_argument('--requests', type=int, default=400, help='总请求数')
+        parser.add_argument('--warmup', type=int, default=10, help='预热请求数（不计入统计）')
+        parser.add_argument('--timeout', type=float, default=60, help='单个请求超时（秒）')
+
+    def handle(self, *args, **options):
+        url = options['url']
+        timeout = options['timeout']
+
+        def fetch(_):
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(url, timeout=timeout) as response:
+                    response.read()
+                    ok = response.status == 200
+            except Exception:
+                ok = False
+            return time.perf_counter() - started, ok
+
+        for _ in range(options['warmup']):
+            fetch(None)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            samples = list(pool.map(fetch, range(options['requests'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = np.array([latency for latency, ok in samples if ok]) * 1000
+        errors = sum(1 for _, ok in samples if not ok)
+        if not len(latencies):
+            self.stdout.write(self.style.ERROR(f'全部 {errors} 个请求失败'))
+            return
+
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+        self.stdout.write(
+            f'请求数: {len(samples)}  并发: {options["concurrency"]}  失败: {errors}\n'
+            f'吞吐量: {len(samples) / elapsed:.1f} req/s\n'
+            f'延迟(ms): p50={p50:.1f}  p90={p90:.1f}  p99={p99:.1f}  max={latencies.max():.1f}'
+        )
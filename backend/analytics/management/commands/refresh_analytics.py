@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from data_management.signals import data_imported
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = '重建派生分析数据（站点角色等）'
+
+    def handle(self, *args, **options):
+        try:
+            self.stdout.write('重建派生分析数据...')
+            data_imported.send(sender=self.__class__)
+            self.stdout.write(self.style.SUCCESS('派生分析数据重建完成'))
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'派生分析数据重建失败: {e}'))
+            logger.exception('派生分析数据重建失败')
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.16 on 2026-10-19 18:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('data_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StationRole',
+            fields=[
+                ('station', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='role', serialize=False, to='data_management.station', verbose_name='站点')),
+                ('role', models.CharField(choices=[('terminal', '始发终到'), ('transfer', '中转'), ('pass_through', '通过')], max_length=20, verbose_name='站点角色')),
+                ('boardings', models.BigIntegerField(default=0, verbose_name='上客量')),
+                ('alightings', models.BigIntegerField(default=0, verbose_name='下客量')),
+                ('route_count', models.IntegerField(default=0, verbose_name='经停线路数')),
+                ('train_count', models.IntegerField(default=0, verbose_name='经停列车数')),
+                ('terminating_share', models.FloatField(default=0, verbose_name='始发终到列车占比')),
+                ('stop_share', models.FloatField(default=0, verbose_name='停靠线路占比')),
+                ('peak_hour', models.IntegerField(blank=True, null=True, verbose_name='高峰小时')),
+                ('hour_concentration', models.FloatField(default=0, verbose_name='小时集中度')),
+                ('busyness_index', models.FloatField(default=0, verbose_name='繁忙指数')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='计算时间')),
+            ],
+            options={
+                'verbose_name': '站点角色',
+                'verbose_name_plural': '站点角色',
+                'db_table': 'station_role',
+                'ordering': ['-busyness_index'],
+                'indexes': [models.Index(fields=['role', '-busyness_index'], name='station_rol_role_3a1e9a_idx'), models.Index(fields=['-busyness_index'], name='station_rol_busynes_0aee42_idx')],
+            },
+        ),
+    ]
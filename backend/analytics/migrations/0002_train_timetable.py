@@ -0,0 +1,67 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0004_passenger_flow_partitioned_manager'),
+        ('analytics', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainStop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stop_index', models.IntegerField(verbose_name='停站序号')),
+                ('route_station_sequence', models.IntegerField(blank=True, null=True, verbose_name='线路站点顺序')),
+                ('arrival_time', models.TimeField(blank=True, null=True, verbose_name='到达时间')),
+                ('departure_time', models.TimeField(blank=True, null=True, verbose_name='出发时间')),
+                ('dwell_seconds', models.IntegerField(blank=True, null=True, verbose_name='停站时间(秒)')),
+                ('section_distance', models.IntegerField(blank=True, null=True, verbose_name='与上一停站距离(公里)')),
+                ('section_seconds', models.IntegerField(blank=True, null=True, verbose_name='区间运行时间(秒)')),
+                ('section_speed', models.FloatField(blank=True, null=True, verbose_name='区间速度(公里/小时)')),
+                ('days_observed', models.IntegerField(default=0, verbose_name='停站天数')),
+                ('station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='data_management.station', verbose_name='站点')),
+                ('train', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timetable_stops', to='data_management.train', verbose_name='列车')),
+            ],
+            options={
+                'verbose_name': '列车停站',
+                'verbose_name_plural': '列车停站',
+                'db_table': 'train_stop',
+                'ordering': ['train', 'stop_index'],
+                'indexes': [models.Index(fields=['station', 'arrival_time'], name='train_stop_station_4539e4_idx'), models.Index(fields=['station', 'departure_time'], name='train_stop_station_c0450b_idx')],
+                'unique_together': {('train', 'stop_index')},
+            },
+        ),
+        migrations.CreateModel(
+            name='TrainSchedule',
+            fields=[
+                ('train', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schedule', serialize=False, to='data_management.train', verbose_name='列车')),
+                ('departure_time', models.TimeField(blank=True, null=True, verbose_name='始发时间')),
+                ('arrival_time', models.TimeField(blank=True, null=True, verbose_name='终到时间')),
+                ('stop_count', models.IntegerField(default=0, verbose_name='停站数')),
+                ('total_distance', models.IntegerField(blank=True, null=True, verbose_name='运行距离(公里)')),
+                ('travel_seconds', models.IntegerField(blank=True, null=True, verbose_name='全程运行时间(秒)')),
+                ('average_speed', models.FloatField(blank=True, null=True, verbose_name='旅行速度(公里/小时)')),
+                ('days_operated', models.IntegerField(default=0, verbose_name='开行天数')),
+                ('first_date', models.DateField(verbose_name='首个运行日期')),
+                ('last_date', models.DateField(verbose_name='最后运行日期')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='计算时间')),
+                ('destination_station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='data_management.station', verbose_name='终到站')),
+                ('origin_station', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='data_management.station', verbose_name='始发站')),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='data_management.route', verbose_name='运营线路')),
+            ],
+            options={
+                'verbose_name': '列车时刻表',
+                'verbose_name_plural': '列车时刻表',
+                'db_table': 'train_schedule',
+                'ordering': ['departure_time', 'train'],
+                'indexes': [models.Index(fields=['departure_time'], name='train_sched_departu_4e6601_idx'), models.Index(fields=['origin_station', 'departure_time'], name='train_sched_origin__06da96_idx'), models.Index(fields=['first_date', 'last_date'], name='train_sched_first_d_bf2457_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0004_passenger_flow_partitioned_manager'),
+        ('analytics', '0002_train_timetable'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('operation_date', models.DateField(verbose_name='运行日期')),
+                ('capacity', models.IntegerField(blank=True, null=True, verbose_name='列车运量')),
+                ('section_count', models.IntegerField(default=0, verbose_name='区间数')),
+                ('boardings', models.BigIntegerField(default=0, verbose_name='上客量')),
+                ('alightings', models.BigIntegerField(default=0, verbose_name='下客量')),
+                ('peak_load', models.IntegerField(default=0, verbose_name='最大在途人数')),
+                ('peak_load_factor', models.FloatField(blank=True, null=True, verbose_name='最大满载率')),
+                ('average_load_factor', models.FloatField(blank=True, null=True, verbose_name='平均满载率')),
+                ('over_capacity_sections', models.IntegerField(default=0, verbose_name='超员区间数')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='计算时间')),
+                ('peak_station', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='data_management.station', verbose_name='最大在途区间起点站')),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='data_management.route', verbose_name='运营线路')),
+                ('train', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancies', to='data_management.train', verbose_name='列车')),
+            ],
+            options={
+                'verbose_name': '列车载客情况',
+                'verbose_name_plural': '列车载客情况',
+                'db_table': 'train_occupancy',
+                'ordering': ['operation_date', 'train'],
+                'indexes': [models.Index(fields=['operation_date'], name='train_occup_operati_994146_idx'), models.Index(fields=['route', 'operation_date'], name='train_occup_route_i_43cb65_idx'), models.Index(fields=['-peak_load_factor'], name='train_occup_peak_lo_f8b2ee_idx')],
+                'unique_together': {('train', 'operation_date')},
+            },
+        ),
+    ]
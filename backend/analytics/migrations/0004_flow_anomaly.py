@@ -0,0 +1,40 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0008_flow_day_sketch'),
+        ('analytics', '0003_train_occupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowAnomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('station', '站点'), ('route', '线路')], max_length=10, verbose_name='序列类型')),
+                ('operation_date', models.DateField(verbose_name='运行日期')),
+                ('kind', models.CharField(choices=[('gap', '数据缺失'), ('spike', '突增'), ('drop', '突降')], max_length=10, verbose_name='异常类型')),
+                ('passengers', models.BigIntegerField(default=0, verbose_name='当日客流')),
+                ('expected', models.FloatField(verbose_name='滚动中位数')),
+                ('robust_score', models.FloatField(verbose_name='滚动稳健z分数')),
+                ('seasonal_expected', models.FloatField(blank=True, null=True, verbose_name='同星期基线')),
+                ('seasonal_score', models.FloatField(blank=True, null=True, verbose_name='同星期稳健z分数')),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='计算时间')),
+                ('route', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='data_management.route', verbose_name='运营线路')),
+                ('station', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='data_management.station', verbose_name='站点')),
+            ],
+            options={
+                'verbose_name': '客流异常',
+                'verbose_name_plural': '客流异常',
+                'db_table': 'flow_anomaly',
+                'ordering': ['-operation_date', 'scope', 'station', 'route'],
+                'indexes': [models.Index(fields=['operation_date'], name='flow_anomal_operati_7625b1_idx'), models.Index(fields=['scope', 'kind', 'operation_date'], name='flow_anomal_scope_67a71f_idx'), models.Index(fields=['station', 'operation_date'], name='flow_anomal_station_6c4c26_idx'), models.Index(fields=['route', 'operation_date'], name='flow_anomal_route_i_0f1a2b_idx')],
+            },
+        ),
+    ]
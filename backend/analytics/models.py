@@ -1,3 +1,202 @@
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+from data_management.models import Route, Station, Train
+
+
+class StationRole(models.Model):
+    """站点角色分类表（导入后批量重建）"""
+    ROLE_TERMINAL = 'terminal'
+    ROLE_TRANSFER = 'transfer'
+    ROLE_PASS_THROUGH = 'pass_through'
+    ROLE_CHOICES = [
+        (ROLE_TERMINAL, '始发终到'),
+        (ROLE_TRANSFER, '中转'),
+        (ROLE_PASS_THROUGH, '通过'),
+    ]
+
+    station = models.OneToOneField(
+        Station,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='role',
+        verbose_name='站点'
+    )
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, verbose_name='站点角色')
+    boardings = models.BigIntegerField(default=0, verbose_name='上客量')
+    alightings = models.BigIntegerField(default=0, verbose_name='下客量')
+    route_count = models.IntegerField(default=0, verbose_name='经停线路数')
+    train_count = models.IntegerField(default=0, verbose_name='经停列车数')
+    terminating_share = models.FloatField(default=0, verbose_name='始发终到列车占比')
+    stop_share = models.FloatField(default=0, verbose_name='停靠线路占比')
+    peak_hour = models.IntegerField(null=True, blank=True, verbose_name='高峰小时')
+    hour_concentration = models.FloatField(default=0, verbose_name='小时集中度')
+    busyness_index = models.FloatField(default=0, verbose_name='繁忙指数')
+    computed_at = models.DateTimeField(default=timezone.now, verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'station_role'
+        verbose_name = '站点角色'
+        verbose_name_plural = '站点角色'
+        indexes = [
+            models.Index(fields=['role', '-busyness_index']),
+            models.Index(fields=['-busyness_index']),
+        ]
+        ordering = ['-busyness_index']
+
+    def __str__(self):
+        return f'{self.station_id}: {self.get_role_display()}'
+
+
+class TrainSchedule(models.Model):
+    """列车时刻表汇总（由客运记录的停站时刻推导，导入后批量重建）"""
+    train = models.OneToOneField(
+        Train,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='schedule',
+        verbose_name='列车'
+    )
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, null=True, blank=True, verbose_name='运营线路')
+    origin_station = models.ForeignKey(
+        Station, on_delete=models.CASCADE, related_name='+', verbose_name='始发站'
+    )
+    destination_station = models.ForeignKey(
+        Station, on_delete=models.CASCADE, related_name='+', verbose_name='终到站'
+    )
+    departure_time = models.TimeField(null=True, blank=True, verbose_name='始发时间')
+    arrival_time = models.TimeField(null=True, blank=True, verbose_name='终到时间')
+    stop_count = models.IntegerField(default=0, verbose_name='停站数')
+    total_distance = models.IntegerField(null=True, blank=True, verbose_name='运行距离(公里)')
+    travel_seconds = models.IntegerField(null=True, blank=True, verbose_name='全程运行时间(秒)')
+    average_speed = models.FloatField(null=True, blank=True, verbose_name='旅行速度(公里/小时)')
+    days_operated = models.IntegerField(default=0, verbose_name='开行天数')
+    first_date = models.DateField(verbose_name='首个运行日期')
+    last_date = models.DateField(verbose_name='最后运行日期')
+    computed_at = models.DateTimeField(default=timezone.now, verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'train_schedule'
+        verbose_name = '列车时刻表'
+        verbose_name_plural = '列车时刻表'
+        indexes = [
+            models.Index(fields=['departure_time']),
+            models.Index(fields=['origin_station', 'departure_time']),
+            models.Index(fields=['first_date', 'last_date']),
+        ]
+        ordering = ['departure_time', 'train']
+
+    def __str__(self):
+        return f'{self.train_id}: {self.origin_station_id} -> {self.destination_station_id}'
+
+
+class TrainStop(models.Model):
+    """列车时刻表停站（规范停站序列，含停站时间、区间运行时分与速度）"""
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='timetable_stops', verbose_name='列车')
+    stop_index = models.IntegerField(verbose_name='停站序号')
+    station = models.ForeignKey(Station, on_delete=models.CASCADE, related_name='+', verbose_name='站点')
+    route_station_sequence = models.IntegerField(null=True, blank=True, verbose_name='线路站点顺序')
+    arrival_time = models.TimeField(null=True, blank=True, verbose_name='到达时间')
+    departure_time = models.TimeField(null=True, blank=True, verbose_name='出发时间')
+    dwell_seconds = models.IntegerField(null=True, blank=True, verbose_name='停站时间(秒)')
+    section_distance = models.IntegerField(null=True, blank=True, verbose_name='与上一停站距离(公里)')
+    section_seconds = models.IntegerField(null=True, blank=True, verbose_name='区间运行时间(秒)')
+    section_speed = models.FloatField(null=True, blank=True, verbose_name='区间速度(公里/小时)')
+    days_observed = models.IntegerField(default=0, verbose_name='停站天数')
+
+    class Meta:
+        db_table = 'train_stop'
+        verbose_name = '列车停站'
+        verbose_name_plural = '列车停站'
+        unique_together = ['train', 'stop_index']
+        indexes = [
+            models.Index(fields=['station', 'arrival_time']),
+            models.Index(fields=['station', 'departure_time']),
+        ]
+        ordering = ['train', 'stop_index']
+
+    def __str__(self):
+        return f'{self.train_id}-{self.stop_index}: {self.station_id}'
+
+
+class TrainOccupancy(models.Model):
+    """列车每个运行日的载客情况（各停站后的在途人数，导入后批量重建）"""
+    train = models.ForeignKey(Train, on_delete=models.CASCADE, related_name='occupancies', verbose_name='列车')
+    operation_date = models.DateField(verbose_name='运行日期')
+    route = models.ForeignKey(Route, on_delete=models.CASCADE, null=True, blank=True, verbose_name='运营线路')
+    capacity = models.IntegerField(null=True, blank=True, verbose_name='列车运量')
+    section_count = models.IntegerField(default=0, verbose_name='区间数')
+    boardings = models.BigIntegerField(default=0, verbose_name='上客量')
+    alightings = models.BigIntegerField(default=0, verbose_name='下客量')
+    peak_load = models.IntegerField(default=0, verbose_name='最大在途人数')
+    peak_station = models.ForeignKey(
+        Station, on_delete=models.SET_NULL, null=True, blank=True, related_name='+', verbose_name='最大在途区间起点站'
+    )
+    peak_load_factor = models.FloatField(null=True, blank=True, verbose_name='最大满载率')
+    average_load_factor = models.FloatField(null=True, blank=True, verbose_name='平均满载率')
+    over_capacity_sections = models.IntegerField(default=0, verbose_name='超员区间数')
+    computed_at = models.DateTimeField(default=timezone.now, verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'train_occupancy'
+        verbose_name = '列车载客情况'
+        verbose_name_plural = '列车载客情况'
+        unique_together = ['train', 'operation_date']
+        indexes = [
+            models.Index(fields=['operation_date']),
+            models.Index(fields=['route', 'operation_date']),
+            models.Index(fields=['-peak_load_factor']),
+        ]
+        ordering = ['operation_date', 'train']
+
+    def __str__(self):
+        return f'{self.train_id} {self.operation_date}: {self.peak_load}/{self.capacity}'
+
+
+class FlowAnomaly(models.Model):
+    """站点/线路日客流异常（滚动中位数/MAD 与同星期基线的稳健 z 分数，批量重算）"""
+    SCOPE_STATION = 'station'
+    SCOPE_ROUTE = 'route'
+    SCOPE_CHOICES = [
+        (SCOPE_STATION, '站点'),
+        (SCOPE_ROUTE, '线路'),
+    ]
+    KIND_GAP = 'gap'
+    KIND_SPIKE = 'spike'
+    KIND_DROP = 'drop'
+    KIND_CHOICES = [
+        (KIND_GAP, '数据缺失'),
+        (KIND_SPIKE, '突增'),
+        (KIND_DROP, '突降'),
+    ]
+
+    scope = models.CharField(max_length=10, choices=SCOPE_CHOICES, verbose_name='序列类型')
+    station = models.ForeignKey(
+        Station, on_delete=models.CASCADE, null=True, blank=True, related_name='+', verbose_name='站点'
+    )
+    route = models.ForeignKey(
+        Route, on_delete=models.CASCADE, null=True, blank=True, related_name='+', verbose_name='运营线路'
+    )
+    operation_date = models.DateField(verbose_name='运行日期')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='异常类型')
+    passengers = models.BigIntegerField(default=0, verbose_name='当日客流')
+    expected = models.FloatField(verbose_name='滚动中位数')
+    robust_score = models.FloatField(verbose_name='滚动稳健z分数')
+    seasonal_expected = models.FloatField(null=True, blank=True, verbose_name='同星期基线')
+    seasonal_score = models.FloatField(null=True, blank=True, verbose_name='同星期稳健z分数')
+    computed_at = models.DateTimeField(default=timezone.now, verbose_name='计算时间')
+
+    class Meta:
+        db_table = 'flow_anomaly'
+        verbose_name = '客流异常'
+        verbose_name_plural = '客流异常'
+        indexes = [
+            models.Index(fields=['operation_date']),
+            models.Index(fields=['scope', 'kind', 'operation_date']),
+            models.Index(fields=['station', 'operation_date']),
+            models.Index(fields=['route', 'operation_date']),
+        ]
+        ordering = ['-operation_date', 'scope', 'station', 'route']
+
+    def __str__(self):
+        return f'{self.scope} {self.station_id or self.route_id} {self.operation_date}: {self.kind}'
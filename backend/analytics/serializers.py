@@ -0,0 +1,229 @@
+from rest_framework import serializers
+from .models import FlowAnomaly, StationRole, TrainOccupancy, TrainSchedule, TrainStop
+
+
+class FlowFilterSerializer(serializers.Serializer):
+    """客流过滤条件序列化器"""
+    start_date = serializers.DateField(required=True)
+    end_date = serializers.DateField(required=True)
+    station_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=True
+    )
+    route_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=True
+    )
+    train_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        allow_empty=True
+    )
+
+    def validate(self, attrs):
+        if attrs['start_date'] > attrs['end_date']:
+            raise serializers.ValidationError('开始日期不能晚于结束日期')
+        return attrs
+
+
+class TrendRequestSerializer(FlowFilterSerializer):
+    """客流趋势请求序列化器"""
+    frequency = serializers.ChoiceField(
+        choices=['hourly', 'daily', 'weekly', 'monthly'],
+        default='daily'
+    )
+    compare = serializers.ChoiceField(
+        choices=['yoy', 'pop'],
+        default='yoy'
+    )
+
+
+class CalendarRequestSerializer(FlowFilterSerializer):
+    """日历属性分组客流请求序列化器"""
+    group_by = serializers.ChoiceField(
+        choices=['weekday', 'dayType', 'holiday', 'holidayPeriod', 'isoWeek', 'month', 'quarter'],
+        default='weekday'
+    )
+
+
+class OverviewRequestSerializer(FlowFilterSerializer):
+    """分析页组合数据请求序列化器"""
+    ranking_limit = serializers.IntegerField(default=20, min_value=1)
+    # 去重计数扫描记录，不使用每日草图
+    exact = serializers.BooleanField(default=False)
+
+
+class BatchQuerySerializer(serializers.Serializer):
+    """批量接口中的单个子查询；各类型只读取与其相关的参数"""
+    name = serializers.CharField(max_length=64)
+    type = serializers.ChoiceField(
+        choices=['totals', 'summary', 'station_ranking', 'time_distribution', 'flow', 'trend']
+    )
+    limit = serializers.IntegerField(required=False, min_value=1)
+    offset = serializers.IntegerField(default=0, min_value=0)
+    metric = serializers.ChoiceField(
+        choices=['total', 'in', 'out', 'revenue'],
+        default='total'
+    )
+    granularity = serializers.ChoiceField(
+        choices=['hour', 'day', 'week', 'month', 'quarter', 'year'],
+        default='day'
+    )
+    frequency = serializers.ChoiceField(
+        choices=['hourly', 'daily', 'weekly', 'monthly'],
+        default='daily'
+    )
+    compare = serializers.ChoiceField(
+        choices=['yoy', 'pop'],
+        default='yoy'
+    )
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    """批量分析请求：共用的过滤条件与命名子查询列表"""
+    filters = FlowFilterSerializer()
+    queries = serializers.ListField(
+        child=BatchQuerySerializer(),
+        min_length=1,
+        max_length=20
+    )
+
+    def validate_queries(self, queries):
+        names = [query['name'] for query in queries]
+        if len(names) != len(set(names)):
+            raise serializers.ValidationError('子查询名称不能重复')
+        return queries
+
+
+class StationRoleSerializer(serializers.ModelSerializer):
+    station_name = serializers.CharField(source='station.name', read_only=True)
+    station_telecode = serializers.CharField(source='station.telecode', read_only=True)
+    role_display = serializers.CharField(source='get_role_display', read_only=True)
+
+    class Meta:
+        model = StationRole
+        fields = '__all__'
+
+
+# 按车次首字母划分的列车类型
+TRAIN_TYPES = {'G': '高速动车组', 'D': '动车组', 'C': '城际动车组', 'Z': '直达特快', 'T': '特快', 'K': '快速'}
+
+
+def _clock(value):
+    return value.strftime('%H:%M') if value is not None else None
+
+
+class TrainStopSerializer(serializers.ModelSerializer):
+    """规范停站序列中的一站（字段名与前端一致）"""
+    stopIndex = serializers.IntegerField(source='stop_index')
+    stationId = serializers.IntegerField(source='station_id')
+    stationName = serializers.CharField(source='station.name')
+    arrivalTime = serializers.SerializerMethodField()
+    departureTime = serializers.SerializerMethodField()
+    dwellSeconds = serializers.IntegerField(source='dwell_seconds')
+    sectionDistance = serializers.IntegerField(source='section_distance')
+    sectionSeconds = serializers.IntegerField(source='section_seconds')
+    sectionSpeed = serializers.FloatField(source='section_speed')
+    daysObserved = serializers.IntegerField(source='days_observed')
+
+    class Meta:
+        model = TrainStop
+        fields = ['stopIndex', 'stationId', 'stationName', 'arrivalTime', 'departureTime', 'dwellSeconds',
+                  'sectionDistance', 'sectionSeconds', 'sectionSpeed', 'daysObserved']
+
+    def get_arrivalTime(self, obj):
+        return _clock(obj.arrival_time)
+
+    def get_departureTime(self, obj):
+        return _clock(obj.departure_time)
+
+
+class TrainScheduleSerializer(serializers.ModelSerializer):
+    """列车时刻表汇总（对应前端 TrainRecord）"""
+    id = serializers.IntegerField(source='train_id')
+    code = serializers.CharField(source='train.code')
+    type = serializers.SerializerMethodField()
+    departureStation = serializers.CharField(source='origin_station.name')
+    arrivalStation = serializers.CharField(source='destination_station.name')
+    departureTime = serializers.SerializerMethodField()
+    arrivalTime = serializers.SerializerMethodField()
+    # 各运行日平均满载率的均值（由视图以子查询标注）
+    occupancy = serializers.SerializerMethodField()
+    status = serializers.SerializerMethodField()
+    statusText = serializers.SerializerMethodField()
+    routeId = serializers.IntegerField(source='route_id')
+    stopCount = serializers.IntegerField(source='stop_count')
+    totalDistance = serializers.IntegerField(source='total_distance')
+    travelMinutes = serializers.SerializerMethodField()
+    averageSpeed = serializers.FloatField(source='average_speed')
+    daysOperated = serializers.IntegerField(source='days_operated')
+    firstDate = serializers.DateField(source='first_date')
+    lastDate = serializers.DateField(source='last_date')
+
+    class Meta:
+        model = TrainSchedule
+        fields = ['id', 'code', 'type', 'departureStation', 'arrivalStation', 'departureTime', 'arrivalTime',
+                  'occupancy', 'status', 'statusText', 'routeId', 'stopCount', 'totalDistance', 'travelMinutes',
+                  'averageSpeed', 'daysOperated', 'firstDate', 'lastDate']
+
+    def get_type(self, obj):
+        return TRAIN_TYPES.get(obj.train.code[:1].upper(), '普通旅客列车')
+
+    def get_departureTime(self, obj):
+        return _clock(obj.departure_time)
+
+    def get_arrivalTime(self, obj):
+        return _clock(obj.arrival_time)
+
+    def get_occupancy(self, obj):
+        occupancy = getattr(obj, 'occupancy', None)
+        return None if occupancy is None else round(occupancy, 4)
+
+    def get_status(self, obj):
+        return 'scheduled'
+
+    def get_statusText(self, obj):
+        return '按图运行'
+
+    def get_travelMinutes(self, obj):
+        return None if obj.travel_seconds is None else round(obj.travel_seconds / 60)
+
+
+class TrainTimetableSerializer(TrainScheduleSerializer):
+    """单趟列车的完整时刻表"""
+    stops = TrainStopSerializer(source='train.timetable_stops', many=True)
+
+    class Meta(TrainScheduleSerializer.Meta):
+        fields = TrainScheduleSerializer.Meta.fields + ['stops']
+
+
+class TrainOccupancySerializer(serializers.ModelSerializer):
+    train_code = serializers.CharField(source='train.code', read_only=True)
+    route_name = serializers.CharField(source='route.name', read_only=True, default=None)
+    peak_station_name = serializers.CharField(source='peak_station.name', read_only=True, default=None)
+
+    class Meta:
+        model = TrainOccupancy
+        fields = '__all__'
+
+
+class FlowAnomalySerializer(serializers.ModelSerializer):
+    station_name = serializers.CharField(source='station.name', read_only=True, default=None)
+    route_name = serializers.CharField(source='route.name', read_only=True, default=None)
+
+    class Meta:
+        model = FlowAnomaly
+        fields = '__all__'
+
+
+class OccupancyRequestSerializer(serializers.Serializer):
+    """载客分布查询参数"""
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('start_date') and attrs.get('end_date') and attrs['start_date'] > attrs['end_date']:
+            raise serializers.ValidationError('开始日期不能晚于结束日期')
+        return attrs
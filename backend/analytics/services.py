@@ -0,0 +1,1102 @@
+import json
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+from datetime import time, timedelta
+from dateutil.relativedelta import relativedelta
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, Exists, F, Max, Min, OuterRef, Q, Sum
+from django.utils import timezone
+from data_management import archive
+from data_management.fields import hour_of, stored
+from data_management.models import CalendarDay, FlowDayCount, Station, RouteStation, PassengerFlow, Train
+from data_management.partitions import flow_source
+from data_management.topology import FLAG_END, FLAG_MUST_STOP, FLAG_START, route_topology
+from data_management.versioning import bump_versions
+from .models import FlowAnomaly, StationRole, TrainOccupancy, TrainSchedule, TrainStop
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class TrendAnalysisService:
+    """客流趋势分析服务（含同比/环比增长率）"""
+
+    # 各频率下的周期起始日期表达式（SQLite 日期函数）
+    PERIOD_EXPRESSIONS = {
+        'hourly': "date({col})",
+        'daily': "date({col})",
+        'weekly': "date({col}, 'weekday 0', '-6 days')",
+        'monthly': "date({col}, 'start of month')",
+    }
+
+    # 同比时上一年对应周期的偏移量，按周对齐时保持星期几不变
+    YOY_SHIFTS = {
+        'hourly': '-1 year',
+        'daily': '-1 year',
+        'weekly': '-364 days',
+        'monthly': '-1 year',
+    }
+
+    # 环比时上一周期的偏移量；按小时统计时与前一日同一小时比较
+    POP_SHIFTS = {
+        'hourly': '-1 day',
+        'daily': '-1 day',
+        'weekly': '-7 days',
+        'monthly': '-1 month',
+    }
+
+    # 结果字段（列式输出的列名）
+    COLUMNS = ['time', 'total', 'inbound', 'outbound', 'previousTotal', 'growthRate']
+
+    def __init__(self, frequency='daily', compare='yoy'):
+        self.frequency = frequency
+        self.compare = compare
+
+    def get_trend(self, start_date, end_date, station_ids=None, route_ids=None, train_ids=None):
+        """计算区间内各周期客流及上期值、增长率（单条SQL完成）"""
+        period_start = self._truncate(start_date)
+        filters, filter_params = self._build_filters(station_ids, route_ids, train_ids)
+        cold_filter = self._cold_filter(station_ids, route_ids, train_ids)
+
+        if self.compare == 'yoy':
+            sql, params = self._yoy_sql(start_date, end_date, period_start, filters, filter_params, cold_filter)
+        else:
+            sql, params = self._pop_sql(start_date, end_date, period_start, filters, filter_params, cold_filter)
+
+        with connections[settings.ANALYTICS_DATABASE].cursor() as cursor:
+            cursor.execute(sql, [p.isoformat() if hasattr(p, 'isoformat') else p for p in params])
+            rows = cursor.fetchall()
+
+        results = []
+        for period, hour, inbound, outbound, previous_total, growth_rate in rows:
+            results.append({
+                'time': f'{period} {hour:02d}:00' if hour is not None else period,
+                'total': (inbound or 0) + (outbound or 0),
+                'inbound': inbound or 0,
+                'outbound': outbound or 0,
+                'previousTotal': previous_total,
+                'growthRate': growth_rate,
+            })
+        return results
+
+    # 趋势查询引用的客运记录列（跨分区子查询只选取这些列）
+    FLOW_COLUMNS = ['operation_date', 'arrival_time', 'passengers_in', 'passengers_out',
+                    'station_id', 'route_id', 'train_id']
+
+    def _grouped_cte(self, where_dates, ranges, cold_filter):
+        """按周期（及小时）分组汇总的公共表表达式（只读取与扫描区间相交的分区）
+
+        扫描区间涉及已归档月份时，归档数据在 Python 中按周期汇总后以 JSON 参数并入，
+        返回 (SQL, 追加在过滤参数之后的参数)。
+        """
+        period = self.PERIOD_EXPRESSIONS[self.frequency].format(col='operation_date')
+        if self.frequency == 'hourly':
+            # 到达时刻为当日分钟数
+            hour = "arrival_time / 60"
+            where_dates = f'({where_dates}) AND arrival_time IS NOT NULL'
+        else:
+            hour = 'NULL'
+            where_dates = f'({where_dates})'
+        grouped = f"""
+                SELECT {period} AS period,
+                       {hour} AS hour,
+                       SUM(passengers_in) AS inbound,
+                       SUM(passengers_out) AS outbound
+                FROM {flow_source(self.FLOW_COLUMNS, ranges, using=settings.ANALYTICS_DATABASE)}
+                WHERE {where_dates} {{filters}}
+                GROUP BY 1, 2
+        """
+        cold_periods = self._cold_periods(ranges, cold_filter)
+        if cold_periods is None:
+            return f'WITH periods AS ({grouped})', []
+        return f"""
+            WITH periods AS (
+                SELECT period, hour, SUM(inbound) AS inbound, SUM(outbound) AS outbound
+                FROM (
+                    {grouped}
+                    UNION ALL
+                    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'),
+                           json_extract(value, '$[2]'), json_extract(value, '$[3]')
+                    FROM json_each(%s)
+                )
+                GROUP BY 1, 2
+            )
+        """, [cold_periods]
+
+    def _cold_periods(self, ranges, cold_filter):
+        """已归档月份在扫描区间内的周期汇总，JSON 数组 [[周期, 小时, 上客量, 下客量], ...]；无归档数据时为 None"""
+        in_range = None
+        for start, end in ranges:
+            condition = (pc.field('operation_date') >= start) & (pc.field('operation_date') <= end)
+            in_range = condition if in_range is None else in_range | condition
+        if self.frequency == 'hourly':
+            in_range = in_range & pc.field('arrival_time').is_valid()
+        expression = in_range if cold_filter is None else in_range & cold_filter
+
+        table = archive.scan(['operation_date', 'arrival_time', 'passengers_in', 'passengers_out'],
+                             expression, ranges)
+        if table is None or not table.num_rows:
+            return None
+
+        keys = ['operation_date']
+        if self.frequency == 'hourly':
+            table = table.append_column('hour', pc.divide(table['arrival_time'].cast('int64'), 60))
+            keys.append('hour')
+        daily = table.group_by(keys).aggregate([('passengers_in', 'sum'), ('passengers_out', 'sum')]).to_pandas()
+
+        days = pd.to_datetime(daily['operation_date'])
+        if self.frequency == 'weekly':
+            days = days - pd.to_timedelta(days.dt.weekday, unit='D')
+        elif self.frequency == 'monthly':
+            days = days - pd.to_timedelta(days.dt.day - 1, unit='D')
+        daily['period'] = days.dt.strftime('%Y-%m-%d')
+        if 'hour' not in daily:
+            daily['hour'] = None
+        periods = daily.groupby(['period', 'hour'], dropna=False)[['passengers_in_sum', 'passengers_out_sum']].sum()
+        return json.dumps([
+            [period, None if pd.isna(hour) else int(hour), int(inbound), int(outbound)]
+            for (period, hour), inbound, outbound in zip(
+                periods.index, periods['passengers_in_sum'], periods['passengers_out_sum'])
+        ])
+
+    def _yoy_sql(self, start_date, end_date, period_start, filters, filter_params, cold_filter=None):
+        """同比：同一趟扫描取本期与上年同期，按截断日期自连接"""
+        prior_range = self._shift_range(start_date, end_date)
+        return self._joined_sql(self.YOY_SHIFTS[self.frequency], prior_range, start_date, end_date,
+                                period_start, filters, filter_params, cold_filter)
+
+    def _pop_sql(self, start_date, end_date, period_start, filters, filter_params, cold_filter=None):
+        """环比：同一趟扫描取本期与上一周期，按上一周期的起始日自连接（缺少记录的周期不会错位）"""
+        prior_range = (self._previous_period_start(period_start), period_start - timedelta(days=1))
+        return self._joined_sql(self.POP_SHIFTS[self.frequency], prior_range, start_date, end_date,
+                                period_start, filters, filter_params, cold_filter)
+
+    def _joined_sql(self, shift, prior_range, start_date, end_date, period_start, filters, filter_params,
+                    cold_filter):
+        """本期只统计 [start_date, end_date] 内的记录，上期为偏移 shift 后的周期"""
+        prior_period = self.PERIOD_EXPRESSIONS[self.frequency].format(col=f"cur.period, '{shift}'")
+        cte, cold_params = self._grouped_cte(
+            'operation_date BETWEEN %s AND %s OR operation_date BETWEEN %s AND %s',
+            [prior_range, (start_date, end_date)],
+            cold_filter,
+        )
+        sql = cte.format(filters=filters) + f"""
+            SELECT cur.period, cur.hour, cur.inbound, cur.outbound,
+                   prev.inbound + prev.outbound AS previous_total,
+                   ROUND(((cur.inbound + cur.outbound) - (prev.inbound + prev.outbound)) * 100.0
+                         / NULLIF(prev.inbound + prev.outbound, 0), 2) AS growth_rate
+            FROM periods cur
+            LEFT JOIN periods prev
+              ON prev.period = {prior_period} AND prev.hour IS cur.hour
+            WHERE cur.period >= %s
+            ORDER BY cur.period, cur.hour
+        """
+        params = [*prior_range, start_date, end_date, *filter_params, *cold_params, period_start]
+        return sql, params
+
+    def _build_filters(self, station_ids, route_ids, train_ids):
+        """构建站点/线路/列车过滤条件"""
+        clauses = []
+        params = []
+        for column, ids in (('station_id', station_ids), ('route_id', route_ids), ('train_id', train_ids)):
+            if ids:
+                clauses.append(f"AND {column} IN ({', '.join(['%s'] * len(ids))})")
+                params.extend(ids)
+        return ' '.join(clauses), params
+
+    def _cold_filter(self, station_ids, route_ids, train_ids):
+        """与 _build_filters 相同条件的归档扫描表达式"""
+        expression = None
+        for column, ids in (('station_id', station_ids), ('route_id', route_ids), ('train_id', train_ids)):
+            if ids:
+                condition = pc.field(column).isin([int(i) for i in ids])
+                expression = condition if expression is None else expression & condition
+        return expression
+
+    def _truncate(self, value):
+        """将日期截断到所在周期的起始日"""
+        if self.frequency == 'weekly':
+            return value - timedelta(days=value.weekday())
+        if self.frequency == 'monthly':
+            return value.replace(day=1)
+        return value
+
+    def _previous_period_start(self, period_start):
+        """上一周期的起始日"""
+        if self.frequency == 'weekly':
+            return period_start - timedelta(weeks=1)
+        if self.frequency == 'monthly':
+            return period_start - relativedelta(months=1)
+        return period_start - timedelta(days=1)
+
+    def _shift_range(self, start_date, end_date):
+        """上年同期的日期区间"""
+        if self.frequency == 'weekly':
+            return start_date - timedelta(days=364), end_date - timedelta(days=364)
+        return start_date - relativedelta(years=1), end_date - relativedelta(years=1)
+
+
+class CalendarAnalysisService:
+    """按日历属性（星期、日期类型、节假日、运输高峰期、ISO 周、月、季度）分组的客流分析
+
+    客运记录先按运行日期汇总，再以运行日期关联 calendar_day 分组；上年同期按日历中的对应日期取值。
+    """
+
+    # 分组方式 -> calendar_day 中的分组列
+    GROUPS = {
+        'weekday': ['weekday'],
+        'dayType': ['day_type'],
+        'holiday': ['holiday'],
+        'holidayPeriod': ['holiday_period'],
+        'isoWeek': ['iso_year', 'iso_week'],
+        'month': ['year', 'month'],
+        'quarter': ['year', 'quarter'],
+    }
+
+    WEEKDAY_NAMES = ['周一', '周二', '周三', '周四', '周五', '周六', '周日']
+
+    # 结果字段（列式输出的列名）
+    COLUMNS = ['group', 'days', 'total', 'inbound', 'outbound', 'revenue', 'averagePerDay',
+               'previousTotal', 'growthRate']
+
+    FLOW_COLUMNS = ['operation_date', 'passengers_in', 'passengers_out', 'revenue',
+                    'station_id', 'route_id', 'train_id']
+
+    def __init__(self, group_by='weekday'):
+        self.group_by = group_by
+
+    def get_groups(self, start_date, end_date, station_ids=None, route_ids=None, train_ids=None):
+        """计算各分组的客流、日均客流及上年同期客流、增长率（单条SQL完成）"""
+        trend = TrendAnalysisService()
+        filters, filter_params = trend._build_filters(station_ids, route_ids, train_ids)
+        cold_filter = trend._cold_filter(station_ids, route_ids, train_ids)
+        prior = CalendarDay.objects.using(settings.ANALYTICS_DATABASE).filter(
+            date__range=(start_date, end_date)
+        ).aggregate(start=Min('prior_year_date'), end=Max('prior_year_date'))
+        ranges = [(start_date, end_date)]
+        if prior['start'] is not None:
+            ranges.insert(0, (prior['start'], prior['end']))
+        where_dates = ' OR '.join(['operation_date BETWEEN %s AND %s'] * len(ranges))
+        range_params = [day for bounds in ranges for day in bounds]
+
+        columns = ', '.join(f'c.{column}' for column in self.GROUPS[self.group_by])
+        daily = f"""
+                SELECT operation_date, SUM(passengers_in) AS inbound, SUM(passengers_out) AS outbound,
+                       SUM(revenue) / 100.0 AS revenue
+                FROM {flow_source(self.FLOW_COLUMNS, ranges, using=settings.ANALYTICS_DATABASE)}
+                WHERE ({where_dates}) {filters}
+                GROUP BY operation_date
+        """
+        cold_days = self._cold_days(ranges, cold_filter)
+        cold_params = []
+        if cold_days is not None:
+            # 重新导入已归档月份后同一日期冷热两侧都有记录，合并后再按日期汇总
+            daily = f"""
+                SELECT operation_date, SUM(inbound) AS inbound, SUM(outbound) AS outbound,
+                       SUM(revenue) AS revenue
+                FROM (
+                    {daily}
+                    UNION ALL
+                    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'),
+                           json_extract(value, '$[2]'), json_extract(value, '$[3]')
+                    FROM json_each(%s)
+                )
+                GROUP BY operation_date
+            """
+            cold_params = [cold_days]
+        sql = f"""
+            WITH daily AS MATERIALIZED ({daily})
+            SELECT {columns}, COUNT(*), SUM(cur.inbound), SUM(cur.outbound), ROUND(SUM(cur.revenue), 2),
+                   SUM(prev.inbound + prev.outbound)
+            FROM daily cur
+            JOIN calendar_day c ON c.date = cur.operation_date
+            LEFT JOIN daily prev ON prev.operation_date = c.prior_year_date
+            WHERE cur.operation_date BETWEEN %s AND %s
+            GROUP BY {columns}
+            ORDER BY {columns}
+        """
+        params = [*range_params, *filter_params, *cold_params, start_date, end_date]
+        with connections[settings.ANALYTICS_DATABASE].cursor() as cursor:
+            cursor.execute(sql, [p.isoformat() if hasattr(p, 'isoformat') else p for p in params])
+            rows = cursor.fetchall()
+
+        width = len(self.GROUPS[self.group_by])
+        results = []
+        for row in rows:
+            days, inbound, outbound, revenue, previous_total = row[width:]
+            total = (inbound or 0) + (outbound or 0)
+            results.append({
+                'group': self._label(row[:width]),
+                'days': days,
+                'total': total,
+                'inbound': inbound or 0,
+                'outbound': outbound or 0,
+                'revenue': revenue or 0,
+                'averagePerDay': round(total / days, 2),
+                'previousTotal': previous_total,
+                'growthRate': round((total - previous_total) * 100 / previous_total, 2)
+                if previous_total else None,
+            })
+        return results
+
+    def _label(self, values):
+        """分组的显示名称"""
+        if self.group_by == 'weekday':
+            return self.WEEKDAY_NAMES[values[0] - 1]
+        if self.group_by == 'dayType':
+            return dict(CalendarDay.DAY_TYPE_CHOICES)[values[0]]
+        if self.group_by == 'holiday':
+            return values[0] or '非节假日'
+        if self.group_by == 'holidayPeriod':
+            return values[0] or '非高峰期'
+        if self.group_by == 'isoWeek':
+            return f'{values[0]}-W{values[1]:02d}'
+        if self.group_by == 'quarter':
+            return f'{values[0]}-Q{values[1]}'
+        return f'{values[0]}-{values[1]:02d}'
+
+    def _cold_days(self, ranges, cold_filter):
+        """已归档月份在扫描区间内的每日汇总，JSON 数组 [[日期, 上客量, 下客量, 收入], ...]；无归档数据时为 None"""
+        in_range = None
+        for start, end in ranges:
+            condition = (pc.field('operation_date') >= start) & (pc.field('operation_date') <= end)
+            in_range = condition if in_range is None else in_range | condition
+        expression = in_range if cold_filter is None else in_range & cold_filter
+        table = archive.scan(['operation_date', 'passengers_in', 'passengers_out', 'revenue'], expression, ranges)
+        if table is None or not table.num_rows:
+            return None
+        daily = table.group_by('operation_date').aggregate([
+            ('passengers_in', 'sum'), ('passengers_out', 'sum'), ('revenue', 'sum'),
+        ])
+        # 归档中的收入为整数分
+        return json.dumps([
+            [day.isoformat(), inbound, outbound, revenue / 100]
+            for day, inbound, outbound, revenue in zip(*(daily[column].to_pylist() for column in (
+                'operation_date', 'passengers_in_sum', 'passengers_out_sum', 'revenue_sum',
+            )))
+        ])
+
+
+class StationRoleService:
+    """站点角色批量分类服务（始发终到/中转/通过 + 繁忙指数）"""
+
+    # 始发终到列车占比达到该阈值视为始发终到站
+    TERMINAL_SHARE_THRESHOLD = 0.5
+    # 经停线路数达到该阈值视为中转站
+    TRANSFER_ROUTE_THRESHOLD = 3
+    # 繁忙指数中客流量与经停线路数的权重
+    FLOW_WEIGHT = 0.7
+    ROUTE_WEIGHT = 0.3
+
+    def rebuild(self):
+        """重新计算全部站点角色并写入 station_role 表"""
+        features = self.compute_features()
+        features['role'] = self.classify(features)
+        features['busyness_index'] = self.busyness_index(features)
+
+        computed_at = timezone.now()
+        roles = [
+            StationRole(
+                station_id=row.station_id,
+                role=row.role,
+                boardings=row.boardings,
+                alightings=row.alightings,
+                route_count=row.route_count,
+                train_count=row.train_count,
+                terminating_share=row.terminating_share,
+                stop_share=row.stop_share,
+                peak_hour=None if pd.isna(row.peak_hour) else int(row.peak_hour),
+                hour_concentration=row.hour_concentration,
+                busyness_index=row.busyness_index,
+                computed_at=computed_at,
+            )
+            for row in features.itertuples(index=False)
+        ]
+
+        with transaction.atomic():
+            StationRole.objects.all().delete()
+            StationRole.objects.bulk_create(roles, batch_size=1000)
+            bump_versions('station_role')
+
+        logger.info(f"站点角色分类完成，共 {len(roles)} 个站点")
+        return len(roles)
+
+    def compute_features(self):
+        """用少量分组查询计算每个站点的特征"""
+        db = settings.ANALYTICS_DATABASE
+        features = pd.DataFrame({'station_id': list(Station.objects.using(db).values_list('id', flat=True))})
+
+        # 线路拓扑特征
+        topology = self._topology_features()
+
+        # 客流特征，始发终到列车以该站是否为所属线路的起终点判断
+        endpoint = RouteStation.objects.filter(
+            route_id=OuterRef('route_id'), station_id=OuterRef('station_id')
+        ).filter(Q(is_start=True) | Q(is_end=True))
+        flow = pd.DataFrame.from_records(
+            PassengerFlow.objects.using(db).values('station_id').annotate(
+                boardings=Sum('passengers_in'),
+                alightings=Sum('passengers_out'),
+                train_count=Count('train', distinct=True),
+                terminating_trains=Count('train', distinct=True, filter=Q(Exists(endpoint))),
+            ),
+            columns=['station_id', 'boardings', 'alightings', 'train_count', 'terminating_trains']
+        )
+
+        # 小时分布
+        hourly = pd.DataFrame.from_records(
+            PassengerFlow.objects.using(db).filter(arrival_time__isnull=False).annotate(
+                hour=hour_of('arrival_time')
+            ).values('station_id', 'hour').annotate(
+                total=Sum(F('passengers_in') + F('passengers_out'))
+            ),
+            columns=['station_id', 'hour', 'total']
+        )
+
+        features = features.merge(topology, on='station_id', how='left')
+        features = features.merge(flow, on='station_id', how='left')
+        features = features.merge(self._hour_features(hourly), on='station_id', how='left')
+
+        counts = ['route_count', 'endpoint_routes', 'stop_routes', 'boardings', 'alightings',
+                  'train_count', 'terminating_trains']
+        features[counts] = features[counts].astype('float64').fillna(0).astype('int64')
+        features['hour_concentration'] = features['hour_concentration'].fillna(0.0)
+
+        route_count = features['route_count'].replace(0, np.nan)
+        train_count = features['train_count'].replace(0, np.nan)
+        # 有客流时按列车计算始发终到占比，否则退化为按线路计算
+        features['terminating_share'] = (
+            (features['terminating_trains'] / train_count)
+            .fillna(features['endpoint_routes'] / route_count)
+            .fillna(0.0)
+        )
+        features['stop_share'] = (features['stop_routes'] / route_count).fillna(0.0)
+        return features
+
+    def _topology_features(self):
+        """由线路拓扑缓存统计各站点的经停线路数、作为起终点的线路数与必停线路数"""
+        routes = [topology for topology in route_topology.routes().values() if len(topology)]
+        station_ids = np.concatenate([t.station_ids for t in routes]) if routes else np.empty(0, np.int32)
+        flags = np.concatenate([t.flags for t in routes]) if routes else np.empty(0, np.uint8)
+        stops = pd.DataFrame({
+            'station_id': station_ids.astype('int64'),
+            'endpoint': (flags & (FLAG_START | FLAG_END)) != 0,
+            'stop': (flags & FLAG_MUST_STOP) != 0,
+        })
+        # 同一线路中站点唯一，每条记录对应一条经停线路
+        return stops.groupby('station_id', as_index=False).agg(
+            route_count=('endpoint', 'size'),
+            endpoint_routes=('endpoint', 'sum'),
+            stop_routes=('stop', 'sum'),
+        )
+
+    def _hour_features(self, hourly):
+        """计算高峰小时与小时集中度（赫芬达尔指数）"""
+        if hourly.empty:
+            return pd.DataFrame({
+                'station_id': pd.Series(dtype='int64'),
+                'peak_hour': pd.Series(dtype='float64'),
+                'hour_concentration': pd.Series(dtype='float64'),
+            })
+
+        hourly = hourly[hourly['total'] > 0]
+        matrix = hourly.pivot_table(index='station_id', columns='hour', values='total', fill_value=0)
+        shares = matrix.div(matrix.sum(axis=1), axis=0)
+        return pd.DataFrame({
+            'station_id': matrix.index,
+            'peak_hour': matrix.idxmax(axis=1).values,
+            'hour_concentration': (shares ** 2).sum(axis=1).values,
+        })
+
+    def classify(self, features):
+        """按特征判定站点角色"""
+        return np.select(
+            [
+                features['terminating_share'] >= self.TERMINAL_SHARE_THRESHOLD,
+                features['route_count'] >= self.TRANSFER_ROUTE_THRESHOLD,
+            ],
+            [StationRole.ROLE_TERMINAL, StationRole.ROLE_TRANSFER],
+            default=StationRole.ROLE_PASS_THROUGH
+        )
+
+    def busyness_index(self, features):
+        """繁忙指数（0-100），综合客流量与经停线路数"""
+        throughput = features['boardings'] + features['alightings']
+        max_throughput = throughput.max() or 1
+        max_routes = features['route_count'].max() or 1
+        return 100 * (
+            self.FLOW_WEIGHT * throughput / max_throughput
+            + self.ROUTE_WEIGHT * features['route_count'] / max_routes
+        )
+
+
+def _seconds(times):
+    """时刻序列（客运记录中的当日分钟数，或 time 对象）转换为当日秒数（空值为 NaN）"""
+    if pd.api.types.is_numeric_dtype(times):
+        return times.astype('float64') * 60
+    return pd.to_timedelta(times.astype('string'), errors='coerce').dt.total_seconds()
+
+
+def _time(seconds):
+    if pd.isna(seconds):
+        return None
+    seconds = int(seconds) % TimetableService.DAY_SECONDS
+    return time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def _optional(value, cast=int):
+    return None if pd.isna(value) else cast(value)
+
+
+class TimetableService:
+    """列车时刻表推导服务：由各运行日的停站记录得到规范停站序列、停站时间、区间运行时分与速度"""
+
+    # 在不少于该比例的开行日停靠的车站计入规范停站序列
+    STOP_SHARE_THRESHOLD = 0.5
+    DAY_SECONDS = 86400
+    VARIANT_KEYS = ['train_id', 'station_id', 'route_id', 'route_station_sequence', 'arrival_time', 'departure_time']
+
+    def rebuild(self):
+        """重新计算全部列车时刻表并写入 train_schedule / train_stop 表"""
+        schedules, stops = self.compute()
+        computed_at = timezone.now()
+        schedule_rows = [
+            TrainSchedule(
+                train_id=row.train_id,
+                route_id=_optional(row.route_id),
+                origin_station_id=row.origin_station_id,
+                destination_station_id=row.destination_station_id,
+                departure_time=_time(row.departure),
+                arrival_time=_time(row.arrival),
+                stop_count=row.stop_count,
+                total_distance=_optional(row.total_distance),
+                travel_seconds=_optional(row.travel_seconds),
+                average_speed=_optional(row.average_speed, float),
+                days_operated=row.days,
+                first_date=row.first_date,
+                last_date=row.last_date,
+                computed_at=computed_at,
+            )
+            for row in schedules.itertuples(index=False)
+        ]
+        stop_rows = [
+            TrainStop(
+                train_id=row.train_id,
+                stop_index=row.stop_index,
+                station_id=row.station_id,
+                route_station_sequence=_optional(row.route_station_sequence),
+                arrival_time=_time(row.arrival),
+                departure_time=_time(row.departure),
+                dwell_seconds=_optional(row.dwell_seconds),
+                section_distance=_optional(row.section_distance),
+                section_seconds=_optional(row.section_seconds),
+                section_speed=_optional(row.section_speed, float),
+                days_observed=row.days_observed,
+            )
+            for row in stops.itertuples(index=False)
+        ]
+
+        with transaction.atomic():
+            TrainStop.objects.all().delete()
+            TrainSchedule.objects.all().delete()
+            TrainSchedule.objects.bulk_create(schedule_rows, batch_size=1000)
+            TrainStop.objects.bulk_create(stop_rows, batch_size=1000)
+            bump_versions('train_schedule', 'train_stop')
+
+        logger.info(f"列车时刻表推导完成，共 {len(schedule_rows)} 趟列车、{len(stop_rows)} 个停站")
+        return len(schedule_rows)
+
+    def _stop_variants(self):
+        """按列车、站点与时刻分组的开行天数（含已归档月份）"""
+        keys = self.VARIANT_KEYS
+        # 时刻取存储的分钟数，与归档数据一致
+        fields = [stored(key) if key.endswith('_time') else key for key in keys]
+        variants = pd.DataFrame.from_records(
+            PassengerFlow.objects.using(settings.ANALYTICS_DATABASE).values_list(*fields).annotate(
+                days=Count('id')
+            ).order_by(),
+            columns=keys + ['days']
+        )
+        cold = archive.scan(keys)
+        if cold is not None and cold.num_rows:
+            grouped = cold.group_by(keys).aggregate([('train_id', 'count')]).to_pandas()
+            variants = pd.concat([variants, grouped.rename(columns={'train_id_count': 'days'})], ignore_index=True)
+            variants = variants.groupby(keys, as_index=False, dropna=False)['days'].sum()
+        return variants
+
+    def _train_days(self):
+        """各列车的开行天数与首末运行日期（含已归档月份）"""
+        trains = pd.DataFrame.from_records(
+            PassengerFlow.objects.using(settings.ANALYTICS_DATABASE).values_list('train_id').annotate(
+                days=Count('operation_date', distinct=True),
+                first_date=Min('operation_date'),
+                last_date=Max('operation_date'),
+            ).order_by(),
+            columns=['train_id', 'days', 'first_date', 'last_date']
+        )
+        cold = archive.scan(['train_id', 'operation_date'])
+        if cold is not None and cold.num_rows:
+            # 冷热两侧的运行日期不重叠，天数可以相加
+            grouped = cold.group_by('train_id').aggregate([
+                ('operation_date', 'count_distinct'), ('operation_date', 'min'), ('operation_date', 'max'),
+            ]).to_pandas().rename(columns={
+                'operation_date_count_distinct': 'days',
+                'operation_date_min': 'first_date',
+                'operation_date_max': 'last_date',
+            })
+            trains = pd.concat([trains, grouped], ignore_index=True).groupby(
+                'train_id', as_index=False
+            ).agg(days=('days', 'sum'), first_date=('first_date', 'min'), last_date=('last_date', 'max'))
+        return trains
+
+    @staticmethod
+    def _route_kilometres():
+        """各线路站点沿线路的累计里程（按与上一站距离累加）"""
+        frames = [
+            pd.DataFrame({
+                'train_route_id': route_id,
+                'station_id': topology.station_ids.astype('int64'),
+                'km': np.cumsum(topology.distances, dtype=np.int64),
+            })
+            for route_id, topology in route_topology.routes().items() if len(topology)
+        ]
+        if not frames:
+            return pd.DataFrame({'train_route_id': pd.Series(dtype='int64'), 'station_id': pd.Series(dtype='int64'),
+                                 'km': pd.Series(dtype='int64')})
+        return pd.concat(frames, ignore_index=True)
+
+    def compute(self):
+        """返回 (列车汇总, 停站明细) 两个 DataFrame"""
+        variants = self._stop_variants()
+        trains = self._train_days()
+        if variants.empty:
+            return pd.DataFrame(columns=[
+                'train_id', 'route_id', 'origin_station_id', 'destination_station_id', 'departure', 'arrival',
+                'stop_count', 'total_distance', 'travel_seconds', 'average_speed', 'days', 'first_date', 'last_date',
+            ]), pd.DataFrame(columns=[
+                'train_id', 'stop_index', 'station_id', 'route_station_sequence', 'arrival', 'departure',
+                'dwell_seconds', 'section_distance', 'section_seconds', 'section_speed', 'days_observed',
+            ])
+
+        variants['arrival'] = _seconds(variants['arrival_time'])
+        variants['departure'] = _seconds(variants['departure_time'])
+
+        # 每个 (列车, 站点) 取开行天数最多的时刻作为规范时刻，停站天数为各时刻天数之和
+        variants = variants.sort_values('days', ascending=False, kind='stable')
+        stops = variants.drop_duplicates(['train_id', 'station_id']).drop(columns=['days'])
+        stops = stops.merge(
+            variants.groupby(['train_id', 'station_id'], as_index=False)['days'].sum().rename(
+                columns={'days': 'days_observed'}),
+            on=['train_id', 'station_id']
+        ).merge(trains[['train_id', 'days']], on='train_id')
+        # 只在少数运行日停靠的车站（临时停站）不计入规范停站序列
+        stops = stops[stops['days_observed'] >= self.STOP_SHARE_THRESHOLD * stops['days']]
+
+        # 列车所属线路取停站天数最多的记录的线路
+        train_routes = stops.loc[stops.groupby('train_id')['days_observed'].idxmax(), ['train_id', 'route_id']]
+        stops = stops.merge(train_routes.rename(columns={'route_id': 'train_route_id'}), on='train_id')
+
+        # 按线路站点顺序排列，顺序缺失时按时刻排列
+        stops['event'] = stops['arrival'].fillna(stops['departure'])
+        stops = stops.sort_values(
+            ['train_id', 'route_station_sequence', 'event'], na_position='last', kind='stable'
+        ).reset_index(drop=True)
+        # 沿线路反向运行的列车：按顺序相邻的两站时刻多数为倒退（跨零点后仍超过半天）
+        step = (stops['event'] - stops.groupby('train_id')['event'].shift()) % self.DAY_SECONDS
+        backward = (step > self.DAY_SECONDS / 2).where(step.notna()).groupby(stops['train_id']).mean() > 0.5
+        stops['direction'] = np.where(stops['train_id'].map(backward), -1, 1)
+        stops['order'] = stops['route_station_sequence'] * stops['direction']
+        stops = stops.sort_values(['train_id', 'order', 'event'], na_position='last', kind='stable').reset_index(
+            drop=True)
+        by_train = stops.groupby('train_id')
+        stops['stop_index'] = by_train.cumcount()
+
+        # 区间运行时间：上一站出发（始发站无到达时间时以到达计）至本站到达，跨零点时加一天
+        previous = by_train['departure'].shift().fillna(by_train['arrival'].shift())
+        stops['section_seconds'] = (stops['event'] - previous) % self.DAY_SECONDS
+        stops['dwell_seconds'] = (stops['departure'] - stops['arrival']) % self.DAY_SECONDS
+
+        stops = stops.merge(self._route_kilometres(), on=['train_route_id', 'station_id'], how='left')
+        stops['section_distance'] = (stops['km'] - stops.groupby('train_id')['km'].shift()).abs()
+        stops['section_speed'] = stops['section_distance'] / stops['section_seconds'].where(
+            stops['section_seconds'] > 0) * 3600
+
+        by_train = stops.groupby('train_id')
+        first = stops[stops['stop_index'] == 0].set_index('train_id')
+        last = by_train.tail(1).set_index('train_id')
+        schedules = pd.DataFrame({
+            'route_id': first['train_route_id'],
+            'origin_station_id': first['station_id'],
+            'destination_station_id': last['station_id'],
+            'departure': first['departure'].fillna(first['arrival']),
+            'arrival': last['arrival'].fillna(last['departure']),
+            'stop_count': by_train.size(),
+            'total_distance': by_train['section_distance'].sum(min_count=1),
+            # 各区间运行时间与中间站停站时间之和（始发站无到达、终到站无出发时间）
+            'travel_seconds': by_train['section_seconds'].sum() + by_train['dwell_seconds'].sum(),
+        })
+        schedules['average_speed'] = schedules['total_distance'] / schedules['travel_seconds'].where(
+            schedules['travel_seconds'] > 0) * 3600
+        schedules = schedules.rename_axis('train_id').reset_index().merge(trains, on='train_id')
+        return schedules, stops
+
+
+class OccupancyService:
+    """列车载客分析服务：按运行日累计上下客得到各停站后的在途人数，与列车运量比较"""
+
+    FLOW_COLUMNS = ['train_id', 'operation_date', 'route_id', 'station_id', 'arrival_time', 'departure_time',
+                    'passengers_in', 'passengers_out']
+    # 最大满载率分布的区间边界
+    LOAD_FACTOR_BINS = [0, 0.5, 0.8, 1.0, 1.2]
+
+    def rebuild(self):
+        """重新计算全部列车运行日的载客情况并写入 train_occupancy 表"""
+        days = self.compute()
+        computed_at = timezone.now()
+        rows = [
+            TrainOccupancy(
+                train_id=row.train_id,
+                operation_date=row.operation_date,
+                route_id=_optional(row.route_id),
+                capacity=_optional(row.capacity),
+                section_count=row.section_count,
+                boardings=row.boardings,
+                alightings=row.alightings,
+                peak_load=row.peak_load,
+                peak_station_id=_optional(row.peak_station_id),
+                peak_load_factor=_optional(row.peak_load_factor, float),
+                average_load_factor=_optional(row.average_load_factor, float),
+                over_capacity_sections=row.over_capacity_sections,
+                computed_at=computed_at,
+            )
+            for row in days.itertuples(index=False)
+        ]
+        with transaction.atomic():
+            TrainOccupancy.objects.all().delete()
+            TrainOccupancy.objects.bulk_create(rows, batch_size=1000)
+            bump_versions('train_occupancy')
+
+        logger.info(f"列车载客情况计算完成，共 {len(rows)} 个列车运行日")
+        return len(rows)
+
+    def _months(self):
+        """有客运记录的各月份 (首日, 末日)，依据每日记录数统计（含已归档月份）"""
+        months = FlowDayCount.objects.using(settings.ANALYTICS_DATABASE).dates('operation_date', 'month')
+        return [(first, first + relativedelta(months=1, days=-1)) for first in months]
+
+    def _flows(self, first, last):
+        """一个月的停站记录（含已归档的部分）"""
+        # 时刻取存储的分钟数，与归档数据一致
+        fields = [stored(column) if column.endswith('_time') else column for column in self.FLOW_COLUMNS]
+        flows = pd.DataFrame.from_records(
+            PassengerFlow.objects.using(settings.ANALYTICS_DATABASE).filter(
+                operation_date__range=(first, last)).values_list(*fields).iterator(chunk_size=50_000),
+            columns=self.FLOW_COLUMNS
+        )
+        cold = archive.scan(
+            self.FLOW_COLUMNS,
+            (pc.field('operation_date') >= first) & (pc.field('operation_date') <= last),
+            [(first, last)],
+        )
+        if cold is not None and cold.num_rows:
+            # 整月已归档时数据库一侧为空
+            flows = pd.concat([cold.to_pandas(), flows], ignore_index=True) if len(flows) else cold.to_pandas()
+        return flows
+
+    def compute(self):
+        """返回每个列车运行日一行的 DataFrame
+
+        列车运行日不跨月，逐月读取停站记录分别计算后合并，内存占用与单月记录数相当。
+        """
+        # 以规范始发时刻为起点计算停站时刻偏移
+        origins = pd.DataFrame.from_records(
+            TrainSchedule.objects.using(settings.ANALYTICS_DATABASE).values_list('train_id', 'departure_time'),
+            columns=['train_id', 'origin_time']
+        )
+        capacities = pd.Series(dict(Train.objects.using(settings.ANALYTICS_DATABASE).values_list('id', 'capacity')))
+        months = []
+        for first, last in self._months():
+            flows = self._flows(first, last)
+            if not flows.empty:
+                months.append(self._train_days(flows, origins, capacities))
+        if not months:
+            return pd.DataFrame(columns=[
+                'train_id', 'operation_date', 'route_id', 'capacity', 'section_count', 'boardings', 'alightings',
+                'peak_load', 'peak_station_id', 'peak_load_factor', 'average_load_factor', 'over_capacity_sections',
+            ])
+        return pd.concat(months, ignore_index=True)
+
+    def _train_days(self, flows, origins, capacities):
+        """一批停站记录（包含各列车运行日的全部停站）的运行日载客指标"""
+        # 按相对始发时刻的偏移排序，跨零点的停站排在当日停站之后
+        flows = flows.merge(origins, on='train_id', how='left')
+        event = _seconds(flows['arrival_time']).fillna(_seconds(flows['departure_time']))
+        flows['offset'] = (event - _seconds(flows['origin_time']).fillna(0)) % TimetableService.DAY_SECONDS
+        flows = flows.sort_values(['train_id', 'operation_date', 'offset'], na_position='last', kind='stable')
+
+        flows['passengers_in'] = flows['passengers_in'].astype('float64').fillna(0).astype('int64')
+        flows['passengers_out'] = flows['passengers_out'].astype('float64').fillna(0).astype('int64')
+        by_day = flows.groupby(['train_id', 'operation_date'], sort=False)
+        # 各停站后的在途人数（记录不完整导致的负值按 0 计）
+        flows['load'] = by_day['passengers_in'].cumsum().sub(by_day['passengers_out'].cumsum()).clip(lower=0)
+        # 终到站之后没有区间
+        sections = flows[by_day.cumcount(ascending=False) > 0]
+
+        sections = sections.assign(capacity=sections['train_id'].map(capacities).where(lambda c: c > 0))
+        sections = sections.assign(over=sections['load'] > sections['capacity'])
+
+        by_section_day = sections.groupby(['train_id', 'operation_date'])
+        peaks = sections.loc[by_section_day['load'].idxmax(), ['train_id', 'operation_date', 'station_id']]
+        days = by_section_day.agg(
+            capacity=('capacity', 'first'),
+            section_count=('load', 'size'),
+            peak_load=('load', 'max'),
+            mean_load=('load', 'mean'),
+            over_capacity_sections=('over', 'sum'),
+        ).reset_index().merge(peaks.rename(columns={'station_id': 'peak_station_id'}),
+                              on=['train_id', 'operation_date'])
+
+        totals = by_day.agg(
+            route_id=('route_id', 'first'),
+            boardings=('passengers_in', 'sum'),
+            alightings=('passengers_out', 'sum'),
+        ).reset_index()
+        # 只有一条停站记录的运行日没有区间，载客指标为空
+        days = totals.merge(days, on=['train_id', 'operation_date'], how='left')
+        days['section_count'] = days['section_count'].fillna(0).astype('int64')
+        days['peak_load'] = days['peak_load'].fillna(0).astype('int64')
+        days['over_capacity_sections'] = days['over_capacity_sections'].fillna(0).astype('int64')
+        days['peak_load_factor'] = days['peak_load'] / days['capacity']
+        days['average_load_factor'] = days['mean_load'] / days['capacity']
+        return days.drop(columns=['mean_load'])
+
+    def distribution(self, group, start_date=None, end_date=None):
+        """按车次（group='train'）或线路（group='route'）汇总运行日载客指标，超员率高的排在前面"""
+        queryset = TrainOccupancy.objects.using(settings.ANALYTICS_DATABASE)
+        if start_date:
+            queryset = queryset.filter(operation_date__gte=start_date)
+        if end_date:
+            queryset = queryset.filter(operation_date__lte=end_date)
+        key, label = ('train_id', 'train__code') if group == 'train' else ('route_id', 'route__name')
+        days = pd.DataFrame.from_records(
+            queryset.values_list(key, label, 'peak_load', 'peak_load_factor', 'average_load_factor',
+                                 'over_capacity_sections'),
+            columns=['id', 'name', 'peak_load', 'peak_load_factor', 'average_load_factor', 'over_capacity_sections']
+        )
+        if days.empty:
+            return []
+
+        days['overloaded'] = days['over_capacity_sections'] > 0
+        days['bin'] = pd.cut(days['peak_load_factor'], self.LOAD_FACTOR_BINS + [np.inf], right=False,
+                             labels=False)
+        by_group = days.groupby(['id', 'name'], dropna=False)
+        summary = by_group.agg(
+            days=('peak_load', 'size'),
+            overloaded_days=('overloaded', 'sum'),
+            average_load_factor=('average_load_factor', 'mean'),
+            median_peak=('peak_load_factor', 'median'),
+            p90_peak=('peak_load_factor', lambda values: values.quantile(0.9)),
+            max_peak=('peak_load_factor', 'max'),
+            max_load=('peak_load', 'max'),
+        )
+        bins = days.groupby(['id', 'name', 'bin'], dropna=False).size().unstack('bin', fill_value=0).reindex(
+            columns=range(len(self.LOAD_FACTOR_BINS)), fill_value=0)
+        summary['overload_rate'] = summary['overloaded_days'] / summary['days']
+        summary = summary.join(bins).reset_index().sort_values(
+            ['overload_rate', 'p90_peak'], ascending=False, kind='stable', na_position='last')
+
+        def rounded(value, digits=4):
+            return None if pd.isna(value) else round(float(value), digits)
+
+        labels = [f'{low:g}-{high:g}' for low, high in zip(self.LOAD_FACTOR_BINS, self.LOAD_FACTOR_BINS[1:])]
+        labels.append(f'>={self.LOAD_FACTOR_BINS[-1]:g}')
+        return [
+            {
+                'id': _optional(row['id']),
+                'name': None if pd.isna(row['name']) else str(row['name']),
+                'days': int(row['days']),
+                'overloadedDays': int(row['overloaded_days']),
+                'overloadRate': rounded(row['overload_rate']),
+                'averageLoadFactor': rounded(row['average_load_factor']),
+                'medianPeakLoadFactor': rounded(row['median_peak']),
+                'p90PeakLoadFactor': rounded(row['p90_peak']),
+                'maxPeakLoadFactor': rounded(row['max_peak']),
+                'maxLoad': int(row['max_load']),
+                'peakLoadFactorDistribution': {label: int(row[index]) for index, label in enumerate(labels)},
+            }
+            for _, row in summary.iterrows()
+        ]
+
+
+def _window_median(windows):
+    """沿最后一维忽略 NaN 的中位数（排序后按有效个数取中间值），返回 (中位数, 有效个数)"""
+    ordered = np.sort(windows, axis=-1)  # NaN 排在最后
+    counts = np.count_nonzero(~np.isnan(windows), axis=-1)
+    low = np.take_along_axis(ordered, np.maximum(counts - 1, 0)[..., None] // 2, axis=-1)[..., 0]
+    high = np.take_along_axis(ordered, (counts // 2)[..., None], axis=-1)[..., 0]
+    median = (low + high) / 2
+    median[counts == 0] = np.nan
+    return median, counts
+
+
+def _shifted(matrix, days):
+    """各序列向后平移 days 天（前面补 NaN）"""
+    shifted = np.full_like(matrix, np.nan)
+    if days < matrix.shape[1]:
+        shifted[:, days:] = matrix[:, :matrix.shape[1] - days]
+    return shifted
+
+
+class AnomalyDetectionService:
+    """客流异常检测服务：各站点、各线路的日客流序列排成矩阵，整体计算稳健 z 分数
+
+    每天的客流与之前 WINDOW_DAYS 天的中位数比较，以 MAD 估计离散程度；同星期基线取之前 SEASONAL_WEEKS 周
+    同一星期几的中位数与 MAD。两个分数同时越过阈值（同星期历史不足时只看滚动分数）记为突增/突降；
+    有历史客流的序列某个有数据的日期客流为 0 记为数据缺失。全局没有任何记录的日期不参与计算。
+    """
+
+    SCOPES = {FlowAnomaly.SCOPE_STATION: 'station_id', FlowAnomaly.SCOPE_ROUTE: 'route_id'}
+    WINDOW_DAYS = 28
+    SEASONAL_WEEKS = 8
+    # 窗口内至少需要的有效天数
+    MIN_HISTORY = 7
+    MIN_SEASONAL_HISTORY = 3
+    THRESHOLD = 3.5
+    # MAD 换算为正态分布标准差的系数；离散程度下限（基线的比例、绝对人数），避免平稳序列的微小波动被放大
+    MAD_SCALE = 1.4826
+    MIN_RELATIVE_SCALE = 0.1
+    MIN_SCALE = 1.0
+    # 每批计算的序列数（限制滑动窗口数组的内存）
+    BLOCK_SERIES = 256
+
+    def rebuild(self, progress=None):
+        """重新检测全部站点与线路序列，替换 flow_anomaly 表；返回 {序列类型: 异常数}"""
+        computed_at = timezone.now()
+        rows, counts = [], {}
+        for index, scope in enumerate(self.SCOPES):
+            if progress:
+                progress(index / len(self.SCOPES), f'检测{dict(FlowAnomaly.SCOPE_CHOICES)[scope]}客流异常')
+            anomalies = self.detect(scope)
+            counts[scope] = len(anomalies)
+            rows += [
+                FlowAnomaly(
+                    scope=scope,
+                    station_id=int(row.entity_id) if scope == FlowAnomaly.SCOPE_STATION else None,
+                    route_id=int(row.entity_id) if scope == FlowAnomaly.SCOPE_ROUTE else None,
+                    operation_date=row.operation_date,
+                    kind=row.kind,
+                    passengers=int(row.passengers),
+                    expected=float(row.expected),
+                    robust_score=float(row.robust_score),
+                    seasonal_expected=_optional(row.seasonal_expected, float),
+                    seasonal_score=_optional(row.seasonal_score, float),
+                    computed_at=computed_at,
+                )
+                for row in anomalies.itertuples(index=False)
+            ]
+        with transaction.atomic():
+            FlowAnomaly.objects.all().delete()
+            FlowAnomaly.objects.bulk_create(rows, batch_size=1000)
+            bump_versions('flow_anomaly')
+
+        logger.info(f"客流异常检测完成: {counts}")
+        return counts
+
+    def daily_matrix(self, scope):
+        """返回 (序列ID数组, 日期数组, 客流矩阵)：矩阵每行一个序列、每列一天（首个记录日期至最后一天连续）
+
+        全局没有记录的日期与序列首次出现之前为 NaN，序列出现后没有记录的日期为 0。
+        """
+        column = self.SCOPES[scope]
+        frame = pd.DataFrame.from_records(
+            PassengerFlow.objects.using(settings.ANALYTICS_DATABASE).order_by().values(
+                column, 'operation_date').annotate(total=Sum(F('passengers_in') + F('passengers_out'))).values_list(
+                column, 'operation_date', 'total'),
+            columns=['entity_id', 'operation_date', 'total'],
+        )
+        cold = archive.scan([column, 'operation_date', 'passengers_in', 'passengers_out'])
+        if cold is not None and cold.num_rows:
+            cold = cold.append_column('total', pc.add(pc.fill_null(cold['passengers_in'], 0),
+                                                      pc.fill_null(cold['passengers_out'], 0)))
+            grouped = cold.group_by([column, 'operation_date']).aggregate([('total', 'sum')])
+            frame = pd.concat([frame, pd.DataFrame({
+                'entity_id': grouped[column].to_numpy(zero_copy_only=False),
+                'operation_date': grouped['operation_date'].to_pylist(),
+                'total': grouped['total_sum'].to_numpy(zero_copy_only=False),
+            })], ignore_index=True)
+        frame = frame.dropna(subset=['entity_id'])
+        if frame.empty:
+            return np.array([], dtype=np.int64), np.array([], dtype='datetime64[D]'), np.empty((0, 0))
+
+        dates = pd.to_datetime(frame['operation_date']).to_numpy().astype('datetime64[D]')
+        first = dates.min()
+        days = np.arange(first, dates.max() + 1)
+        day_index = (dates - first).astype(np.int64)
+        entity_ids, entity_index = np.unique(frame['entity_id'].to_numpy(dtype=np.int64), return_inverse=True)
+
+        matrix = np.zeros((len(entity_ids), len(days)))
+        np.add.at(matrix, (entity_index, day_index), frame['total'].to_numpy(dtype=np.float64))
+        observed = np.zeros(len(days), dtype=bool)
+        observed[day_index] = True
+        starts = np.full(len(entity_ids), len(days))
+        np.minimum.at(starts, entity_index, day_index)
+        matrix[np.arange(len(days)) < starts[:, None]] = np.nan
+        matrix[:, ~observed] = np.nan
+        return entity_ids, days, matrix
+
+    def _robust_scores(self, matrix, windows, min_history):
+        """各格相对窗口（序列×天×窗口长度）的中位数与稳健 z 分数；历史不足时为 NaN"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            median, counts = _window_median(windows)
+            mad, _ = _window_median(np.abs(windows - median[..., None]))
+            scale = np.maximum.reduce([
+                self.MAD_SCALE * mad, self.MIN_RELATIVE_SCALE * np.abs(median), np.full_like(mad, self.MIN_SCALE),
+            ])
+            scores = (matrix - median) / scale
+        enough = counts >= min_history
+        return np.where(enough, median, np.nan), np.where(enough, scores, np.nan)
+
+    def score(self, matrix):
+        """返回 (滚动中位数, 滚动z分数, 同星期基线, 同星期z分数) 四个与 matrix 同形的矩阵"""
+        results = [np.full_like(matrix, np.nan) for _ in range(4)]
+        for start in range(0, len(matrix), self.BLOCK_SERIES):
+            block = matrix[start:start + self.BLOCK_SERIES]
+            # 之前 WINDOW_DAYS 天（不含当天）的滑动窗口
+            padded = np.concatenate([np.full((len(block), self.WINDOW_DAYS), np.nan), block], axis=1)
+            windows = np.lib.stride_tricks.sliding_window_view(padded, self.WINDOW_DAYS, axis=1)[:, :block.shape[1]]
+            expected, robust = self._robust_scores(block, windows, self.MIN_HISTORY)
+            # 之前各周同一星期几
+            seasonal_windows = np.stack(
+                [_shifted(block, 7 * week) for week in range(1, self.SEASONAL_WEEKS + 1)], axis=-1)
+            seasonal_expected, seasonal = self._robust_scores(block, seasonal_windows, self.MIN_SEASONAL_HISTORY)
+            for result, values in zip(results, (expected, robust, seasonal_expected, seasonal)):
+                result[start:start + self.BLOCK_SERIES] = values
+        return results
+
+    def detect(self, scope):
+        """检测一种序列的异常，返回每个异常一行的 DataFrame"""
+        entity_ids, days, matrix = self.daily_matrix(scope)
+        columns = ['entity_id', 'operation_date', 'kind', 'passengers', 'expected', 'robust_score',
+                   'seasonal_expected', 'seasonal_score']
+        if not matrix.size:
+            return pd.DataFrame(columns=columns)
+
+        expected, robust, seasonal_expected, seasonal = self.score(matrix)
+        with np.errstate(invalid='ignore'):
+            gap = (matrix == 0) & (expected > 0)
+            outlier = (np.abs(robust) >= self.THRESHOLD) & (np.isnan(seasonal) | (np.abs(seasonal) >= self.THRESHOLD))
+        rows, cols = np.nonzero(gap | outlier)
+        kinds = np.where(gap[rows, cols], FlowAnomaly.KIND_GAP,
+                         np.where(robust[rows, cols] > 0, FlowAnomaly.KIND_SPIKE, FlowAnomaly.KIND_DROP))
+        return pd.DataFrame({
+            'entity_id': entity_ids[rows],
+            'operation_date': days[cols].astype(object),
+            'kind': kinds,
+            'passengers': matrix[rows, cols].astype(np.int64),
+            'expected': expected[rows, cols],
+            'robust_score': robust[rows, cols],
+            'seasonal_expected': seasonal_expected[rows, cols],
+            'seasonal_score': seasonal[rows, cols],
+        }, columns=columns)
@@ -0,0 +1,33 @@
+from django.dispatch import receiver
+
+from data_management.signals import data_imported
+from railway_backend.metrics import IMPORT_DURATION
+from .services import AnomalyDetectionService, OccupancyService, StationRoleService, TimetableService
+
+
+@receiver(data_imported)
+def rebuild_station_roles(sender, **kwargs):
+    """数据导入后重建站点角色表"""
+    with IMPORT_DURATION.time(job='station_roles'):
+        StationRoleService().rebuild()
+
+
+@receiver(data_imported)
+def rebuild_timetables(sender, **kwargs):
+    """数据导入后重新推导列车时刻表"""
+    with IMPORT_DURATION.time(job='timetables'):
+        TimetableService().rebuild()
+
+
+@receiver(data_imported)
+def rebuild_occupancies(sender, **kwargs):
+    """数据导入后重新计算列车载客情况（在时刻表之后执行，停站按规范始发时刻排序）"""
+    with IMPORT_DURATION.time(job='occupancies'):
+        OccupancyService().rebuild()
+
+
+@receiver(data_imported)
+def rebuild_anomalies(sender, **kwargs):
+    """数据导入后重新检测站点与线路的日客流异常"""
+    with IMPORT_DURATION.time(job='anomalies'):
+        AnomalyDetectionService().rebuild()
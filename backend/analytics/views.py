@@ -1,3 +1,329 @@
-from django.shortcuts import render
+import json
+from functools import partial
 
-# Create your views here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Avg, OuterRef, Prefetch, Subquery
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import viewsets, filters, status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from django_filters.rest_framework import DjangoFilterBackend
+
+from data_management.versioning import ConditionalGetMixin, not_modified_response, set_validators, validators
+from railway_backend.renderers import COLUMNAR_LAYOUT, ORJSONRenderer, is_columnar, to_columnar
+
+from . import aggregates, batch, events
+from .concurrency import gather_queries
+from .models import FlowAnomaly, StationRole, TrainOccupancy, TrainSchedule, TrainStop
+from .serializers import (
+    TrendRequestSerializer, CalendarRequestSerializer, OverviewRequestSerializer, BatchRequestSerializer, StationRoleSerializer,
+    TrainScheduleSerializer, TrainTimetableSerializer, TrainOccupancySerializer, OccupancyRequestSerializer,
+    FlowAnomalySerializer
+)
+from .services import CalendarAnalysisService, OccupancyService, TrendAnalysisService
+
+
+def flow_filter_params(params):
+    """将前端查询参数映射为过滤条件字段"""
+    return {
+        'start_date': params.get('startDate'),
+        'end_date': params.get('endDate'),
+        'station_ids': params.getlist('stationIds[]'),
+        'route_ids': params.getlist('lineIds[]'),
+        'train_ids': params.getlist('trainIds[]'),
+    }
+
+
+def _evaluate(func, filters):
+    """在查询线程中构建查询集并求值"""
+    return func(aggregates.filtered_flows(**filters))
+
+
+# 客流聚合类分析接口依赖的数据表
+FLOW_TABLES = ['passenger_flow', 'station']
+
+
+class TrendAnalysisView(ConditionalGetMixin, APIView):
+    """客流趋势视图（同比/环比增长率随结果返回）"""
+    data_tables = FLOW_TABLES
+
+    def get(self, request):
+        """获取各周期客流及增长率"""
+        params = request.query_params
+        serializer = TrendRequestSerializer(data={
+            **flow_filter_params(params),
+            'frequency': params.get('frequency', 'daily'),
+            'compare': params.get('compare', 'yoy'),
+        })
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        service = TrendAnalysisService(frequency=data['frequency'], compare=data['compare'])
+        results = service.get_trend(
+            data['start_date'],
+            data['end_date'],
+            station_ids=data.get('station_ids'),
+            route_ids=data.get('route_ids'),
+            train_ids=data.get('train_ids'),
+        )
+        if is_columnar(request):
+            return Response(to_columnar(results, TrendAnalysisService.COLUMNS))
+        return Response(results)
+
+
+class CalendarAnalysisView(ConditionalGetMixin, APIView):
+    """按日历属性（星期、节假日、运输高峰期等）分组的客流视图"""
+    data_tables = FLOW_TABLES + ['calendar_day']
+
+    def get(self, request):
+        """获取各分组客流、日均客流及上年同期增长率"""
+        params = request.query_params
+        serializer = CalendarRequestSerializer(data={
+            **flow_filter_params(params),
+            'group_by': params.get('groupBy', 'weekday'),
+        })
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        results = CalendarAnalysisService(group_by=data['group_by']).get_groups(
+            data['start_date'],
+            data['end_date'],
+            station_ids=data.get('station_ids'),
+            route_ids=data.get('route_ids'),
+            train_ids=data.get('train_ids'),
+        )
+        if is_columnar(request):
+            return Response(to_columnar(results, CalendarAnalysisService.COLUMNS))
+        return Response(results)
+
+
+class AnalyticsOverviewView(View):
+    """分析页组合数据视图（异步，独立聚合并发执行）"""
+
+    async def get(self, request):
+        """一次返回总体指标、日汇总、站点排名与小时分布"""
+        params = request.GET
+        serializer = OverviewRequestSerializer(data={
+            **flow_filter_params(params),
+            'ranking_limit': params.get('rankingLimit', 20),
+            'exact': params.get('exact', False),
+        })
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        etag, last_modified = await sync_to_async(validators)(request, FLOW_TABLES)
+        response = not_modified_response(request, etag, last_modified)
+        if response is not None:
+            return set_validators(response, etag, last_modified)
+
+        data = serializer.validated_data
+        ranking_limit = data.pop('ranking_limit')
+        exact = data.pop('exact')
+        results = await gather_queries(
+            totals=partial(_evaluate, partial(aggregates.totals, exact=exact), data),
+            summary=partial(_evaluate, partial(aggregates.daily_summary, exact=exact), data),
+            station_ranking=partial(_evaluate, partial(aggregates.station_ranking, limit=ranking_limit), data),
+            time_distribution=partial(_evaluate, aggregates.time_distribution, data),
+        )
+        return set_validators(JsonResponse(results, encoder=DjangoJSONEncoder), etag, last_modified)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class BatchAnalyticsView(View):
+    """批量分析视图（异步）：一次请求返回仪表盘所需的多个子查询结果
+
+    共用过滤条件的子查询按所需的分组扫描合并规划，每种扫描只执行一次；
+    扫描与趋势查询并发执行，子查询结果由扫描结果派生。
+    """
+
+    async def post(self, request):
+        try:
+            body = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({'error': '请求体不是有效的JSON'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = BatchRequestSerializer(data=body)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        filters = serializer.validated_data['filters']
+        queries = serializer.validated_data['queries']
+        trends = [query for query in queries if query['type'] == 'trend']
+
+        # 第一阶段：去重后的扫描与趋势查询并发执行
+        stage = await gather_queries(
+            **{f'scan:{name}': partial(batch.SCANS[name], filters) for name in batch.plan(queries)},
+            **{f'trend:{query["name"]}': partial(batch.run_trend, query, filters) for query in trends},
+        )
+        scans = {key[len('scan:'):]: value for key, value in stage.items() if key.startswith('scan:')}
+
+        # 第二阶段：由扫描结果派生其余子查询
+        derived = await gather_queries(**{
+            query['name']: partial(batch.derive, query, scans)
+            for query in queries if query['type'] != 'trend'
+        })
+
+        columnar = request.GET.get('layout') == COLUMNAR_LAYOUT
+        results = {}
+        for query in queries:
+            name, kind = query['name'], query['type']
+            result = stage[f'trend:{name}'] if kind == 'trend' else derived[name]
+            if columnar and kind in batch.COLUMNS:
+                if kind == 'flow':
+                    result = {**result, 'data': to_columnar(result['data'], batch.COLUMNS[kind])}
+                else:
+                    result = to_columnar(result, batch.COLUMNS[kind])
+            results[name] = result
+        return HttpResponse(ORJSONRenderer().render({'results': results}), content_type='application/json')
+
+
+class DataEventsView(View):
+    """数据变更事件流（text/event-stream）
+
+    连接后先发送 snapshot（各表版本与全局 KPI），之后每当数据变化发送 change 事件：
+    变化的表、新版本号，以及客运数据变化时的最新 KPI 与增量。
+    """
+
+    async def get(self, request):
+        stream = events.stream_async() if isinstance(request, ASGIRequest) else events.stream_sync()
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # 禁止反向代理（如 nginx）缓冲事件
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class StationRoleViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """站点角色视图集（读取预计算结果）"""
+    data_tables = ['station_role', 'station']
+    queryset = StationRole.objects.using(settings.ANALYTICS_DATABASE).select_related('station')
+    serializer_class = StationRoleSerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['role']
+    ordering_fields = ['busyness_index', 'boardings', 'alightings', 'route_count', 'hour_concentration']
+    ordering = ['-busyness_index']
+
+
+class TrainTimetablePagination(PageNumberPagination):
+    """列车列表分页（响应格式与前端 getRecentTrains 一致）"""
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_paginated_response(self, data):
+        return Response({
+            'data': data,
+            'total': self.page.paginator.count,
+            'page': self.page.number,
+            'pageSize': self.page.paginator.per_page,
+            'totalPages': self.page.paginator.num_pages,
+        })
+
+
+class TrainTimetableViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """列车时刻表视图集（读取预计算的规范停站序列与区间运行时分）"""
+    data_tables = ['train_schedule', 'train_stop', 'train_occupancy', 'train', 'station']
+    queryset = TrainSchedule.objects.using(settings.ANALYTICS_DATABASE).select_related(
+        'train', 'origin_station', 'destination_station'
+    )
+    serializer_class = TrainScheduleSerializer
+    pagination_class = TrainTimetablePagination
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['departure_time', 'arrival_time', 'travel_seconds', 'average_speed', 'total_distance',
+                       'stop_count', 'days_operated']
+    ordering = ['departure_time', 'train']
+
+    def get_queryset(self):
+        params = self.request.query_params
+        occupancies = TrainOccupancy.objects.using(settings.ANALYTICS_DATABASE).filter(train=OuterRef('train'))
+        if params.get('startDate'):
+            occupancies = occupancies.filter(operation_date__gte=params['startDate'])
+        if params.get('endDate'):
+            occupancies = occupancies.filter(operation_date__lte=params['endDate'])
+        queryset = super().get_queryset().annotate(occupancy=Subquery(
+            occupancies.values('train').annotate(value=Avg('average_load_factor')).values('value')
+        ))
+        if self.action == 'retrieve':
+            return queryset.prefetch_related(Prefetch(
+                'train__timetable_stops',
+                queryset=TrainStop.objects.using(settings.ANALYTICS_DATABASE).select_related('station').order_by(
+                    'stop_index'),
+            ))
+
+        # 开行日期与查询区间有交集的列车
+        if params.get('startDate'):
+            queryset = queryset.filter(last_date__gte=params['startDate'])
+        if params.get('endDate'):
+            queryset = queryset.filter(first_date__lte=params['endDate'])
+        if params.get('search'):
+            queryset = queryset.filter(train__code__icontains=params['search'])
+        # 经停指定站点的列车
+        if params.get('stationId'):
+            queryset = queryset.filter(train__timetable_stops__station_id=params['stationId'])
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return TrainTimetableSerializer
+        return self.serializer_class
+
+
+class TrainOccupancyViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """列车运行日载客情况视图集（读取预计算结果）"""
+    data_tables = ['train_occupancy', 'train', 'route', 'station']
+    queryset = TrainOccupancy.objects.using(settings.ANALYTICS_DATABASE).select_related(
+        'train', 'route', 'peak_station'
+    )
+    serializer_class = TrainOccupancySerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'train': ['exact'],
+        'route': ['exact'],
+        'operation_date': ['exact', 'gte', 'lte'],
+        'over_capacity_sections': ['gte'],
+    }
+    ordering_fields = ['operation_date', 'peak_load', 'peak_load_factor', 'average_load_factor',
+                       'over_capacity_sections']
+    ordering = ['-peak_load_factor']
+
+
+class FlowAnomalyViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
+    """站点/线路日客流异常视图集（读取批量检测结果）"""
+    data_tables = ['flow_anomaly', 'station', 'route']
+    queryset = FlowAnomaly.objects.using(settings.ANALYTICS_DATABASE).select_related('station', 'route')
+    serializer_class = FlowAnomalySerializer
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = {
+        'scope': ['exact'],
+        'kind': ['exact'],
+        'station': ['exact'],
+        'route': ['exact'],
+        'operation_date': ['exact', 'gte', 'lte'],
+    }
+    ordering_fields = ['operation_date', 'robust_score', 'seasonal_score', 'passengers']
+    ordering = ['-operation_date', 'scope', 'station', 'route']
+
+
+class OccupancyDistributionView(ConditionalGetMixin, APIView):
+    """按车次或线路汇总的满载率分布（超员运行日占比高的排在前面）"""
+    data_tables = ['train_occupancy', 'train', 'route']
+    group = 'train'
+
+    def get(self, request):
+        serializer = OccupancyRequestSerializer(data={
+            key: value for key, value in {
+                'start_date': request.query_params.get('startDate'),
+                'end_date': request.query_params.get('endDate'),
+            }.items() if value
+        })
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(OccupancyService().distribution(self.group, **serializer.validated_data))
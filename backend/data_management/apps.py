@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DataManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'data_management'
+
+    def ready(self):
+        from . import calendar_days, db, stats, topology, versioning  # noqa: F401
@@ -0,0 +1,265 @@
+"""客运记录冷数据归档
+
+早于热数据窗口的月分区整月导出为 zstd 压缩的 Parquet 文件（FLOW_ARCHIVE_DIR/passenger_flow_YYYYMM.parquet），
+随后删除分区表，SQLite 只保留近期数据。分析聚合在 SQL 结果之外，用 pyarrow 按列向量化扫描与查询
+日期区间相交的归档文件并合并结果；归档文件只读，需要修改时先 restore 回分区。
+
+归档某月时该月在默认分区中的记录一并写入文件，因此一个运行日期只会位于冷、热其中一侧。
+"""
+import os
+from datetime import date
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import AND, NothingNode, OR
+
+from .partitions import (
+    FLOW_TABLE, PARTITION_PATTERN, date_bounds, drop_partition, ensure_partition, list_partitions,
+    partition_bounds,
+)
+
+# 归档文件的列与类型（与 passenger_flow 的列一一对应，取值与数据库一致：时刻为当日分钟数、金额为整数分；
+# 时间戳为 UTC）
+SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('serial_number', pa.int64()),
+    ('route_id', pa.int64()),
+    ('train_id', pa.int64()),
+    ('station_id', pa.int64()),
+    ('route_station_sequence', pa.int64()),
+    ('operation_date', pa.date32()),
+    ('arrival_time', pa.int16()),
+    ('departure_time', pa.int16()),
+    ('passengers_in', pa.int64()),
+    ('passengers_out', pa.int64()),
+    ('ticket_price', pa.int64()),
+    ('revenue', pa.int64()),
+    ('created_at', pa.timestamp('us')),
+    ('updated_at', pa.timestamp('us')),
+    ('start_station_id', pa.int64()),
+    ('end_station_id', pa.int64()),
+])
+
+SUFFIX = '.parquet'
+ROW_GROUP_SIZE = 128 * 1024
+_FETCH_SIZE = 100_000
+
+
+def archive_dir():
+    return Path(settings.FLOW_ARCHIVE_DIR)
+
+
+def archive_path(table):
+    return archive_dir() / f'{table}{SUFFIX}'
+
+
+def list_archives():
+    """按月份排序的归档分区名（与分区表同名）"""
+    directory = archive_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(
+        path.stem for path in directory.glob(f'{FLOW_TABLE}_*{SUFFIX}') if PARTITION_PATTERN.match(path.stem)
+    )
+
+
+def archives_for_ranges(ranges):
+    """与任一 (起始, 结束) 日期区间相交的归档文件"""
+    selected = []
+    for table in list_archives():
+        first, last = partition_bounds(table)
+        if any((start is None or last >= start) and (end is None or first <= end) for start, end in ranges):
+            selected.append(archive_path(table))
+    return selected
+
+
+def archive_summary():
+    """归档记录的总行数与运行日期范围（只读取文件元数据）"""
+    rows, min_date, max_date = 0, None, None
+    column = SCHEMA.get_field_index('operation_date')
+    for table in list_archives():
+        metadata = pq.ParquetFile(archive_path(table)).metadata
+        rows += metadata.num_rows
+        for index in range(metadata.num_row_groups):
+            statistics = metadata.row_group(index).column(column).statistics
+            if statistics is not None and statistics.has_min_max:
+                min_date = min(filter(None, [min_date, statistics.min]))
+                max_date = max(filter(None, [max_date, statistics.max]))
+    return rows, min_date, max_date
+
+
+def cold_tables(hot_months, using='default'):
+    """热数据窗口（以最新分区月份为基准的最近 hot_months 个月）之外的分区"""
+    tables = list_partitions(using)
+    if not tables or hot_months < 1:
+        return []
+    latest = partition_bounds(tables[-1])[0]
+    index = latest.year * 12 + latest.month - 1 - (hot_months - 1)
+    cutoff = date(index // 12, index % 12 + 1, 1)
+    return [table for table in tables if partition_bounds(table)[0] < cutoff]
+
+
+def _record_batch(rows):
+    """把一批数据库行（日期与时间戳已由 Django 的 SQLite 转换器解析）转换为 Arrow 记录批"""
+    arrays = [pa.array(values, field.type) for field, values in zip(SCHEMA, zip(*rows))]
+    return pa.RecordBatch.from_arrays(arrays, schema=SCHEMA)
+
+
+def archive_partition(table, using='default'):
+    """将一个月分区（及默认分区中同月的记录）写入 Parquet 文件并删除分区表，返回归档行数"""
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    first, last = partition_bounds(table)
+    columns = ', '.join(qn(field.name) for field in SCHEMA)
+    month_filter = 'operation_date BETWEEN %s AND %s'
+    params = [first.isoformat(), last.isoformat()]
+
+    directory = archive_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    target = archive_path(table)
+    temporary = target.with_name(target.name + '.tmp')
+
+    rows_written = 0
+    try:
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor, pq.ParquetWriter(str(temporary), SCHEMA, compression='zstd') as writer:
+                # 按日期、站点排序写入，行组统计信息可用于跳过不相关的行组
+                cursor.execute(
+                    f'SELECT {columns} FROM {qn(table)} UNION ALL '
+                    f'SELECT {columns} FROM {qn(FLOW_TABLE)} WHERE {month_filter} '
+                    f'ORDER BY operation_date, station_id',
+                    params,
+                )
+                while True:
+                    rows = cursor.fetchmany(_FETCH_SIZE)
+                    if not rows:
+                        break
+                    writer.write_batch(_record_batch(rows), row_group_size=ROW_GROUP_SIZE)
+                    rows_written += len(rows)
+                cursor.execute(f'DELETE FROM {qn(FLOW_TABLE)} WHERE {month_filter}', params)
+            drop_partition(table, using, archived=True)
+            # 文件在提交前原子地换入：若随后提交失败，冷热两侧会重复但不会丢失数据
+            os.replace(temporary, target)
+    finally:
+        temporary.unlink(missing_ok=True)
+    return rows_written
+
+
+def archive_cold_partitions(hot_months=None, using='default'):
+    """归档热数据窗口之外的全部分区，返回 {分区: 行数}"""
+    if hot_months is None:
+        hot_months = settings.FLOW_HOT_MONTHS
+    return {table: archive_partition(table, using) for table in cold_tables(hot_months, using)}
+
+
+def restore_partition(table, using='default'):
+    """把归档文件写回月分区（主键保持不变）并删除文件，返回行数"""
+    from .versioning import bump_versions
+
+    path = archive_path(table)
+    if not path.exists():
+        raise FileNotFoundError(f'归档文件不存在: {path}')
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    data = pq.read_table(path, schema=SCHEMA)
+    sql = (f'INSERT INTO {qn(table)} ({", ".join(qn(name) for name in SCHEMA.names)}) '
+           f'VALUES ({", ".join(["%s"] * len(SCHEMA))})')
+
+    with transaction.atomic(using=using):
+        ensure_partition(partition_bounds(table)[0], using)
+        with connection.cursor() as cursor:
+            for batch in data.to_batches(_FETCH_SIZE):
+                columns = batch.to_pydict()
+                for name, adapt in (
+                    ('operation_date', connection.ops.adapt_datefield_value),
+                    ('created_at', connection.ops.adapt_datetimefield_value),
+                    ('updated_at', connection.ops.adapt_datetimefield_value),
+                ):
+                    columns[name] = [adapt(value) for value in columns[name]]
+                cursor.executemany(sql, list(zip(*(columns[name] for name in SCHEMA.names))))
+        bump_versions(FLOW_TABLE)
+        path.unlink()
+    return data.num_rows
+
+
+def clear_archives():
+    """删除全部归档文件"""
+    from . import stats
+    from .versioning import bump_versions
+
+    with transaction.atomic():
+        for table in list_archives():
+            path = archive_path(table)
+            counts = stats.arrow_day_counts(pq.read_table(path, columns=['operation_date']))
+            stats.adjust_flow_days({day: -records for day, records in counts.items()})
+            path.unlink()
+        bump_versions(FLOW_TABLE)
+
+
+def _lookup_expression(lookup, alias):
+    lhs = lookup.lhs
+    if not (isinstance(lhs, Col) and lhs.alias == alias and lhs.target.column in SCHEMA.names):
+        raise ValueError(f'归档数据不支持的查询条件: {lookup}')
+    field = pc.field(lhs.target.column)
+    rhs = lookup.rhs
+    name = lookup.lookup_name
+    if name == 'exact':
+        return field.is_null() if rhs is None else field == rhs
+    if name == 'in':
+        return field.isin([value for value in rhs if value is not None])
+    if name == 'range':
+        return (field >= rhs[0]) & (field <= rhs[1])
+    if name == 'isnull':
+        return field.is_null() if rhs else field.is_valid()
+    operators = {'gt': '__gt__', 'gte': '__ge__', 'lt': '__lt__', 'lte': '__le__'}
+    if name in operators:
+        return getattr(field, operators[name])(rhs)
+    raise ValueError(f'归档数据不支持的查询条件: {lookup}')
+
+
+def arrow_filter(where, alias):
+    """把查询集的 WHERE 条件转换为 pyarrow 过滤表达式（仅支持本表列上的比较类查找）"""
+    if where.connector not in (AND, OR):
+        raise ValueError(f'归档数据不支持的连接符: {where.connector}')
+    expressions = []
+    for child in where.children:
+        if isinstance(child, NothingNode):
+            expressions.append(pc.scalar(False))
+        elif isinstance(child, Lookup):
+            expressions.append(_lookup_expression(child, alias))
+        elif hasattr(child, 'children'):
+            expression = arrow_filter(child, alias)
+            if expression is not None:
+                expressions.append(expression)
+        else:
+            raise ValueError(f'归档数据不支持的查询条件: {child}')
+    if not expressions:
+        return None
+    combined = expressions[0]
+    for expression in expressions[1:]:
+        combined = combined & expression if where.connector == AND else combined | expression
+    return ~combined if where.negated else combined
+
+
+def scan(columns, expression=None, ranges=((None, None),)):
+    """扫描与日期区间相交的归档文件，返回过滤后的 Arrow 表；没有相关归档时返回 None"""
+    paths = archives_for_ranges(ranges)
+    if not paths:
+        return None
+    dataset = ds.dataset([str(path) for path in paths], schema=SCHEMA, format='parquet')
+    return dataset.to_table(columns=list(columns), filter=expression)
+
+
+def scan_queryset(queryset, columns):
+    """按客运记录查询集的条件扫描归档数据（日期条件用于裁剪归档文件）"""
+    query = queryset.query.clone()
+    alias = query.get_initial_alias()
+    lower, upper = date_bounds(query.where, alias)
+    return scan(columns, arrow_filter(query.where, alias), [(lower, upper)])
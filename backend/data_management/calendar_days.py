@@ -0,0 +1,169 @@
+"""日历维度
+
+calendar_day 表为每个日期预先计算星期、ISO 周、月、季度、节假日与运输高峰期标志以及上年同期对应日期，
+分析查询以运行日期为键关联该表分组，不再逐次在 Python 中推算日期属性。
+
+节假日定义保存在 holiday 表中，由本地 CSV 文件导入（列：name, kind, start_date, end_date；kind 为
+holiday/workday/period，分别表示法定节假日、调休上班日与运输高峰期），默认文件为 CALENDAR_HOLIDAYS_FILE。
+日历覆盖节假日定义、客运记录日期与当前日期所在年份（及其后一年），数据导入后按需扩展。
+"""
+import csv
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import CalendarDay, FlowDayCount, Holiday
+from .signals import data_imported
+
+# 没有节假日对应关系时，上年同期按 52 周前（星期几相同）对应
+PRIOR_YEAR_OFFSET = timedelta(days=364)
+# 匹配上年同名节假日时允许的起始日期偏差（农历节日在公历中的漂移）
+HOLIDAY_MATCH_WINDOW = 60
+
+
+def load_definitions(path):
+    """读取节假日定义文件，返回未保存的 Holiday 对象列表；格式错误时抛出 ValueError"""
+    kinds = {kind for kind, _ in Holiday.KIND_CHOICES}
+    definitions = []
+    with open(path, encoding='utf-8-sig', newline='') as file:
+        for line, row in enumerate(csv.DictReader(file), start=2):
+            try:
+                holiday = Holiday(
+                    name=row['name'].strip(),
+                    kind=row['kind'].strip(),
+                    start_date=date.fromisoformat(row['start_date'].strip()),
+                    end_date=date.fromisoformat(row['end_date'].strip()),
+                )
+            except (KeyError, AttributeError, ValueError) as e:
+                raise ValueError(f'{path} 第 {line} 行格式错误: {e}')
+            if holiday.kind not in kinds:
+                raise ValueError(f'{path} 第 {line} 行类型应为 {"/".join(sorted(kinds))}: {holiday.kind}')
+            if not holiday.name or holiday.start_date > holiday.end_date:
+                raise ValueError(f'{path} 第 {line} 行名称为空或开始日期晚于结束日期')
+            definitions.append(holiday)
+    return definitions
+
+
+def _days(start, end):
+    return (start + timedelta(days=offset) for offset in range((end - start).days + 1))
+
+
+def _prior_occurrence(occurrence, occurrences):
+    """上一年同名同类型的节假日（起始日期与一年前最接近者）"""
+    target = occurrence.start_date - timedelta(days=365)
+    candidates = [
+        other for other in occurrences
+        if other is not occurrence and abs((other.start_date - target).days) <= HOLIDAY_MATCH_WINDOW
+    ]
+    return min(candidates, key=lambda other: abs((other.start_date - target).days), default=None)
+
+
+def build_days(start, end, definitions):
+    """生成 [start, end] 内每天的 CalendarDay（未保存）"""
+    by_name = {}
+    for holiday in definitions:
+        by_name.setdefault((holiday.name, holiday.kind), []).append(holiday)
+    holidays, workdays, periods = {}, set(), {}
+    for holiday in definitions:
+        for day in _days(holiday.start_date, holiday.end_date):
+            if holiday.kind == Holiday.KIND_HOLIDAY:
+                holidays[day] = holiday
+            elif holiday.kind == Holiday.KIND_WORKDAY:
+                workdays.add(day)
+            else:
+                periods[day] = holiday
+
+    def prior_year_date(day):
+        # 节假日与运输高峰期按上年同一节日（高峰期）的第几天对应，超出上年天数时取其最后一天
+        for occurrence in (holidays.get(day), periods.get(day)):
+            if occurrence is None:
+                continue
+            prior = _prior_occurrence(occurrence, by_name[occurrence.name, occurrence.kind])
+            if prior is not None:
+                return min(prior.start_date + (day - occurrence.start_date), prior.end_date)
+        return day - PRIOR_YEAR_OFFSET
+
+    rows = []
+    for day in _days(start, end):
+        iso_year, iso_week, weekday = day.isocalendar()
+        holiday = holidays.get(day)
+        period = periods.get(day)
+        is_weekend = weekday >= 6
+        if holiday is not None:
+            day_type = CalendarDay.DAY_TYPE_HOLIDAY
+        elif is_weekend and day not in workdays:
+            day_type = CalendarDay.DAY_TYPE_WEEKEND
+        else:
+            day_type = CalendarDay.DAY_TYPE_WORKDAY
+        rows.append(CalendarDay(
+            date=day,
+            year=day.year,
+            quarter=(day.month - 1) // 3 + 1,
+            month=day.month,
+            weekday=weekday,
+            iso_year=iso_year,
+            iso_week=iso_week,
+            is_weekend=is_weekend,
+            holiday=holiday.name if holiday else '',
+            is_holiday=holiday is not None,
+            is_adjusted_workday=day in workdays,
+            day_type=day_type,
+            holiday_period=period.name if period else '',
+            is_holiday_period=period is not None,
+            prior_year_date=prior_year_date(day),
+        ))
+    return rows
+
+
+def calendar_range(definitions, using='default'):
+    """日历应覆盖的日期范围：节假日定义、客运记录日期与今天所在年份，结束于最晚年份的下一年年底"""
+    days = [date.today()]
+    for holiday in definitions:
+        days += [holiday.start_date, holiday.end_date]
+    flow_days = FlowDayCount.objects.using(using).order_by('operation_date').values_list('operation_date', flat=True)
+    days += [day for day in (flow_days.first(), flow_days.last()) if day is not None]
+    return date(min(days).year, 1, 1), date(max(days).year + 1, 12, 31)
+
+
+def rebuild(using='default'):
+    """按 holiday 表重新生成日历，返回天数"""
+    from .versioning import bump_versions
+
+    definitions = list(Holiday.objects.using(using).all())
+    start, end = calendar_range(definitions, using)
+    rows = build_days(start, end, definitions)
+    with transaction.atomic(using=using):
+        CalendarDay.objects.using(using).all().delete()
+        CalendarDay.objects.using(using).bulk_create(rows, batch_size=1000)
+        bump_versions('calendar_day')
+    return len(rows)
+
+
+def ensure_covered(using='default'):
+    """客运记录日期超出日历范围时重新生成日历"""
+    first = CalendarDay.objects.using(using).order_by('date').values_list('date', flat=True).first()
+    last = CalendarDay.objects.using(using).order_by('-date').values_list('date', flat=True).first()
+    flow_days = FlowDayCount.objects.using(using).order_by('operation_date').values_list('operation_date', flat=True)
+    flow_first, flow_last = flow_days.first(), flow_days.last()
+    if first is None or (flow_first is not None and (flow_first < first or flow_last > last)):
+        return rebuild(using)
+    return 0
+
+
+def import_holidays(path=None, using='default'):
+    """从文件导入节假日定义（替换现有定义）并重新生成日历，返回 (定义数, 天数)"""
+    definitions = load_definitions(Path(path or settings.CALENDAR_HOLIDAYS_FILE))
+    with transaction.atomic(using=using):
+        Holiday.objects.using(using).all().delete()
+        Holiday.objects.using(using).bulk_create(definitions)
+        days = rebuild(using)
+    return len(definitions), days
+
+
+def _extend_calendar(sender, **kwargs):
+    ensure_covered()
+
+
+data_imported.connect(_extend_calendar, dispatch_uid='calendar_days_imported')
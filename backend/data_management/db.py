@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """为新建的 SQLite 连接设置 PRAGMA（WAL、mmap、缓存等）"""
+    if connection.vendor != 'sqlite' or not settings.SQLITE_PRAGMAS:
+        return
+
+    # 只读连接无法切换日志模式，WAL 由写连接设置并持久化在数据库文件中
+    read_only = 'mode=ro' in str(connection.settings_dict['NAME'])
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            if read_only and pragma == 'journal_mode':
+                continue
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+class ReadOnlyDatabaseRouter:
+    """禁止在只读分析连接上执行迁移"""
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == settings.ANALYTICS_DATABASE and db != 'default':
+            return False
+        return None
@@ -0,0 +1,84 @@
+"""客运记录的紧凑存储字段
+
+金额以整数分保存（BIGINT），时刻以当日分钟数保存（SMALLINT），Python 侧仍分别为两位小数的 Decimal
+与 datetime.time，ORM 查询与聚合（Sum 等返回源字段类型）的结果不变。原生SQL与归档文件中是分与分钟数，
+需自行换算（收入 / 100.0，小时 = 分钟数 / 60）。
+"""
+from datetime import time
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.lookups import GreaterThanOrEqual, LessThan
+
+CENT = Decimal('0.01')
+
+
+def to_cents(value):
+    """元（Decimal/float/字符串）转为整数分，四舍五入"""
+    return int((Decimal(str(value)) / CENT).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def to_minutes(value):
+    """时刻（time 或 HH:MM[:SS] 字符串）转为当日分钟数"""
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+class CentsField(models.BigIntegerField):
+    """金额字段：数据库中为整数分"""
+    description = '金额（整数分）'
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else Decimal(round(value)) * CENT
+
+    def to_python(self, value):
+        if value is None or isinstance(value, Decimal):
+            return value
+        return Decimal(str(value)).quantize(CENT, ROUND_HALF_UP)
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression'):
+            return value
+        return to_cents(value)
+
+
+# 整数字段对浮点数右值的取整（IntegerFieldFloatRounding）作用在元上会出错，金额比较统一换算为分
+CentsField.register_lookup(GreaterThanOrEqual)
+CentsField.register_lookup(LessThan)
+
+
+class MinuteOfDayField(models.SmallIntegerField):
+    """时刻字段：数据库中为当日分钟数（0~1439，精确到分钟）"""
+    description = '时刻（当日分钟数）'
+
+    def from_db_value(self, value, expression, connection):
+        return None if value is None else time(*divmod(int(value), 60))
+
+    def to_python(self, value):
+        if value is None or isinstance(value, time):
+            return value
+        if isinstance(value, int):
+            return time(*divmod(value, 60))
+        return time.fromisoformat(str(value))
+
+    def get_prep_value(self, value):
+        if value is None or hasattr(value, 'resolve_expression') or isinstance(value, int):
+            return value
+        return to_minutes(value)
+
+
+def stored(column):
+    """列在数据库中的存储值（分钟数、整数分），跳过 Python 侧的类型转换（ORM 表达式）"""
+    return ExpressionWrapper(F(column), output_field=models.IntegerField())
+
+
+def hour_of(column):
+    """时刻列所在的小时（整数，ORM 表达式）"""
+    return ExpressionWrapper(F(column) / 60, output_field=models.IntegerField())
+
+
+def hour_start(column):
+    """时刻截断到整点（与 Trunc(column, 'hour') 一致，ORM 表达式）"""
+    return ExpressionWrapper(F(column) / 60 * 60, output_field=MinuteOfDayField())
@@ -0,0 +1,114 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from data_management import archive, stats
+from data_management.partitions import (
+    FLOW_TABLE, drop_partition, list_partitions, migrate_default_partition, partition_bounds, partition_name,
+)
+
+
+def parse_month(value):
+    try:
+        return date.fromisoformat(f'{value}-01')
+    except ValueError:
+        raise CommandError(f'月份格式应为 YYYY-MM: {value}')
+
+
+class Command(BaseCommand):
+    help = '管理客运记录月分区：查看、把单表数据迁入分区、按月删除、归档冷数据为 Parquet 及恢复、重新统计计数'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['list', 'migrate', 'drop', 'archive', 'restore', 'stats'], help='操作')
+        parser.add_argument(
+            '--month', action='append', default=[],
+            help='要删除、归档或恢复的月份（YYYY-MM，可重复）',
+        )
+        parser.add_argument(
+            '--hot-months', type=int, default=None,
+            help=f'archive 未指定 --month 时保留的最近月份数（默认 {settings.FLOW_HOT_MONTHS}）',
+        )
+        parser.add_argument(
+            '--before',
+            help='删除早于该月份（YYYY-MM，不含）的全部分区',
+        )
+        parser.add_argument('--database', default='default', help='数据库别名')
+
+    def handle(self, *args, **options):
+        using = options['database']
+        getattr(self, f'handle_{options["action"]}')(using, options)
+
+    def handle_list(self, using, options):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'SELECT COUNT(*) FROM {FLOW_TABLE}')
+            self.stdout.write(f'{FLOW_TABLE}（默认分区）: {cursor.fetchone()[0]} 条')
+            for table in list_partitions(using):
+                cursor.execute(f'SELECT COUNT(*) FROM {table}')
+                first, last = partition_bounds(table)
+                self.stdout.write(f'{table}  {first} ~ {last}: {cursor.fetchone()[0]} 条')
+        for table in archive.list_archives():
+            path = archive.archive_path(table)
+            first, last = partition_bounds(table)
+            size = path.stat().st_size / 1024 / 1024
+            self.stdout.write(f'{table}  {first} ~ {last}: 已归档 {path.name}（{size:.1f} MB）')
+        rows, min_date, max_date = archive.archive_summary()
+        if rows:
+            self.stdout.write(f'归档合计 {rows} 条，运行日期 {min_date} ~ {max_date}')
+
+    def handle_migrate(self, using, options):
+        moved = migrate_default_partition(using)
+        for table, rows in moved.items():
+            self.stdout.write(f'  {table}: {rows} 条')
+        self.stdout.write(self.style.SUCCESS(f'迁移完成，共 {sum(moved.values())} 条记录移入 {len(moved)} 个分区'))
+
+    def handle_drop(self, using, options):
+        if not options['month'] and not options['before']:
+            raise CommandError('drop 需要指定 --month 或 --before')
+
+        targets = {partition_name(parse_month(month)) for month in options['month']}
+        if options['before']:
+            cutoff = parse_month(options['before'])
+            targets.update(table for table in list_partitions(using) if partition_bounds(table)[0] < cutoff)
+
+        existing = set(list_partitions(using))
+        for table in sorted(targets):
+            if table not in existing:
+                self.stdout.write(self.style.WARNING(f'分区不存在: {table}'))
+                continue
+            drop_partition(table, using)
+            self.stdout.write(self.style.SUCCESS(f'已删除分区 {table}'))
+
+    def handle_archive(self, using, options):
+        if options['month']:
+            existing = set(list_partitions(using))
+            tables = [partition_name(parse_month(month)) for month in options['month']]
+            for table in tables:
+                if table not in existing:
+                    raise CommandError(f'分区不存在: {table}')
+        else:
+            hot_months = options['hot_months'] or settings.FLOW_HOT_MONTHS
+            tables = archive.cold_tables(hot_months, using)
+
+        for table in tables:
+            rows = archive.archive_partition(table, using)
+            self.stdout.write(self.style.SUCCESS(f'已归档 {table}: {rows} 条 -> {archive.archive_path(table)}'))
+        if not tables:
+            self.stdout.write('没有需要归档的分区')
+
+    def handle_restore(self, using, options):
+        if not options['month']:
+            raise CommandError('restore 需要指定 --month')
+        for month in options['month']:
+            table = partition_name(parse_month(month))
+            try:
+                rows = archive.restore_partition(table, using)
+            except FileNotFoundError as e:
+                raise CommandError(str(e))
+            self.stdout.write(self.style.SUCCESS(f'已恢复 {table}: {rows} 条'))
+
+    def handle_stats(self, using, options):
+        stats.rebuild(using)
+        rows, min_date, max_date = stats.summary()
+        self.stdout.write(f'已重新统计：客运记录 {rows[FLOW_TABLE]} 条，运行日期 {min_date} ~ {max_date}')
@@ -1,5 +1,8 @@
+from pathlib import Path
+
 from django.core.management.base import BaseCommand
 from data_management.services import DataImportService
+from data_management.signals import data_imported
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,6 +12,11 @@ class Command(BaseCommand):
     help = '导入铁路客运数据'
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-dir',
+            type=Path,
+            help='数据文件目录（默认为 db/）',
+        )
         parser.add_argument(
             '--clear',
             action='store_true',
@@ -41,7 +49,7 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        service = DataImportService()
+        service = DataImportService(options['data_dir'])
 
         if options['clear']:
             self.stdout.write(self.style.WARNING('清除现有数据...'))
@@ -76,6 +84,10 @@ class Command(BaseCommand):
 
             self.stdout.write(self.style.SUCCESS('所有数据导入完成！'))
 
+            self.stdout.write('重建派生分析数据...')
+            data_imported.send(sender=DataImportService)
+            self.stdout.write(self.style.SUCCESS('派生分析数据重建完成'))
+
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'数据导入失败: {e}'))
             logger.exception('数据导入失败')
\ No newline at end of file
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from data_management import calendar_days
+
+
+class Command(BaseCommand):
+    help = '从本地 CSV 文件导入节假日定义并重新生成日历维度表'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'file', nargs='?', default=None,
+            help=f'节假日定义文件（默认 {settings.CALENDAR_HOLIDAYS_FILE}）',
+        )
+        parser.add_argument('--database', default='default', help='数据库别名')
+
+    def handle(self, *args, **options):
+        try:
+            definitions, days = calendar_days.import_holidays(options['file'], options['database'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'已导入 {definitions} 条节假日定义，日历共 {days} 天'))
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.16 on 2026-10-19 18:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='passengerflow',
+            name='passenger_f_operati_bc967f_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='passengerflow',
+            name='passenger_f_route_i_4274f6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='passengerflow',
+            name='passenger_f_station_5dbe5a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='passengerflow',
+            index=models.Index(fields=['operation_date', 'station', 'train', 'route', 'arrival_time', 'passengers_in', 'passengers_out', 'revenue'], name='pf_date_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passengerflow',
+            index=models.Index(fields=['station', 'operation_date', 'train', 'arrival_time', 'passengers_in', 'passengers_out', 'revenue'], name='pf_station_date_cover_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='passengerflow',
+            index=models.Index(fields=['route', 'operation_date', 'station', 'train', 'arrival_time', 'passengers_in', 'passengers_out', 'revenue'], name='pf_route_date_cover_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.16 on 2026-10-19 18:54
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0003_data_version'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='passengerflow',
+            options={'base_manager_name': 'objects', 'ordering': ['-operation_date', 'route', 'train', 'station'], 'verbose_name': '客运记录', 'verbose_name_plural': '客运记录'},
+        ),
+    ]
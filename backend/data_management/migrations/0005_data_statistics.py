@@ -0,0 +1,51 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:24
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+def count_existing_data(apps, schema_editor):
+    """统计迁移前已有的数据（含归档文件）"""
+    from data_management import stats
+
+    using = schema_editor.connection.alias
+    # 空库（如新建的测试库）不读取归档目录
+    if apps.get_model('data_management', 'Station').objects.using(using).exists():
+        stats.rebuild(using)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0004_passenger_flow_partitioned_manager'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowDayCount',
+            fields=[
+                ('operation_date', models.DateField(primary_key=True, serialize=False, verbose_name='运行日期')),
+                ('record_count', models.BigIntegerField(default=0, verbose_name='记录数')),
+            ],
+            options={
+                'verbose_name': '运行日记录数',
+                'verbose_name_plural': '运行日记录数',
+                'db_table': 'flow_day_count',
+                'ordering': ['operation_date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='TableStatistic',
+            fields=[
+                ('table', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='数据表')),
+                ('row_count', models.BigIntegerField(default=0, verbose_name='行数')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='更新时间')),
+            ],
+            options={
+                'verbose_name': '数据表行数',
+                'verbose_name_plural': '数据表行数',
+                'db_table': 'table_statistic',
+            },
+        ),
+        migrations.RunPython(count_existing_data, migrations.RunPython.noop),
+    ]
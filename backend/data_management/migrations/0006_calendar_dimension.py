@@ -0,0 +1,64 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:27
+
+from django.db import migrations, models
+
+
+def import_default_holidays(apps, schema_editor):
+    """导入随项目提供的节假日定义并生成日历"""
+    from data_management import calendar_days
+
+    calendar_days.import_holidays(using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0005_data_statistics'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Holiday',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, verbose_name='名称')),
+                ('kind', models.CharField(choices=[('holiday', '法定节假日'), ('workday', '调休上班'), ('period', '运输高峰期')], max_length=20, verbose_name='类型')),
+                ('start_date', models.DateField(verbose_name='开始日期')),
+                ('end_date', models.DateField(verbose_name='结束日期')),
+            ],
+            options={
+                'verbose_name': '节假日',
+                'verbose_name_plural': '节假日',
+                'db_table': 'holiday',
+                'ordering': ['start_date', 'kind'],
+            },
+        ),
+        migrations.CreateModel(
+            name='CalendarDay',
+            fields=[
+                ('date', models.DateField(primary_key=True, serialize=False, verbose_name='日期')),
+                ('year', models.IntegerField(verbose_name='年')),
+                ('quarter', models.IntegerField(verbose_name='季度')),
+                ('month', models.IntegerField(verbose_name='月')),
+                ('weekday', models.IntegerField(verbose_name='星期（1=周一）')),
+                ('iso_year', models.IntegerField(verbose_name='ISO 年')),
+                ('iso_week', models.IntegerField(verbose_name='ISO 周')),
+                ('is_weekend', models.BooleanField(default=False, verbose_name='是否周末')),
+                ('holiday', models.CharField(blank=True, default='', max_length=50, verbose_name='节假日名称')),
+                ('is_holiday', models.BooleanField(default=False, verbose_name='是否法定节假日')),
+                ('is_adjusted_workday', models.BooleanField(default=False, verbose_name='是否调休上班')),
+                ('day_type', models.CharField(choices=[('workday', '工作日'), ('weekend', '周末'), ('holiday', '节假日')], max_length=20, verbose_name='日期类型')),
+                ('holiday_period', models.CharField(blank=True, default='', max_length=50, verbose_name='运输高峰期')),
+                ('is_holiday_period', models.BooleanField(default=False, verbose_name='是否运输高峰期')),
+                ('prior_year_date', models.DateField(verbose_name='上年同期对应日期')),
+            ],
+            options={
+                'verbose_name': '日历',
+                'verbose_name_plural': '日历',
+                'db_table': 'calendar_day',
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['year', 'month'], name='calendar_da_year_1d1962_idx'), models.Index(fields=['iso_year', 'iso_week'], name='calendar_da_iso_yea_f89095_idx'), models.Index(fields=['weekday'], name='calendar_da_weekday_087a1a_idx'), models.Index(fields=['day_type'], name='calendar_da_day_typ_6ef43d_idx'), models.Index(fields=['holiday'], name='calendar_da_holiday_a49672_idx'), models.Index(fields=['holiday_period'], name='calendar_da_holiday_51e01f_idx')],
+            },
+        ),
+        migrations.RunPython(import_default_holidays, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,206 @@
+# Generated by Django 4.2.16 on 2026-10-19 21:10
+
+import os
+import re
+from datetime import time
+from decimal import ROUND_HALF_UP, Decimal
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import data_management.fields
+
+# 旧列值（HH:MM:SS 文本、两位小数、电报码）转换为紧凑存储的SQL表达式
+MINUTES = 'CAST(substr({col}, 1, 2) AS INTEGER) * 60 + CAST(substr({col}, 4, 2) AS INTEGER)'
+CENTS = 'CAST(ROUND({col} * 100) AS INTEGER)'
+STATION = '(SELECT id FROM station WHERE station.telecode = {col})'
+
+CONVERSIONS = {
+    'arrival_time': MINUTES.format(col='arrival_time'),
+    'departure_time': MINUTES.format(col='departure_time'),
+    'ticket_price': CENTS.format(col='ticket_price'),
+    'revenue': CENTS.format(col='revenue'),
+    'start_station_id': STATION.format(col='start_station_telecode'),
+    'end_station_id': STATION.format(col='end_station_telecode'),
+}
+UNCHANGED = [
+    'id', 'serial_number', 'route_id', 'train_id', 'station_id', 'route_station_sequence', 'operation_date',
+    'passengers_in', 'passengers_out', 'created_at', 'updated_at',
+]
+
+
+# 以下分区与归档的辅助逻辑按本迁移时的实现复制，不依赖之后可能变化的 partitions/archive 模块
+PARTITION_PATTERN = re.compile(r'^passenger_flow_(\d{4})(\d{2})$')
+
+# 本迁移完成后归档文件的列与类型（时刻为当日分钟数、金额为整数分、起终点为站点ID）
+ARCHIVE_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('serial_number', pa.int64()),
+    ('route_id', pa.int64()),
+    ('train_id', pa.int64()),
+    ('station_id', pa.int64()),
+    ('route_station_sequence', pa.int64()),
+    ('operation_date', pa.date32()),
+    ('arrival_time', pa.int16()),
+    ('departure_time', pa.int16()),
+    ('passengers_in', pa.int64()),
+    ('passengers_out', pa.int64()),
+    ('ticket_price', pa.int64()),
+    ('revenue', pa.int64()),
+    ('created_at', pa.timestamp('us')),
+    ('updated_at', pa.timestamp('us')),
+    ('start_station_id', pa.int64()),
+    ('end_station_id', pa.int64()),
+])
+ARCHIVE_ROW_GROUP_SIZE = 128 * 1024
+
+
+def list_partitions(cursor):
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE %s", ['passenger_flow_%'])
+    return sorted(name for (name,) in cursor.fetchall() if PARTITION_PATTERN.match(name))
+
+
+def create_partition(cursor, table):
+    """复制 passenger_flow 的表结构与索引创建分区表"""
+    cursor.execute(
+        "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = 'passenger_flow' AND sql IS NOT NULL "
+        "ORDER BY type = 'index'"
+    )
+    suffix = table[len('passenger_flow'):]
+    for kind, name, ddl in cursor.fetchall():
+        ddl = ddl.replace('"passenger_flow"', f'"{table}"', 1)
+        if kind == 'index':
+            ddl = ddl.replace(f'"{name}"', f'"{name}{suffix}"', 1)
+        cursor.execute(ddl)
+
+
+def list_archives():
+    directory = Path(settings.FLOW_ARCHIVE_DIR)
+    if not directory.is_dir():
+        return []
+    return sorted(path for path in directory.glob('passenger_flow_*.parquet') if PARTITION_PATTERN.match(path.stem))
+
+
+def to_cents(value):
+    return int((Decimal(str(value)) * 100).quantize(Decimal(1), ROUND_HALF_UP))
+
+
+def to_minutes(value):
+    if isinstance(value, str):
+        value = time.fromisoformat(value)
+    return value.hour * 60 + value.minute
+
+
+def convert_default_partition(apps, schema_editor):
+    """默认分区原地转换（列类型随后由 AlterField 变更，值按原样复制）"""
+    assignments = ', '.join(f'{column} = {expression}' for column, expression in CONVERSIONS.items())
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'UPDATE passenger_flow SET {assignments}')
+
+
+def rebuild_partitions(apps, schema_editor):
+    """按新的 passenger_flow 表结构重建各月分区并转换记录"""
+    columns = UNCHANGED + list(CONVERSIONS)
+    expressions = UNCHANGED + list(CONVERSIONS.values())
+    with schema_editor.connection.cursor() as cursor:
+        for table in list_partitions(cursor):
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL", [table]
+            )
+            for (index,) in cursor.fetchall():
+                cursor.execute(f'DROP INDEX "{index}"')
+            cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{table}_old"')
+            create_partition(cursor, table)
+            cursor.execute(
+                f'INSERT INTO "{table}" ({", ".join(columns)}) SELECT {", ".join(expressions)} FROM "{table}_old"'
+            )
+            cursor.execute(f'DROP TABLE "{table}_old"')
+
+
+def convert_archives(apps, schema_editor):
+    """归档文件转换为与数据库一致的紧凑取值（分钟数、整数分、站点ID）"""
+    Station = apps.get_model('data_management', 'Station')
+    using = schema_editor.connection.alias
+    # 空库（如新建的测试库）不读取归档目录
+    if not Station.objects.using(using).exists():
+        return
+    station_ids = dict(Station.objects.using(using).values_list('telecode', 'id'))
+    for path in list_archives():
+        data = pq.read_table(path)
+        if 'start_station_telecode' not in data.column_names:
+            continue
+        columns = data.to_pydict()
+        for name, convert in (('arrival_time', to_minutes), ('departure_time', to_minutes),
+                              ('ticket_price', to_cents), ('revenue', to_cents)):
+            columns[name] = [None if value is None else convert(value) for value in columns[name]]
+        for end in ('start', 'end'):
+            columns[f'{end}_station_id'] = [station_ids.get(code) for code in columns.pop(f'{end}_station_telecode')]
+        converted = pa.table({name: columns[name] for name in ARCHIVE_SCHEMA.names}, schema=ARCHIVE_SCHEMA)
+        temporary = path.with_name(path.name + '.tmp')
+        pq.write_table(converted, str(temporary), compression='zstd', row_group_size=ARCHIVE_ROW_GROUP_SIZE)
+        os.replace(temporary, path)
+
+
+# 回滚只恢复表结构，已转换的取值不再还原
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0006_calendar_dimension'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passengerflow',
+            name='start_station',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='data_management.station', verbose_name='起点站'),
+        ),
+        migrations.AddField(
+            model_name='passengerflow',
+            name='end_station',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='data_management.station', verbose_name='终点站'),
+        ),
+        migrations.RunPython(convert_default_partition, migrations.RunPython.noop, elidable=False),
+        migrations.RemoveField(
+            model_name='passengerflow',
+            name='start_station_telecode',
+        ),
+        migrations.RemoveField(
+            model_name='passengerflow',
+            name='end_station_telecode',
+        ),
+        migrations.AlterField(
+            model_name='passengerflow',
+            name='arrival_time',
+            field=data_management.fields.MinuteOfDayField(blank=True, null=True, verbose_name='到达时间'),
+        ),
+        migrations.AlterField(
+            model_name='passengerflow',
+            name='departure_time',
+            field=data_management.fields.MinuteOfDayField(blank=True, null=True, verbose_name='出发时间'),
+        ),
+        migrations.AlterField(
+            model_name='passengerflow',
+            name='ticket_price',
+            field=data_management.fields.CentsField(blank=True, null=True, verbose_name='车票价格'),
+        ),
+        migrations.AlterField(
+            model_name='passengerflow',
+            name='revenue',
+            field=data_management.fields.CentsField(blank=True, null=True, verbose_name='收入'),
+        ),
+        migrations.AlterField(
+            model_name='passengerflow',
+            name='created_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='创建时间'),
+        ),
+        migrations.AlterField(
+            model_name='passengerflow',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='更新时间'),
+        ),
+        migrations.RunPython(rebuild_partitions, migrations.RunPython.noop, elidable=False),
+        migrations.RunPython(convert_archives, migrations.RunPython.noop, elidable=False),
+    ]
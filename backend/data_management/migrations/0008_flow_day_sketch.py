@@ -0,0 +1,28 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('data_management', '0007_compact_passenger_flow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FlowDaySketch',
+            fields=[
+                ('operation_date', models.DateField(primary_key=True, serialize=False, verbose_name='运行日期')),
+                ('trains', models.BinaryField(verbose_name='列车位图')),
+                ('stations', models.BinaryField(verbose_name='站点位图')),
+                ('routes', models.BinaryField(verbose_name='线路位图')),
+            ],
+            options={
+                'verbose_name': '运行日去重草图',
+                'verbose_name_plural': '运行日去重草图',
+                'db_table': 'flow_day_sketch',
+                'ordering': ['operation_date'],
+            },
+        ),
+    ]
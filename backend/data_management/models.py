@@ -1,6 +1,9 @@
-from django.db import models
+from django.db import models, router
 from django.utils import timezone
 
+from .fields import CentsField, MinuteOfDayField
+from .partitions import PartitionedManager
+
 
 class Station(models.Model):
     """站点表"""
@@ -104,25 +107,51 @@ class PassengerFlow(models.Model):
     station = models.ForeignKey(Station, on_delete=models.CASCADE, verbose_name='站点')
     route_station_sequence = models.IntegerField(null=True, blank=True, verbose_name='线路站点顺序')
     operation_date = models.DateField(verbose_name='运行日期')
-    arrival_time = models.TimeField(null=True, blank=True, verbose_name='到达时间')
-    departure_time = models.TimeField(null=True, blank=True, verbose_name='出发时间')
+    # 时刻按当日分钟数、金额按整数分保存，起终点站以站点ID保存（见 fields.py）
+    arrival_time = MinuteOfDayField(null=True, blank=True, verbose_name='到达时间')
+    departure_time = MinuteOfDayField(null=True, blank=True, verbose_name='出发时间')
     passengers_in = models.IntegerField(default=0, verbose_name='上客量')
     passengers_out = models.IntegerField(default=0, verbose_name='下客量')
-    ticket_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='车票价格')
-    start_station_telecode = models.CharField(max_length=10, null=True, blank=True, verbose_name='起点站电报码')
-    end_station_telecode = models.CharField(max_length=10, null=True, blank=True, verbose_name='终点站电报码')
-    revenue = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name='收入')
-    created_at = models.DateTimeField(default=timezone.now, verbose_name='创建时间')
-    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新时间')
+    ticket_price = CentsField(null=True, blank=True, verbose_name='车票价格')
+    start_station = models.ForeignKey(
+        Station, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='+',
+        verbose_name='起点站'
+    )
+    end_station = models.ForeignKey(
+        Station, on_delete=models.SET_NULL, null=True, blank=True, db_index=False, related_name='+',
+        verbose_name='终点站'
+    )
+    revenue = CentsField(null=True, blank=True, verbose_name='收入')
+    # 审计时间戳只在单条保存时记录，批量导入的记录为空
+    created_at = models.DateTimeField(null=True, blank=True, verbose_name='创建时间')
+    updated_at = models.DateTimeField(null=True, blank=True, verbose_name='更新时间')
+
+    # 查询跨默认分区与月分区（见 partitions.py）
+    objects = PartitionedManager()
 
     class Meta:
         db_table = 'passenger_flow'
+        base_manager_name = 'objects'
         verbose_name = '客运记录'
         verbose_name_plural = '客运记录'
+        # 日期/站点/线路三个复合索引均覆盖聚合所需列（含到达时间与客流、收入），
+        # 区间汇总与小时分布查询只读索引、不回表
         indexes = [
-            models.Index(fields=['operation_date']),
-            models.Index(fields=['route', 'operation_date']),
-            models.Index(fields=['station', 'operation_date']),
+            models.Index(
+                fields=['operation_date', 'station', 'train', 'route',
+                        'arrival_time', 'passengers_in', 'passengers_out', 'revenue'],
+                name='pf_date_cover_idx'
+            ),
+            models.Index(
+                fields=['station', 'operation_date', 'train', 'arrival_time',
+                        'passengers_in', 'passengers_out', 'revenue'],
+                name='pf_station_date_cover_idx'
+            ),
+            models.Index(
+                fields=['route', 'operation_date', 'station', 'train', 'arrival_time',
+                        'passengers_in', 'passengers_out', 'revenue'],
+                name='pf_route_date_cover_idx'
+            ),
             models.Index(fields=['train']),
         ]
         ordering = ['-operation_date', 'route', 'train', 'station']
@@ -130,7 +159,154 @@ class PassengerFlow(models.Model):
     def __str__(self):
         return f'{self.operation_date} {self.train.code} @ {self.station.name}'
 
+    def save(self, *args, **kwargs):
+        now = timezone.now()
+        if self.created_at is None:
+            self.created_at = now
+        self.updated_at = now
+        super().save(*args, **kwargs)
+
+    def delete(self, using=None, keep_parents=False):
+        """单条删除同样按分区删除，并扣减计数、递增版本"""
+        using = using or router.db_for_write(type(self), instance=self)
+        result = type(self).objects.using(using).filter(pk=self.pk).delete()
+        self.pk = None
+        return result
+
     @property
     def total_passengers(self):
         """总客流量"""
         return self.passengers_in + self.passengers_out
+
+
+class DataVersion(models.Model):
+    """数据表版本：导入或写入后递增，用于生成条件请求的 ETag/Last-Modified"""
+    table = models.CharField(max_length=64, primary_key=True, verbose_name='数据表')
+    version = models.PositiveBigIntegerField(default=0, verbose_name='版本号')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'data_version'
+        verbose_name = '数据版本'
+        verbose_name_plural = '数据版本'
+
+    def __str__(self):
+        return f'{self.table}: v{self.version}'
+
+
+class TableStatistic(models.Model):
+    """数据表行数：与数据写入在同一事务中维护，统计接口不再扫描数据表（客运记录含已归档月份）"""
+    table = models.CharField(max_length=64, primary_key=True, verbose_name='数据表')
+    row_count = models.BigIntegerField(default=0, verbose_name='行数')
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name='更新时间')
+
+    class Meta:
+        db_table = 'table_statistic'
+        verbose_name = '数据表行数'
+        verbose_name_plural = '数据表行数'
+
+    def __str__(self):
+        return f'{self.table}: {self.row_count}'
+
+
+class FlowDayCount(models.Model):
+    """客运记录每个运行日的记录数（含已归档月份，记录数为 0 的日期不保留）"""
+    operation_date = models.DateField(primary_key=True, verbose_name='运行日期')
+    record_count = models.BigIntegerField(default=0, verbose_name='记录数')
+
+    class Meta:
+        db_table = 'flow_day_count'
+        verbose_name = '运行日记录数'
+        verbose_name_plural = '运行日记录数'
+        ordering = ['operation_date']
+
+    def __str__(self):
+        return f'{self.operation_date}: {self.record_count}'
+
+
+class FlowDaySketch(models.Model):
+    """客运记录每个运行日的去重草图：列车、站点、线路ID的位图（含已归档月份，按需生成）"""
+    operation_date = models.DateField(primary_key=True, verbose_name='运行日期')
+    trains = models.BinaryField(verbose_name='列车位图')
+    stations = models.BinaryField(verbose_name='站点位图')
+    routes = models.BinaryField(verbose_name='线路位图')
+
+    class Meta:
+        db_table = 'flow_day_sketch'
+        verbose_name = '运行日去重草图'
+        verbose_name_plural = '运行日去重草图'
+        ordering = ['operation_date']
+
+    def __str__(self):
+        return str(self.operation_date)
+
+
+class Holiday(models.Model):
+    """节假日定义（法定节假日、调休上班日与春运/暑运等运输高峰期，从本地文件导入）"""
+    KIND_HOLIDAY = 'holiday'
+    KIND_WORKDAY = 'workday'
+    KIND_PERIOD = 'period'
+    KIND_CHOICES = [
+        (KIND_HOLIDAY, '法定节假日'),
+        (KIND_WORKDAY, '调休上班'),
+        (KIND_PERIOD, '运输高峰期'),
+    ]
+
+    name = models.CharField(max_length=50, verbose_name='名称')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name='类型')
+    start_date = models.DateField(verbose_name='开始日期')
+    end_date = models.DateField(verbose_name='结束日期')
+
+    class Meta:
+        db_table = 'holiday'
+        verbose_name = '节假日'
+        verbose_name_plural = '节假日'
+        ordering = ['start_date', 'kind']
+
+    def __str__(self):
+        return f'{self.name}（{self.get_kind_display()}）: {self.start_date} ~ {self.end_date}'
+
+
+class CalendarDay(models.Model):
+    """日历维度表：每个日期的星期、ISO 周、月、季度、节假日与上年同期对应日期（以运行日期为键关联客运记录）"""
+    DAY_TYPE_WORKDAY = 'workday'
+    DAY_TYPE_WEEKEND = 'weekend'
+    DAY_TYPE_HOLIDAY = 'holiday'
+    DAY_TYPE_CHOICES = [
+        (DAY_TYPE_WORKDAY, '工作日'),
+        (DAY_TYPE_WEEKEND, '周末'),
+        (DAY_TYPE_HOLIDAY, '节假日'),
+    ]
+
+    date = models.DateField(primary_key=True, verbose_name='日期')
+    year = models.IntegerField(verbose_name='年')
+    quarter = models.IntegerField(verbose_name='季度')
+    month = models.IntegerField(verbose_name='月')
+    weekday = models.IntegerField(verbose_name='星期（1=周一）')
+    iso_year = models.IntegerField(verbose_name='ISO 年')
+    iso_week = models.IntegerField(verbose_name='ISO 周')
+    is_weekend = models.BooleanField(default=False, verbose_name='是否周末')
+    holiday = models.CharField(max_length=50, blank=True, default='', verbose_name='节假日名称')
+    is_holiday = models.BooleanField(default=False, verbose_name='是否法定节假日')
+    is_adjusted_workday = models.BooleanField(default=False, verbose_name='是否调休上班')
+    day_type = models.CharField(max_length=20, choices=DAY_TYPE_CHOICES, verbose_name='日期类型')
+    holiday_period = models.CharField(max_length=50, blank=True, default='', verbose_name='运输高峰期')
+    is_holiday_period = models.BooleanField(default=False, verbose_name='是否运输高峰期')
+    prior_year_date = models.DateField(verbose_name='上年同期对应日期')
+
+    class Meta:
+        db_table = 'calendar_day'
+        verbose_name = '日历'
+        verbose_name_plural = '日历'
+        indexes = [
+            models.Index(fields=['year', 'month']),
+            models.Index(fields=['iso_year', 'iso_week']),
+            models.Index(fields=['weekday']),
+            models.Index(fields=['day_type']),
+            models.Index(fields=['holiday']),
+            models.Index(fields=['holiday_period']),
+        ]
+        ordering = ['date']
+
+    def __str__(self):
+        return f'{self.date}: {self.get_day_type_display()}{f" {self.holiday}" if self.holiday else ""}'
@@ -0,0 +1,525 @@
+"""客运记录按月分区
+
+批量导入的客运记录按运行日期写入月分区表 passenger_flow_YYYYMM（表结构与索引复制自
+passenger_flow），passenger_flow 本身作为默认分区，保存通过 ORM 单条新增的记录。更新在记录所在的
+表内原地执行，运行日期改到其他月份的分区记录随之移入该月分区。
+
+PassengerFlow.objects 的查询在编译时把 passenger_flow 替换为「默认分区 + 与 operation_date
+条件相交的月分区」的 UNION ALL，只选取查询引用到的列，各分区仍走覆盖索引；删除一个月的
+数据只需 DROP TABLE。
+"""
+import re
+from collections import Counter
+from datetime import date
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Manager, QuerySet
+from django.db.models.constants import OnConflict
+from django.db.models.expressions import Col
+from django.db.models.lookups import Lookup
+from django.db.models.signals import pre_delete
+from django.db.models.sql import InsertQuery, Query, UpdateQuery
+from django.db.models.sql.compiler import SQLCompiler
+from django.db.models.sql.datastructures import BaseTable
+from django.db.models.sql.where import AND
+from django.dispatch import receiver
+
+FLOW_TABLE = 'passenger_flow'
+PARTITION_PATTERN = re.compile(r'^passenger_flow_(\d{4})(\d{2})$')
+
+# 编译阶段的占位符，生成完整SQL后替换为分区子查询
+_SOURCE_PLACEHOLDER = '__passenger_flow_partitions__'
+
+
+def partition_name(day):
+    """运行日期所在月份的分区表名"""
+    return f'{FLOW_TABLE}_{day.year:04d}{day.month:02d}'
+
+
+def partition_bounds(table):
+    """分区表对应月份的首日与末日"""
+    match = PARTITION_PATTERN.match(table)
+    year, month = int(match.group(1)), int(match.group(2))
+    first = date(year, month, 1)
+    following = date(year + month // 12, month % 12 + 1, 1)
+    return first, date.fromordinal(following.toordinal() - 1)
+
+
+def list_partitions(using='default'):
+    """按月份排序的现有分区表"""
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE %s",
+            [f'{FLOW_TABLE}_%'],
+        )
+        return sorted(name for (name,) in cursor.fetchall() if PARTITION_PATTERN.match(name))
+
+
+def partitions_for_ranges(ranges, using='default'):
+    """与任一 (起始, 结束) 日期区间相交的分区；区间端点为 None 表示不限"""
+    selected = []
+    for table in list_partitions(using):
+        first, last = partition_bounds(table)
+        for start, end in ranges:
+            if (start is None or last >= start) and (end is None or first <= end):
+                selected.append(table)
+                break
+    return selected
+
+
+def ensure_partition(day, using='default'):
+    """创建（如不存在）运行日期所在月的分区表及其索引"""
+    table = partition_name(day)
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+        if cursor.fetchone():
+            return table
+        cursor.execute(
+            "SELECT type, name, sql FROM sqlite_master WHERE tbl_name = %s AND sql IS NOT NULL "
+            "ORDER BY type = 'index'",
+            [FLOW_TABLE],
+        )
+        suffix = table[len(FLOW_TABLE):]
+        for kind, name, ddl in cursor.fetchall():
+            quoted_table = connection.ops.quote_name(FLOW_TABLE)
+            ddl = ddl.replace(quoted_table, connection.ops.quote_name(table), 1)
+            if kind == 'index':
+                ddl = ddl.replace(connection.ops.quote_name(name), connection.ops.quote_name(name + suffix), 1)
+            cursor.execute(ddl)
+    return table
+
+
+def drop_partition(table, using='default', archived=False):
+    """删除整月分区（DROP TABLE，不逐行删除）；archived 表示记录已写入归档文件，统计计数不变"""
+    if not PARTITION_PATTERN.match(table):
+        raise ValueError(f'不是客运记录分区表: {table}')
+    from . import stats
+    from .versioning import bump_versions
+
+    with transaction.atomic(using=using):
+        if not archived:
+            stats.adjust_flow_days({day: -records for day, records in stats.table_day_counts(table, using).items()},
+                                   using)
+        with connections[using].cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {connections[using].ops.quote_name(table)}')
+        bump_versions(FLOW_TABLE)
+
+
+def migrate_default_partition(using='default'):
+    """把默认分区中的记录按月移入分区表（主键保持不变），返回 {分区表: 行数}"""
+    from .versioning import bump_versions
+
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT DISTINCT substr(operation_date, 1, 7) FROM {qn(FLOW_TABLE)} ORDER BY 1')
+        months = [month for (month,) in cursor.fetchall()]
+        cursor.execute(f'SELECT * FROM {qn(FLOW_TABLE)} LIMIT 0')
+        columns = ', '.join(qn(column[0]) for column in cursor.description)
+
+    moved = {}
+    for month in months:
+        first = date.fromisoformat(f'{month}-01')
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            table = ensure_partition(first, using)
+            last = partition_bounds(table)[1]
+            params = [first.isoformat(), last.isoformat()]
+            cursor.execute(
+                f'INSERT INTO {qn(table)} ({columns}) SELECT {columns} FROM {qn(FLOW_TABLE)} '
+                f'WHERE operation_date BETWEEN %s AND %s', params
+            )
+            moved[table] = cursor.rowcount
+            cursor.execute(f'DELETE FROM {qn(FLOW_TABLE)} WHERE operation_date BETWEEN %s AND %s', params)
+            bump_versions(FLOW_TABLE)
+    return moved
+
+
+def allocate_ids(count, using='default'):
+    """为写入分区的记录分配全局唯一的主键区段，返回首个ID
+
+    主键序列与默认分区共用（sqlite_sequence），之后 ORM 插入默认分区的记录不会与分区内的ID冲突。
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        current = 0
+        for table in [FLOW_TABLE, *list_partitions(using)]:
+            cursor.execute(f'SELECT MAX(id) FROM {connection.ops.quote_name(table)}')
+            current = max(current, cursor.fetchone()[0] or 0)
+        cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [FLOW_TABLE])
+        row = cursor.fetchone()
+        if row is None:
+            cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [FLOW_TABLE, current + count])
+        else:
+            current = max(current, row[0])
+            cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [current + count, FLOW_TABLE])
+    return current + 1
+
+
+def insert_rows(columns, rows, using='default'):
+    """按月写入原始行（columns 需包含 operation_date，值为 ISO 日期字符串或 date）"""
+    from . import stats
+
+    rows = list(rows)
+    if not rows:
+        return 0
+    connection = connections[using]
+    date_index = columns.index('operation_date')
+    days = Counter(_parse_date(row[date_index]) for row in rows)
+    if not settings.PASSENGER_FLOW_PARTITIONING:
+        sql = (f'INSERT INTO {connection.ops.quote_name(FLOW_TABLE)} ({", ".join(columns)}) '
+               f'VALUES ({", ".join(["%s"] * len(columns))})')
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+            stats.adjust_flow_days(days, using)
+        return len(rows)
+
+    by_month = {}
+    for row in rows:
+        day = _parse_date(row[date_index])
+        by_month.setdefault((day.year, day.month), []).append(row)
+
+    with transaction.atomic(using=using):
+        stats.adjust_flow_days(days, using)
+        next_id = allocate_ids(len(rows), using)
+        with connection.cursor() as cursor:
+            for (year, month), month_rows in sorted(by_month.items()):
+                table = ensure_partition(date(year, month, 1), using)
+                sql = (f'INSERT INTO {connection.ops.quote_name(table)} (id, {", ".join(columns)}) '
+                       f'VALUES ({", ".join(["%s"] * (len(columns) + 1))})')
+                cursor.executemany(sql, [(next_id + i, *row) for i, row in enumerate(month_rows)])
+                next_id += len(month_rows)
+    return len(rows)
+
+
+def flow_source(columns, ranges, using='default', alias=FLOW_TABLE):
+    """原生SQL中代替 passenger_flow 的 FROM 子句（默认分区 + 与日期区间相交的月分区）"""
+    connection = connections[using]
+    tables = [FLOW_TABLE, *partitions_for_ranges(ranges, using)]
+    return _union_source(connection, tables, columns, alias)
+
+
+def _union_source(connection, tables, columns, alias):
+    qn = connection.ops.quote_name
+    if len(tables) == 1:
+        return tables[0] if tables[0] == alias else f'{qn(tables[0])} AS {qn(alias)}'
+    column_list = ', '.join(qn(column) for column in columns)
+    arms = ' UNION ALL '.join(f'SELECT {column_list} FROM {qn(table)}' for table in tables)
+    return f'({arms}) AS {qn(alias)}'
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def date_bounds(where, alias):
+    """从 WHERE 条件（仅 AND 连接的部分）提取 operation_date 的上下界"""
+    lower = upper = None
+    if where.negated or where.connector != AND:
+        return lower, upper
+    for child in where.children:
+        if not isinstance(child, Lookup):
+            if hasattr(child, 'children'):
+                child_lower, child_upper = date_bounds(child, alias)
+                lower = max(filter(None, [lower, child_lower]), default=None)
+                upper = min(filter(None, [upper, child_upper]), default=None)
+            continue
+        lhs = child.lhs
+        if not (isinstance(lhs, Col) and lhs.alias == alias and lhs.target.attname == 'operation_date'):
+            continue
+        name = child.lookup_name
+        values = child.rhs if name in ('range', 'in') else [child.rhs]
+        try:
+            dates = [_parse_date(value) for value in values]
+        except TypeError:
+            continue
+        if not dates or None in dates:
+            continue
+        if name in ('exact', 'range', 'in', 'gt', 'gte'):
+            lower = max(filter(None, [lower, min(dates)]))
+        if name in ('exact', 'range', 'in', 'lt', 'lte'):
+            upper = min(filter(None, [upper, max(dates)]))
+    return lower, upper
+
+
+def _filters_pk(where, alias):
+    """WHERE 条件（仅 AND 连接的部分）是否限定了主键的取值"""
+    if where.negated or where.connector != AND:
+        return False
+    for child in where.children:
+        if isinstance(child, Lookup):
+            lhs = child.lhs
+            if (isinstance(lhs, Col) and lhs.alias == alias and lhs.target.primary_key
+                    and child.lookup_name in ('exact', 'in')):
+                return True
+        elif hasattr(child, 'children') and _filters_pk(child, alias):
+            return True
+    return False
+
+
+class PartitionedTable(BaseTable):
+    """编译时代替 passenger_flow 的表，输出占位符与原别名"""
+
+    def as_sql(self, compiler, connection):
+        return f'{_SOURCE_PLACEHOLDER} {compiler.quote_name_unless_alias(self.table_alias)}', []
+
+
+class PartitionedSQLCompiler(SQLCompiler):
+    """生成SQL后把占位符替换为所需分区的 UNION ALL（只选取外层引用的列）"""
+
+    def as_sql(self, with_limits=True, with_col_aliases=False):
+        # COUNT 等聚合查询在编译前尚未登记基础表
+        alias = self.query.get_initial_alias()
+        table = self.query.alias_map.get(alias)
+        if type(table) is not BaseTable or table.table_name != FLOW_TABLE:
+            return super().as_sql(with_limits, with_col_aliases)
+
+        tables = self.query.partition_tables
+        if tables is None:
+            lower, upper = date_bounds(self.query.where, alias)
+            tables = [FLOW_TABLE, *partitions_for_ranges([(lower, upper)], self.using)]
+        if tables == [FLOW_TABLE]:
+            return super().as_sql(with_limits, with_col_aliases)
+
+        self.query.alias_map[alias] = PartitionedTable(table.table_name, alias)
+        try:
+            sql, params = super().as_sql(with_limits, with_col_aliases)
+        finally:
+            self.query.alias_map[alias] = table
+
+        quoted = re.escape(self.quote_name_unless_alias(alias))
+        columns = sorted(set(re.findall(rf'{quoted}\."(\w+)"', sql))) or ['id']
+        source = _union_source(self.connection, tables, columns, alias)
+        # _union_source 已带别名，去掉占位符后的原别名
+        placeholder = f'{_SOURCE_PLACEHOLDER} {self.quote_name_unless_alias(alias)}'
+        return sql.replace(placeholder, source, 1), params
+
+
+class PartitionedQuery(Query):
+    """SELECT 查询按分区编译；partition_tables 可显式指定物理表（内部按分区删除/迁移时使用）"""
+    partition_tables = None
+
+    def get_compiler(self, using=None, connection=None, elide_empty=True):
+        compiler = super().get_compiler(using, connection, elide_empty)
+        if type(compiler) is SQLCompiler:
+            compiler.__class__ = PartitionedSQLCompiler
+        return compiler
+
+
+class PartitionedQuerySet(QuerySet):
+    """客运记录查询集：读取跨分区；批量写入按月路由；更新/删除同时作用于各分区"""
+
+    def __init__(self, model=None, query=None, using=None, hints=None):
+        super().__init__(model, query or PartitionedQuery(model), using, hints)
+
+    def _scoped_partitions(self):
+        """与日期条件相交的分区；只按主键过滤（如单条保存）时只取记录所在月份的分区"""
+        alias = self.query.get_initial_alias()
+        lower, upper = date_bounds(self.query.where, alias)
+        if lower is None and upper is None and _filters_pk(self.query.where, alias):
+            days = {_parse_date(day) for day in self.order_by().values_list('operation_date', flat=True).distinct()}
+            months = {partition_name(day) for day in days if day is not None}
+            return [table for table in list_partitions(self.db) if table in months]
+        return partitions_for_ranges([(lower, upper)], self.db)
+
+    def _ids_in(self, table):
+        """指定分区内命中当前条件的主键子查询"""
+        queryset = self.order_by().values('pk')
+        queryset.query.partition_tables = [table]
+        return queryset.query.get_compiler(self.db).as_sql()
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False, **kwargs):
+        from . import stats
+
+        objs = list(objs)
+        if not objs:
+            return objs
+        if not settings.PASSENGER_FLOW_PARTITIONING or kwargs.get('update_conflicts'):
+            with transaction.atomic(using=self.db, savepoint=False):
+                objs = super().bulk_create(objs, batch_size, ignore_conflicts, **kwargs)
+                if not kwargs.get('update_conflicts'):
+                    stats.adjust_flow_days(Counter(_parse_date(obj.operation_date) for obj in objs), self.db)
+            return objs
+        connection = connections[self.db]
+        opts = self.model._meta
+        fields = [field for field in opts.concrete_fields]
+        on_conflict = OnConflict.IGNORE if ignore_conflicts else None
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            missing = [obj for obj in objs if obj.pk is None]
+            if missing:
+                first_id = allocate_ids(len(missing), self.db)
+                for offset, obj in enumerate(missing):
+                    obj.pk = first_id + offset
+
+            by_table = {}
+            for obj in objs:
+                obj._prepare_related_fields_for_save(operation_name='bulk_create')
+                by_table.setdefault(partition_name(_parse_date(obj.operation_date)), []).append(obj)
+
+            quoted_default = connection.ops.quote_name(FLOW_TABLE)
+            size = batch_size or max(connection.ops.bulk_batch_size(fields, objs), 1)
+            with connection.cursor() as cursor:
+                for table, table_objs in sorted(by_table.items()):
+                    ensure_partition(partition_bounds(table)[0], self.db)
+                    for start in range(0, len(table_objs), size):
+                        query = InsertQuery(self.model, on_conflict=on_conflict)
+                        query.insert_values(fields, table_objs[start:start + size])
+                        for sql, params in query.get_compiler(using=self.db).as_sql():
+                            cursor.execute(sql.replace(quoted_default, connection.ops.quote_name(table), 1), params)
+            # 新记录的主键刚分配，不会与已有记录冲突，全部计入
+            stats.adjust_flow_days(Counter(_parse_date(obj.operation_date) for obj in objs), self.db)
+
+        for obj in objs:
+            obj._state.adding = False
+            obj._state.db = self.db
+        return objs
+
+    def _update_partitions(self, tables, values, new_date):
+        """在各分区表内原地执行更新，返回更新的行数；运行日期改到其他月份的记录随之移入该月分区"""
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        query = UpdateQuery(self.model)
+        query.add_update_fields(values)
+        sql, params = query.get_compiler(self.db).as_sql()
+        # 新运行日期为常量时只有其所属月份以外的分区需要移动记录；为表达式时逐条检查
+        day = None if new_date is None or hasattr(new_date, 'resolve_expression') else _parse_date(new_date)
+        updated = 0
+        with connection.cursor() as cursor:
+            for table in tables:
+                ids_sql, ids_params = self._ids_in(table)
+                if new_date is None or (day is not None and partition_name(day) == table):
+                    cursor.execute(
+                        f'{sql.replace(qn(FLOW_TABLE), qn(table))} WHERE id IN ({ids_sql})', (*params, *ids_params)
+                    )
+                    updated += cursor.rowcount
+                    continue
+                cursor.execute(ids_sql, ids_params)
+                ids = [row[0] for row in cursor.fetchall()]
+                size = connection.ops.bulk_batch_size(['id'], ids)
+                for start in range(0, len(ids), size):
+                    batch = ids[start:start + size]
+                    placeholders = ', '.join(['%s'] * len(batch))
+                    cursor.execute(
+                        f'{sql.replace(qn(FLOW_TABLE), qn(table))} WHERE id IN ({placeholders})', (*params, *batch)
+                    )
+                    updated += cursor.rowcount
+                    self._reroute(cursor, table, batch, day)
+        return updated
+
+    def _reroute(self, cursor, table, ids, day):
+        """把分区中刚修改运行日期的记录（限 ids）移入所属月份的分区；day 为空时按各记录的新日期逐月移动"""
+        qn = connections[self.db].ops.quote_name
+        columns = ', '.join(qn(field.column) for field in self.model._meta.concrete_fields)
+        placeholders = ', '.join(['%s'] * len(ids))
+        if day is not None:
+            months = [day]
+        else:
+            first, last = partition_bounds(table)
+            cursor.execute(
+                f'SELECT DISTINCT substr(operation_date, 1, 7) FROM {qn(table)} '
+                f'WHERE id IN ({placeholders}) AND operation_date NOT BETWEEN %s AND %s',
+                (*ids, first.isoformat(), last.isoformat()),
+            )
+            months = [date.fromisoformat(f'{month}-01') for (month,) in cursor.fetchall()]
+        for month in months:
+            target = ensure_partition(month, self.db)
+            params = (*ids, *(bound.isoformat() for bound in partition_bounds(target)))
+            condition = f'id IN ({placeholders}) AND operation_date BETWEEN %s AND %s'
+            cursor.execute(
+                f'INSERT INTO {qn(target)} ({columns}) SELECT {columns} FROM {qn(table)} WHERE {condition}', params
+            )
+            cursor.execute(f'DELETE FROM {qn(table)} WHERE {condition}', params)
+
+    def _count_moved_days(self, fields):
+        """修改运行日期或草图中的ID列前的各日记录数；更新后据此调整计数、使草图失效"""
+        from . import stats
+        from .sketches import SKETCH_COLUMNS
+
+        changed = {self.model._meta.get_field(name).attname for name in fields}
+        if changed & {'operation_date', *SKETCH_COLUMNS.values()}:
+            return stats.day_counts(self)
+        return None
+
+    def _recount_moved_days(self, before, new_date):
+        from . import sketches, stats
+
+        if before is None:
+            return
+        if new_date is not None:
+            changes = Counter({day: -records for day, records in before.items()})
+            changes[_parse_date(new_date)] += sum(before.values())
+            stats.adjust_flow_days(changes, self.db)
+        # 记录数不变的日期（如只修改列车）也需要重新生成草图
+        sketches.invalidate(before, self.db)
+
+    def update(self, **kwargs):
+        query = UpdateQuery(self.model)
+        query.add_update_values(kwargs)
+        new_date = kwargs.get('operation_date')
+        with transaction.atomic(using=self.db, savepoint=False):
+            tables = self._scoped_partitions()
+            before = self._count_moved_days(kwargs)
+            updated = self._update_partitions(tables, query.values, new_date) + super().update(**kwargs)
+            self._recount_moved_days(before, new_date)
+            return updated
+
+    def _update(self, values):
+        new_date = next((value for field, _, value in values if field.name == 'operation_date'), None)
+        with transaction.atomic(using=self.db, savepoint=False):
+            tables = self._scoped_partitions()
+            before = self._count_moved_days([field.name for field, _, _ in values])
+            updated = self._update_partitions(tables, values, new_date) + super()._update(values)
+            self._recount_moved_days(before, new_date)
+            return updated
+
+    def delete(self):
+        """按表直接删除（客运记录无下游外键），不逐条加载对象"""
+        if self.query.is_sliced:
+            raise TypeError("Cannot use 'limit' or 'offset' with delete().")
+        from . import stats
+        from .versioning import bump_versions
+
+        connection = connections[self.db]
+        deleted = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            # 删除前按运行日统计将被删除的记录
+            stats.adjust_flow_days({day: -records for day, records in stats.day_counts(self).items()}, self.db)
+            with connection.cursor() as cursor:
+                for table in self._scoped_partitions():
+                    if self.query.where:
+                        ids_sql, params = self._ids_in(table)
+                        cursor.execute(f'DELETE FROM {connection.ops.quote_name(table)} WHERE id IN ({ids_sql})', params)
+                        deleted += cursor.rowcount
+                    else:
+                        # 无条件删除时整表删除分区
+                        cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                        deleted += cursor.fetchone()[0]
+                        cursor.execute(f'DROP TABLE {connection.ops.quote_name(table)}')
+            deleted += self._raw_delete(self.db)
+            bump_versions(FLOW_TABLE)
+        self._result_cache = None
+        return deleted, {self.model._meta.label: deleted}
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
+class PartitionedManager(Manager.from_queryset(PartitionedQuerySet)):
+    pass
+
+
+@receiver(pre_delete, sender='data_management.Station')
+@receiver(pre_delete, sender='data_management.Train')
+@receiver(pre_delete, sender='data_management.Route')
+def delete_related_flows(sender, instance, using, **kwargs):
+    """删除站点/车次/线路前按分区批量删除其客运记录（级联的快速删除只作用于默认分区）"""
+    from .models import PassengerFlow
+
+    PassengerFlow.objects.using(using).filter(**{sender._meta.model_name: instance}).delete()
@@ -39,16 +39,28 @@ class PassengerFlowSerializer(serializers.ModelSerializer):
     station_name = serializers.CharField(source='station.name', read_only=True)
     station_telecode = serializers.CharField(source='station.telecode', read_only=True)
     total_passengers = serializers.IntegerField(read_only=True)
+    # 紧凑存储的列按原有格式输入输出（时刻 HH:MM:SS、金额两位小数、起终点站电报码）
+    arrival_time = serializers.TimeField(required=False, allow_null=True)
+    departure_time = serializers.TimeField(required=False, allow_null=True)
+    ticket_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    revenue = serializers.DecimalField(max_digits=12, decimal_places=2, required=False, allow_null=True)
+    start_station_telecode = serializers.SlugRelatedField(
+        source='start_station', slug_field='telecode', queryset=Station.objects.all(), required=False, allow_null=True
+    )
+    end_station_telecode = serializers.SlugRelatedField(
+        source='end_station', slug_field='telecode', queryset=Station.objects.all(), required=False, allow_null=True
+    )
 
     class Meta:
         model = PassengerFlow
-        fields = '__all__'
+        exclude = ['start_station', 'end_station']
+        read_only_fields = ['updated_at']
         extra_fields = ['route_code', 'train_code', 'station_name', 'station_telecode', 'total_passengers']
 
 
 class PassengerFlowSummarySerializer(serializers.Serializer):
     """客运记录汇总序列化器"""
-    date = serializers.DateField()
+    date = serializers.DateField(source='operation_date')
     total_passengers = serializers.IntegerField()
     total_revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
     avg_passengers_per_train = serializers.FloatField()
@@ -67,6 +79,24 @@ class StationRankingSerializer(serializers.Serializer):
     ranking = serializers.IntegerField()
 
 
+class TravelAreaRankingSerializer(serializers.Serializer):
+    """旅行区排名序列化器"""
+    travel_area_id = serializers.IntegerField(allow_null=True)
+    total_passengers = serializers.IntegerField()
+    passengers_in = serializers.IntegerField()
+    passengers_out = serializers.IntegerField()
+    total_revenue = serializers.DecimalField(max_digits=12, decimal_places=2)
+    ranking = serializers.IntegerField()
+
+
+class StationRankingRequestSerializer(serializers.Serializer):
+    """站点排名请求序列化器：排名指标、分组维度与分页"""
+    metric = serializers.ChoiceField(choices=['total', 'in', 'out', 'revenue'], default='total')
+    group_by = serializers.ChoiceField(choices=['station', 'travel_area_id'], default='station')
+    limit = serializers.IntegerField(required=False, min_value=1)
+    offset = serializers.IntegerField(default=0, min_value=0)
+
+
 class TimeDistributionSerializer(serializers.Serializer):
     """时间分布序列化器"""
     hour = serializers.IntegerField()
@@ -99,4 +129,6 @@ class FlowAnalysisRequestSerializer(serializers.Serializer):
     time_granularity = serializers.ChoiceField(
         choices=['hour', 'day', 'week', 'month', 'quarter', 'year'],
         default='day'
-    )
\ No newline at end of file
+    )
+    # 去重计数扫描记录，不使用每日草图
+    exact = serializers.BooleanField(default=False)
@@ -3,7 +3,10 @@ import numpy as np
 from pathlib import Path
 from datetime import datetime, time
 from django.db import transaction
+from railway_backend.metrics import IMPORT_DURATION
+from . import archive
 from .models import Station, Train, Route, RouteStation, PassengerFlow
+from .signals import data_imported
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,25 +19,33 @@ class DataImportService:
         self.data_dir = data_dir or Path(__file__).parent.parent / 'db'
         logger.info(f"数据目录: {self.data_dir}")
 
-    def import_all_data(self):
-        """导入所有数据"""
+    def import_all_data(self, progress=None):
+        """导入所有数据；progress(完成比例, 说明) 在每个步骤开始前调用"""
+        steps = [
+            ('导入站点数据', self.import_stations),
+            ('导入列车数据', self.import_trains),
+            ('导入线路数据', self.import_routes),
+            ('导入线路站点数据', self.import_route_stations),
+            ('导入客运记录数据', self.import_passenger_flow),
+        ]
         try:
-            with transaction.atomic():
+            with IMPORT_DURATION.time(job='import_all_data'), transaction.atomic():
                 logger.info("开始导入所有数据...")
 
                 # 按顺序导入：站点 -> 列车 -> 线路 -> 线路站点 -> 客运记录
-                self.import_stations()
-                self.import_trains()
-                self.import_routes()
-                self.import_route_stations()
-                self.import_passenger_flow()
+                for index, (label, step) in enumerate(steps):
+                    if progress is not None:
+                        progress(index / len(steps), label)
+                    step()
 
                 logger.info("所有数据导入完成！")
-                return True
         except Exception as e:
             logger.error(f"数据导入失败: {e}")
             raise
 
+        data_imported.send(sender=self.__class__)
+        return True
+
     def import_stations(self):
         """导入站点数据"""
         file_path = self.data_dir / 'stations.csv'
@@ -167,6 +178,8 @@ class DataImportService:
         total_records = len(df)
         logger.info(f"总记录数: {total_records}")
 
+        # 起终点站电报码按站点ID保存
+        station_ids = dict(Station.objects.values_list('telecode', 'id'))
         passenger_flows = []
         for i, row in df.iterrows():
             try:
@@ -198,8 +211,8 @@ class DataImportService:
                     passengers_in=int(row['skl']) if pd.notna(row['skl']) else 0,
                     passengers_out=int(row['xkl']) if pd.notna(row['xkl']) else 0,
                     ticket_price=float(row['ticket_price']) if pd.notna(row['ticket_price']) else None,
-                    start_station_telecode=str(row['start_station_telecode']).strip() if pd.notna(row['start_station_telecode']) else None,
-                    end_station_telecode=str(row['end_station_telecode']).strip() if pd.notna(row['end_station_telecode']) else None,
+                    start_station_id=station_ids.get(str(row['start_station_telecode']).strip()) if pd.notna(row['start_station_telecode']) else None,
+                    end_station_id=station_ids.get(str(row['end_station_telecode']).strip()) if pd.notna(row['end_station_telecode']) else None,
                     revenue=float(row['shouru']) if pd.notna(row['shouru']) else None,
                 )
                 passenger_flows.append(passenger_flow)
@@ -248,6 +261,7 @@ class DataImportService:
         """清除所有数据"""
         logger.info("清除所有数据...")
         PassengerFlow.objects.all().delete()
+        archive.clear_archives()
         RouteStation.objects.all().delete()
         Route.objects.all().delete()
         Train.objects.all().delete()
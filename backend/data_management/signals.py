@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# 数据导入完成后发送，派生分析表据此重建
+data_imported = Signal()
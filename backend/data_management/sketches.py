@@ -0,0 +1,182 @@
+"""运行日去重草图
+
+每个运行日的列车、站点、线路ID集合以位图（第 i 位表示ID i）保存在 flow_day_sketch 中，区间内的去重数
+由各日位图按位或合并后计数得到，不再扫描客运记录。ID 为连续的小整数，位图比 HyperLogLog 更小且结果精确。
+
+草图按需生成：写入路径使涉及日期的草图失效（删除该日的草图行），下次查询时缺少草图的日期用一次分组查询
+（已归档的日期读取归档文件）重新生成。归档与恢复不改变记录集合，草图保持有效。
+"""
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+import pyarrow.compute as pc
+from django.conf import settings
+from django.db import transaction
+from django.db.models.lookups import Lookup
+from django.db.models.sql.where import AND
+
+from .models import FlowDayCount, FlowDaySketch, PassengerFlow
+from .partitions import FLOW_TABLE, date_bounds
+
+# 草图中的ID列（与 FlowDaySketch 的位图字段一一对应）
+SKETCH_COLUMNS = {'trains': 'train_id', 'stations': 'station_id', 'routes': 'route_id'}
+
+# 可由草图回答的运行日期条件（均为闭区间）
+DATE_LOOKUPS = {'exact', 'range', 'gte', 'lte'}
+
+# 每次分组查询生成草图的日期数（限制 IN 列表的参数个数）
+BUILD_BATCH_DAYS = 500
+
+DistinctCounts = namedtuple('DistinctCounts', ['trains', 'stations', 'routes'])
+
+EMPTY = DistinctCounts(0, 0, 0)
+
+
+def to_bitmap(ids):
+    """ID 集合转为位图（小端位序，末尾没有多余的全零字节）"""
+    ids = np.fromiter((i for i in ids if i is not None), dtype=np.int64)
+    if not len(ids):
+        return b''
+    bits = np.zeros(int(ids.max()) + 1, dtype=bool)
+    bits[ids] = True
+    return np.packbits(bits, bitorder='little').tobytes()
+
+
+def merge(bitmaps):
+    """按位或合并多个位图"""
+    arrays = [np.frombuffer(bitmap, dtype=np.uint8) for bitmap in bitmaps]
+    merged = np.zeros(max((len(array) for array in arrays), default=0), dtype=np.uint8)
+    for array in arrays:
+        merged[:len(array)] |= array
+    return merged
+
+
+def cardinality(bitmap):
+    """位图中置位的个数"""
+    return int(np.unpackbits(np.asarray(bitmap, dtype=np.uint8)).sum())
+
+
+def date_range(queryset):
+    """查询集只有运行日期的闭区间条件时返回 (起始日期, 结束日期)（可为 None），否则返回 None"""
+    where = queryset.query.where
+    alias = queryset.query.get_initial_alias()
+    if not _dates_only(where, alias):
+        return None
+    return date_bounds(where, alias)
+
+
+def _dates_only(where, alias):
+    if where.negated or where.connector != AND:
+        return False
+    for child in where.children:
+        if isinstance(child, Lookup):
+            lhs = child.lhs
+            if not (getattr(lhs, 'alias', None) == alias and getattr(lhs.target, 'attname', None) == 'operation_date'
+                    and child.lookup_name in DATE_LOOKUPS):
+                return False
+        elif not (hasattr(child, 'children') and _dates_only(child, alias)):
+            return False
+    return True
+
+
+def invalidate(days, using='default'):
+    """使这些运行日的草图失效（与数据写入处于同一事务）"""
+    days = [day for day in days if day is not None]
+    for start in range(0, len(days), BUILD_BATCH_DAYS):
+        FlowDaySketch.objects.using(using).filter(operation_date__in=days[start:start + BUILD_BATCH_DAYS]).delete()
+
+
+def clear(using='default'):
+    """删除全部草图（之后按需重新生成）"""
+    FlowDaySketch.objects.using(using).all().delete()
+
+
+def _collect_ids(days, using):
+    """{运行日期: {草图字段: ID集合}}，合并数据库与归档文件中的记录"""
+    from . import archive
+
+    collected = {day: {name: set() for name in SKETCH_COLUMNS} for day in days}
+    for name, column in SKETCH_COLUMNS.items():
+        for start in range(0, len(days), BUILD_BATCH_DAYS):
+            batch = days[start:start + BUILD_BATCH_DAYS]
+            rows = PassengerFlow.objects.using(using).filter(operation_date__in=batch).order_by().values_list(
+                'operation_date', column).distinct()
+            for day, value in rows:
+                collected[day][name].add(value)
+
+    cold = archive.scan(
+        ['operation_date', *SKETCH_COLUMNS.values()],
+        pc.field('operation_date').isin(days),
+        [(min(days), max(days))],
+    )
+    if cold is not None and cold.num_rows:
+        for name, column in SKETCH_COLUMNS.items():
+            grouped = cold.group_by(['operation_date', column]).aggregate([])
+            for day, value in zip(grouped['operation_date'].to_pylist(), grouped[column].to_pylist()):
+                collected[day][name].add(value)
+    return collected
+
+
+def _build(days, using):
+    """由 using 连接读取记录生成这些运行日的草图，保存到默认库；生成期间客运数据有写入时只返回结果、不保存"""
+    from .versioning import get_versions
+
+    version = get_versions([FLOW_TABLE])[FLOW_TABLE][0]
+    built = {
+        day: {name: to_bitmap(ids) for name, ids in columns.items()}
+        for day, columns in _collect_ids(days, using).items()
+    }
+    with transaction.atomic():
+        if get_versions([FLOW_TABLE])[FLOW_TABLE][0] == version:
+            FlowDaySketch.objects.bulk_create(
+                [FlowDaySketch(operation_date=day, **bitmaps) for day, bitmaps in built.items()],
+                batch_size=BUILD_BATCH_DAYS, ignore_conflicts=True,
+            )
+    return built
+
+
+def day_sketches(start_date=None, end_date=None, using=None):
+    """区间内有记录的各运行日草图 {运行日期: {草图字段: 位图}}，缺少的草图先生成"""
+    using = using or settings.ANALYTICS_DATABASE
+    days = FlowDayCount.objects.using(using)
+    sketches = FlowDaySketch.objects.using(using)
+    if start_date:
+        days = days.filter(operation_date__gte=start_date)
+        sketches = sketches.filter(operation_date__gte=start_date)
+    if end_date:
+        days = days.filter(operation_date__lte=end_date)
+        sketches = sketches.filter(operation_date__lte=end_date)
+
+    result = {
+        day: {'trains': bytes(trains), 'stations': bytes(stations), 'routes': bytes(routes)}
+        for day, trains, stations, routes in sketches.values_list('operation_date', *SKETCH_COLUMNS)
+    }
+    missing = [day for day in days.values_list('operation_date', flat=True) if day not in result]
+    if missing:
+        result.update(_build(missing, using))
+    return result
+
+
+def distinct_counts(start_date=None, end_date=None, period=None, using=None):
+    """按周期合并草图的去重数 {周期: DistinctCounts}；period 把运行日期映射为周期，缺省时整个区间为一个周期 None"""
+    grouped = {}
+    for day, bitmaps in day_sketches(start_date, end_date, using).items():
+        grouped.setdefault(period(day) if period else None, []).append(bitmaps)
+    return {
+        key: DistinctCounts(*(cardinality(merge([bitmaps[name] for bitmaps in group])) for name in SKETCH_COLUMNS))
+        for key, group in grouped.items()
+    }
+
+
+def period_start(day, granularity):
+    """运行日期所在周期（day/week/month/quarter/year）的第一天，与 Trunc 的结果一致"""
+    if granularity == 'week':
+        return date.fromordinal(day.toordinal() - day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if granularity == 'year':
+        return day.replace(month=1, day=1)
+    return day
@@ -0,0 +1,159 @@
+"""数据统计计数
+
+各数据表的行数与客运记录每个运行日的记录数保存在 table_statistic / flow_day_count 中，由写入路径在
+同一事务内增减：导入与批量写入按运行日累加，单条新增/删除由模型信号维护，批量删除、删除分区与清除
+归档在删除前按运行日统计被删除的记录。归档与恢复只在冷热两侧之间移动记录，计数不变。
+
+基础数据（站点、列车、线路、线路站点）批量导入时忽略冲突，新增行数未知，收到 data_imported 后重新统计。
+统计接口只读取这两张小表；计数与实际数据不一致时（如直接修改数据库）可用 rebuild() 重新统计。
+记录数变化的运行日同时使其去重草图失效（见 sketches.py）。
+"""
+from collections import Counter
+from datetime import date
+
+import pyarrow.compute as pc
+from django.db import connections, transaction
+from django.db.models import Count, Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
+
+from . import sketches
+from .models import Station, Train, Route, RouteStation, PassengerFlow, TableStatistic, FlowDayCount
+from .signals import data_imported
+
+FLOW_TABLE = 'passenger_flow'
+
+# 维护行数的数据表
+COUNTED_MODELS = [Station, Train, Route, RouteStation, PassengerFlow]
+
+
+def adjust_rows(table, delta, using='default'):
+    """行数增减 delta"""
+    if not delta:
+        return
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'INSERT INTO table_statistic ("table", row_count, updated_at) VALUES (%s, %s, %s) '
+            'ON CONFLICT ("table") DO UPDATE SET row_count = row_count + excluded.row_count, '
+            'updated_at = excluded.updated_at',
+            [table, delta, connection.ops.adapt_datetimefield_value(timezone.now())],
+        )
+
+
+def adjust_flow_days(counts, using='default'):
+    """按 {运行日期: 增减记录数} 更新每日记录数与客运记录总行数，并使这些日期的去重草图失效"""
+    counts = {day: delta for day, delta in counts.items() if delta}
+    if not counts:
+        return
+    connection = connections[using]
+    with transaction.atomic(using=using, savepoint=False), connection.cursor() as cursor:
+        cursor.executemany(
+            'INSERT INTO flow_day_count (operation_date, record_count) VALUES (%s, %s) '
+            'ON CONFLICT (operation_date) DO UPDATE SET record_count = record_count + excluded.record_count',
+            [(connection.ops.adapt_datefield_value(day), delta) for day, delta in counts.items()],
+        )
+        cursor.execute('DELETE FROM flow_day_count WHERE record_count <= 0')
+        adjust_rows(FLOW_TABLE, sum(counts.values()), using)
+        sketches.invalidate(counts, using)
+
+
+def day_counts(queryset):
+    """查询集中各运行日的记录数 Counter（删除或修改运行日期前调用）"""
+    return Counter(dict(
+        queryset.order_by().values_list('operation_date').annotate(records=Count('id')).values_list(
+            'operation_date', 'records')
+    ))
+
+
+def table_day_counts(table, using='default'):
+    """单个分区表各运行日的记录数"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT operation_date, COUNT(*) FROM {connection.ops.quote_name(table)} GROUP BY operation_date'
+        )
+        return Counter({date.fromisoformat(str(day)[:10]): records for day, records in cursor.fetchall()})
+
+
+def arrow_day_counts(table):
+    """Arrow 表（归档数据）各运行日的记录数"""
+    if table is None or not table.num_rows:
+        return Counter()
+    counts = pc.value_counts(table['operation_date']).to_pylist()
+    return Counter({item['values']: item['counts'] for item in counts})
+
+
+def refresh_table_counts(*models, using='default'):
+    """重新统计小表的行数"""
+    now = timezone.now()
+    for model in models:
+        TableStatistic.objects.using(using).update_or_create(
+            table=model._meta.db_table,
+            defaults={'row_count': model.objects.using(using).count(), 'updated_at': now},
+        )
+
+
+def rebuild(using='default'):
+    """按现有数据与归档文件重新统计全部计数（去重草图全部删除，之后按需重新生成）"""
+    from . import archive
+
+    counts = day_counts(PassengerFlow.objects.using(using)) + arrow_day_counts(archive.scan(['operation_date']))
+    with transaction.atomic(using=using):
+        refresh_table_counts(*[model for model in COUNTED_MODELS if model is not PassengerFlow], using=using)
+        FlowDayCount.objects.using(using).all().delete()
+        sketches.clear(using)
+        FlowDayCount.objects.using(using).bulk_create(
+            [FlowDayCount(operation_date=day, record_count=records) for day, records in sorted(counts.items())],
+            batch_size=1000,
+        )
+        TableStatistic.objects.using(using).update_or_create(
+            table=FLOW_TABLE, defaults={'row_count': sum(counts.values()), 'updated_at': timezone.now()}
+        )
+
+
+def summary():
+    """返回 ({数据表: 行数}, 最早运行日期, 最晚运行日期)，只读取统计表"""
+    rows = {model._meta.db_table: 0 for model in COUNTED_MODELS}
+    rows.update(TableStatistic.objects.values_list('table', 'row_count'))
+    date_range = FlowDayCount.objects.aggregate(min_date=Min('operation_date'), max_date=Max('operation_date'))
+    return rows, date_range['min_date'], date_range['max_date']
+
+
+def coverage(start_date=None, end_date=None):
+    """各运行日的记录数 [(日期, 记录数)]（没有记录的日期不出现）"""
+    queryset = FlowDayCount.objects.all()
+    if start_date:
+        queryset = queryset.filter(operation_date__gte=start_date)
+    if end_date:
+        queryset = queryset.filter(operation_date__lte=end_date)
+    return list(queryset.order_by('operation_date').values_list('operation_date', 'record_count'))
+
+
+def count_saved(sender, instance, created, using, raw=False, **kwargs):
+    if not created:
+        return
+    if sender is PassengerFlow:
+        adjust_flow_days({instance.operation_date: 1}, using)
+    else:
+        adjust_rows(sender._meta.db_table, 1, using)
+
+
+def count_deleted(sender, instance, using, **kwargs):
+    adjust_rows(sender._meta.db_table, -1, using)
+
+
+for model in COUNTED_MODELS:
+    post_save.connect(count_saved, sender=model, dispatch_uid=f'stats_{model._meta.db_table}_save')
+    # 客运记录的删除统一走按分区批量删除（PartitionedQuerySet.delete），在其中一次性扣减计数；
+    # 不注册逐条的删除信号，级联删除才能使用快速删除
+    if model is not PassengerFlow:
+        post_delete.connect(count_deleted, sender=model, dispatch_uid=f'stats_{model._meta.db_table}_delete')
+
+
+def refresh_imported(sender, **kwargs):
+    """导入完成后重新统计基础数据表的行数（客运记录的计数由写入路径累加）"""
+    refresh_table_counts(*[model for model in COUNTED_MODELS if model is not PassengerFlow])
+
+
+data_imported.connect(refresh_imported, dispatch_uid='stats_imported')
@@ -0,0 +1,230 @@
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import date, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# 春节（农历正月初一）公历日期，用于生成春运客流高峰
+SPRING_FESTIVALS = {
+    2015: date(2015, 2, 19), 2016: date(2016, 2, 8), 2017: date(2017, 1, 28),
+    2018: date(2018, 2, 16), 2019: date(2019, 2, 5), 2020: date(2020, 1, 25),
+    2021: date(2021, 2, 12), 2022: date(2022, 2, 1), 2023: date(2023, 1, 22),
+    2024: date(2024, 2, 10), 2025: date(2025, 1, 29), 2026: date(2026, 2, 17),
+    2027: date(2027, 2, 6), 2028: date(2028, 1, 26), 2029: date(2029, 2, 13),
+    2030: date(2030, 2, 3),
+}
+
+# 周一至周日客流系数（周五、周日为高峰）
+WEEKDAY_FACTORS = np.array([0.95, 0.9, 0.9, 0.95, 1.2, 1.05, 1.15])
+
+# 列车始发小时分布（6-22点，早晚高峰）
+DEPARTURE_HOUR_WEIGHTS = np.array([
+    0, 0, 0, 0, 0, 0, 3, 7, 9, 8, 6, 5, 5, 5, 6, 7, 8, 9, 8, 6, 4, 3, 2, 0
+], dtype=float)
+
+# 各始发小时的上座系数
+HOUR_FACTORS = np.array([
+    0.5, 0.5, 0.5, 0.5, 0.5, 0.5, 0.8, 1.1, 1.2, 1.05, 0.95, 0.9,
+    0.9, 0.9, 0.95, 1.0, 1.1, 1.2, 1.15, 1.0, 0.85, 0.75, 0.65, 0.5
+])
+
+# 导入格式的列名及中文说明行（import_passenger_flow 会跳过第二行）
+CSV_COLUMNS = [
+    'xh', 'yyxlbm', 'lcbm', 'zdid', 'xlzdid', 'yxrq', 'ddsj', 'cfsj', 'skl', 'xkl',
+    'ticket_price', 'start_station_telecode', 'end_station_telecode', 'shouru',
+]
+CSV_DESCRIPTIONS = [
+    '序号', '运营线路编码', '列车编码', '站点id', '线路站点id', '运行日期', '到达时间', '出发时间',
+    '上客量', '下客量', '车票价格', '起点站电报码', '终点站电报码', '收入',
+]
+
+
+class SyntheticFlowGenerator:
+    """基于真实线路拓扑的合成客运记录生成器
+
+    相同的 seed 与起始日期总是生成相同的数据；每天的随机数由 (seed, 日期) 派生，
+    因此按天流式输出，内存占用与总行数无关。
+    """
+
+    # 全天平均上客量 / 列车定员
+    TURNOVER = 1.1
+    # 平均乘车站数占停靠站数的比例
+    RIDE_SHARE = 0.4
+    # 每公里票价（元）与起步价
+    FARE_PER_KM = 0.46
+    BASE_FARE = 8.0
+    # 列车定员缺失时使用的默认值
+    DEFAULT_CAPACITY = 1200
+    # 停站时间（分钟）
+    DWELL_MINUTES = 2
+    # 默认起始运行日期
+    DEFAULT_START_DATE = date(2023, 1, 1)
+
+    def __init__(self, data_dir=None, seed=42):
+        self.data_dir = Path(data_dir or Path(__file__).parent.parent / 'db')
+        self.seed = seed
+        self._build_topology()
+
+    def _build_topology(self):
+        """读取站点、列车、线路站点，为每趟列车确定线路、停站序列与时刻"""
+        stations = pd.read_csv(self.data_dir / 'stations.csv', skiprows=[1])
+        trains = pd.read_csv(self.data_dir / 'trains.csv', skiprows=[1]).dropna(subset=['lcbm'])
+        route_stations = pd.read_csv(self.data_dir / 'route_stations.csv', skiprows=[1])
+        rng = np.random.default_rng(self.seed)
+
+        telecodes = dict(zip(stations['zdid'].astype(int), stations['station_telecode'].astype(str).str.strip()))
+        # 站点规模（对数正态），大站上客更多
+        popularity = dict(zip(
+            stations['zdid'].astype(int),
+            rng.lognormal(mean=0.0, sigma=1.0, size=len(stations))
+        ))
+
+        # 每条线路的停靠站：必停站加首末站，累计里程沿全线计算
+        routes = {}
+        for route_id, group in route_stations.sort_values(['yyxlbm', 'xlzdid']).groupby('yyxlbm'):
+            group = group.reset_index(drop=True)
+            cumulative = group['yqzdjjl'].fillna(0).cumsum().to_numpy()
+            stop = group['sfytk'].fillna(1).astype(bool).to_numpy()
+            stop[0] = stop[-1] = True
+            routes[int(route_id)] = {
+                'station_ids': group['zdid'].astype(int).to_numpy()[stop],
+                'sequences': group['xlzdid'].astype(int).to_numpy()[stop],
+                'km': cumulative[stop],
+            }
+        route_ids = np.array(sorted(routes))
+
+        self.train_ids = trains['lcbm'].astype(int).to_numpy()
+        n = len(self.train_ids)
+        capacity = trains['lcyn'].fillna(0).astype(int).to_numpy()
+        self.capacity = np.where(capacity > 0, capacity, self.DEFAULT_CAPACITY)
+        self.train_routes = rng.choice(route_ids, size=n)
+        departure_hours = rng.choice(24, size=n, p=DEPARTURE_HOUR_WEIGHTS / DEPARTURE_HOUR_WEIGHTS.sum())
+        self.hour_factor = HOUR_FACTORS[departure_hours]
+        departure = departure_hours * 60 + rng.integers(0, 60, size=n)
+        speed = rng.uniform(160, 300, size=n)  # km/h
+
+        # 停站矩阵（列车 × 停站序号），不足最大停站数的部分以 mask 标记
+        self.max_stops = max(len(routes[r]['station_ids']) for r in route_ids)
+        shape = (n, self.max_stops)
+        self.mask = np.zeros(shape, dtype=bool)
+        self.station = np.zeros(shape, dtype=np.int64)
+        self.sequence = np.zeros(shape, dtype=np.int64)
+        self.arrival = np.zeros(shape, dtype=np.int64)
+        self.fare = np.zeros(shape)
+        self.weight = np.zeros(shape)
+        self.last_stop = np.zeros(n, dtype=np.int64)
+        self.start_telecode = np.empty(n, dtype=object)
+        self.end_telecode = np.empty(n, dtype=object)
+
+        for i, route_id in enumerate(self.train_routes):
+            route = routes[route_id]
+            k = len(route['station_ids'])
+            km = route['km'] - route['km'][0]
+            self.mask[i, :k] = True
+            self.station[i, :k] = route['station_ids']
+            self.sequence[i, :k] = route['sequences']
+            self.arrival[i, :k] = departure[i] + np.round(km / speed[i] * 60) + np.arange(k) * self.DWELL_MINUTES
+            # 票价按到终点剩余里程的一半估算
+            self.fare[i, :k] = np.round(self.BASE_FARE + self.FARE_PER_KM * (km[-1] - km) / 2, 1)
+            weights = np.array([popularity.get(s, 1.0) for s in route['station_ids']])
+            weights[-1] = 0  # 终点站不上客
+            self.weight[i, :k] = weights / weights.sum()
+            self.last_stop[i] = k - 1
+            self.start_telecode[i] = telecodes.get(route['station_ids'][0])
+            self.end_telecode[i] = telecodes.get(route['station_ids'][-1])
+
+        stops = self.mask.sum(axis=1)
+        self.alight_probability = np.minimum(1.0, 1.0 / np.maximum(1.0, self.RIDE_SHARE * stops))
+        logger.info(f"合成数据拓扑: {len(route_ids)} 条线路, {n} 趟列车, 每日 {int(stops.sum())} 条记录")
+
+    @property
+    def rows_per_day(self):
+        return int(self.mask.sum())
+
+    def day_factor(self, day):
+        """日期系数：星期、节假日与暑运"""
+        factor = WEEKDAY_FACTORS[day.weekday()]
+        spring_festival = SPRING_FESTIVALS.get(day.year, date(day.year, 2, 1))
+        offset = (day - spring_festival).days
+        if -15 <= offset <= 25:
+            factor *= 1.35
+        elif (day.month, day.day) >= (10, 1) and (day.month, day.day) <= (10, 7):
+            factor *= 1.4
+        elif day.month == 5 and day.day <= 5:
+            factor *= 1.3
+        elif day.month == 1 and day.day <= 3:
+            factor *= 1.15
+        elif day.month in (7, 8):
+            factor *= 1.1
+        return factor
+
+    def generate_day(self, day):
+        """生成一天的客运记录（向量化逐站模拟，车上人数不超过定员）"""
+        rng = np.random.default_rng([self.seed, day.toordinal()])
+        n = len(self.train_ids)
+        load = self.day_factor(day) * self.hour_factor * rng.lognormal(0.0, 0.1, size=n)
+        expected = self.capacity * self.TURNOVER * load
+
+        boardings = np.zeros(self.mask.shape, dtype=np.int64)
+        alightings = np.zeros(self.mask.shape, dtype=np.int64)
+        onboard = np.zeros(n, dtype=np.int64)
+        for k in range(self.max_stops):
+            active = self.mask[:, k]
+            is_last = self.last_stop == k
+            alight = rng.binomial(onboard, self.alight_probability)
+            alight = np.where(is_last, onboard, alight) * active
+            onboard -= alight
+            demand = rng.poisson(expected * self.weight[:, k])
+            board = np.minimum(demand, self.capacity - onboard) * (active & ~is_last)
+            onboard += board
+            boardings[:, k] = board
+            alightings[:, k] = alight
+
+        rows, cols = np.nonzero(self.mask)
+        arrival = self.arrival[rows, cols] % 1440
+        departure = (arrival + self.DWELL_MINUTES) % 1440
+        first = cols == 0
+        last = cols == self.last_stop[rows]
+        fare = self.fare[rows, cols]
+        passengers_in = boardings[rows, cols]
+        return pd.DataFrame({
+            'yyxlbm': self.train_routes[rows],
+            'lcbm': self.train_ids[rows],
+            'zdid': self.station[rows, cols],
+            'xlzdid': self.sequence[rows, cols],
+            'yxrq': int(day.strftime('%Y%m%d')),
+            # 始发站无到达时间、终到站无出发时间
+            'ddsj': pd.array(np.where(first, np.nan, (arrival // 60) * 100 + arrival % 60), dtype='Int64'),
+            'cfsj': pd.array(np.where(last, np.nan, (departure // 60) * 100 + departure % 60), dtype='Int64'),
+            'skl': passengers_in,
+            'xkl': alightings[rows, cols],
+            'ticket_price': fare,
+            'start_station_telecode': self.start_telecode[rows],
+            'end_station_telecode': self.end_telecode[rows],
+            'shouru': np.round(passengers_in * fare, 2),
+        })
+
+    def generate(self, rows, start_date, batch_size=100000):
+        """按天生成直至达到目标行数，以不超过 batch_size 行的块产出"""
+        produced = 0
+        day = start_date
+        pending = []
+        pending_rows = 0
+        while produced < rows:
+            frame = self.generate_day(day).head(rows - produced)
+            frame.insert(0, 'xh', np.arange(produced + 1, produced + len(frame) + 1))
+            produced += len(frame)
+            pending.append(frame)
+            pending_rows += len(frame)
+            # 一天的记录可能多于 batch_size，超出部分留到下一块
+            while pending_rows >= batch_size:
+                combined = pd.concat(pending, ignore_index=True)
+                yield combined.iloc[:batch_size]
+                rest = combined.iloc[batch_size:].reset_index(drop=True)
+                pending, pending_rows = ([rest] if len(rest) else []), len(rest)
+            day += timedelta(days=1)
+        if pending_rows:
+            yield pd.concat(pending, ignore_index=True)
@@ -1,3 +1,758 @@
-from django.test import TestCase
+import io
+import os
+import runpy
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import orjson
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import F, Sum
+from django.db.utils import ConnectionHandler
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from railway_backend import settings as settings_module
+from . import archive, calendar_days, partitions, stats, versioning
+from .db import ReadOnlyDatabaseRouter
+from .models import Station, Train, Route, RouteStation, PassengerFlow, FlowDayCount, CalendarDay, Holiday
+from .serializers import RouteStationSerializer
+from .topology import FLAG_END, FLAG_START, route_topology
+from .signals import data_imported
+from .synthetic import SyntheticFlowGenerator
+
+
+class ChartLayoutTests(TestCase):
+    """图表接口的 orjson 渲染与 ?layout=columnar 列式输出"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.bulk_create([
+            Station(id=i, name=f'站点{i}', telecode=f'T{i:02d}') for i in range(1, 4)
+        ])
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(
+                route_id=1, train_id=1, station_id=station_id,
+                operation_date=date(2024, 1, day),
+                arrival_time=time(8 + station_id, 0),
+                passengers_in=10 * station_id, passengers_out=5 * station_id,
+                revenue=Decimal('12.50'),
+            )
+            for day in range(1, 4) for station_id in range(1, 4)
+        ])
+
+    def get_both(self, url, params):
+        rows = self.client.get(url, params)
+        columnar = self.client.get(url, {**params, 'layout': 'columnar'})
+        self.assertEqual(rows.status_code, 200)
+        self.assertEqual(columnar.status_code, 200)
+        return orjson.loads(rows.content), orjson.loads(columnar.content)
+
+    def assert_same_rows(self, rows, columnar, numeric=()):
+        """列式结果转回行后应与行式结果一致（数值列按浮点比较）"""
+        self.assertEqual(columnar['columns'], list(rows[0]))
+        self.assertEqual(len(rows), len(columnar['data'][columnar['columns'][0]]))
+        for i, row in enumerate(rows):
+            for column in columnar['columns']:
+                value = columnar['data'][column][i]
+                if column in numeric:
+                    self.assertAlmostEqual(float(row[column]), value)
+                else:
+                    self.assertEqual(row[column], value)
+
+    def test_summary(self):
+        rows, columnar = self.get_both('/api/passenger-flows/summary/',
+                                       {'start_date': '2024-01-01', 'end_date': '2024-01-03'})
+        self.assertEqual(rows[0]['date'], '2024-01-01')
+        self.assertEqual(rows[0]['total_revenue'], '37.50')
+        self.assert_same_rows(rows, columnar, numeric={'total_revenue'})
+
+    def test_station_ranking(self):
+        rows, columnar = self.get_both('/api/passenger-flows/station_ranking/',
+                                       {'start_date': '2024-01-01', 'end_date': '2024-01-03'})
+        self.assertEqual(columnar['data']['station_name'], ['站点3', '站点2', '站点1'])
+        self.assert_same_rows(rows, columnar, numeric={'total_revenue'})
+
+    def test_time_distribution(self):
+        rows, columnar = self.get_both('/api/passenger-flows/time_distribution/',
+                                       {'start_date': '2024-01-01', 'end_date': '2024-01-03'})
+        self.assertEqual(columnar['data']['hour'], list(range(24)))
+        self.assert_same_rows(rows, columnar)
+
+    def test_flow_analysis(self):
+        body = {'start_date': '2024-01-01', 'end_date': '2024-01-03', 'time_granularity': 'day'}
+        rows = self.client.post('/api/analytics/flow/', body, content_type='application/json').json()
+        columnar = self.client.post('/api/analytics/flow/?layout=columnar', body,
+                                    content_type='application/json').json()
+        self.assertEqual(columnar['summary'], rows['summary'])
+        self.assert_same_rows(rows['data'], columnar['data'])
+
+
+class ConditionalGetTests(TestCase):
+    """按数据版本的 ETag/Last-Modified 条件请求"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+
+    def test_not_modified_without_query(self):
+        response = self.client.get('/api/stations/')
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertIn('Last-Modified', response)
+
+        # 命中时只查询版本表
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/stations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        response = self.client.get('/api/stations/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_request(self):
+        etag = self.client.get('/api/stations/')['ETag']
+        self.assertNotEqual(self.client.get('/api/stations/', {'page': 1})['ETag'], etag)
+        self.assertNotEqual(self.client.get('/api/stations/', HTTP_ACCEPT='application/json; indent=4')['ETag'], etag)
+
+    def test_writes_and_imports_invalidate(self):
+        etag = self.client.get('/api/stations/')['ETag']
+        train_etag = self.client.get('/api/trains/')['ETag']
+
+        Station.objects.create(id=2, name='站点2', telecode='T02')
+        response = self.client.get('/api/stations/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        # 其他表的 ETag 不受影响
+        self.assertEqual(self.client.get('/api/trains/', HTTP_IF_NONE_MATCH=train_etag).status_code, 304)
+
+        data_imported.send(sender=self.__class__)
+        self.assertEqual(self.client.get('/api/trains/', HTTP_IF_NONE_MATCH=train_etag).status_code, 200)
+
+
+class RouteTopologyTests(TestCase):
+    """线路拓扑缓存：一次查询构建，输出与序列化器一致，写入后失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.bulk_create([
+            Station(id=i, name=f'站点{i}', telecode=f'T{i:02d}') for i in range(1, 6)
+        ])
+        Route.objects.bulk_create([Route(id=1, code=100, name='线路 1'), Route(id=2, code=200, name='线路 2')])
+        RouteStation.objects.bulk_create([
+            RouteStation(
+                route_id=1, station_id=station_id, sequence=sequence,
+                previous_station_id=station_id + 1 if sequence > 1 else None,
+                next_station_id=station_id - 1 if sequence < 5 else None,
+                distance_to_previous=10 * (sequence > 1), total_distance=10 * (sequence - 1),
+                is_start=sequence == 1, is_end=sequence == 5, must_stop=sequence != 3,
+            )
+            for sequence, station_id in enumerate(range(5, 0, -1), 1)
+        ])
+
+    def setUp(self):
+        route_topology.invalidate()
+
+    def test_stations_match_serializer(self):
+        response = self.client.get('/api/routes/1/stations/')
+        expected = RouteStationSerializer(RouteStation.objects.filter(route_id=1).order_by('sequence'), many=True)
+        self.assertEqual(response.json(), orjson.loads(orjson.dumps(expected.data)))
+        self.assertEqual(self.client.get('/api/routes/2/stations/').json(), [])
+
+        topology = route_topology.get(1)
+        self.assertEqual(topology.station_ids.tolist(), [5, 4, 3, 2, 1])
+        self.assertEqual(topology.total_distances.tolist(), [0, 10, 20, 30, 40])
+        self.assertEqual(topology.has_flag(FLAG_START | FLAG_END).tolist(), [True, False, False, False, True])
+
+    def test_cached_between_requests(self):
+        route_topology.routes()
+        # 命中缓存时与线路长度无关：版本表（条件请求与缓存校验各一次）与线路查询
+        with self.assertNumQueries(3):
+            self.client.get('/api/routes/1/stations/')
+
+    def test_invalidated_on_writes(self):
+        self.client.get('/api/routes/1/stations/')
+        station = Station.objects.get(id=3)
+        station.name = '新站点3'
+        station.save()
+        self.assertEqual(self.client.get('/api/routes/1/stations/').json()[2]['station_name'], '新站点3')
+
+        RouteStation.objects.filter(route_id=1, station_id=1).delete()
+        self.assertEqual(len(self.client.get('/api/routes/1/stations/').json()), 4)
+
+
+class AsyncConditionalGetTests(TransactionTestCase):
+    """异步视图的条件请求（查询线程池需读取已提交的数据）"""
+
+    def test_overview(self):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+        params = {'startDate': '2024-01-01', 'endDate': '2024-01-10'}
+        etag = self.client.get('/api/analytics/overview/', params)['ETag']
+        response = self.client.get('/api/analytics/overview/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class SQLiteConnectionTests(SimpleTestCase):
+    """生产配置：写连接启用 WAL 等 PRAGMA，分析连接只读且不参与迁移"""
+
+    def production_settings(self):
+        with mock.patch.dict(os.environ, {'RAILWAY_DB_PROFILE': 'production'}):
+            return runpy.run_path(str(Path(settings_module.__file__)))
+
+    def connect(self, handler, alias):
+        wrapper = handler[alias]
+        self.addCleanup(wrapper.close)
+        wrapper.force_debug_cursor = True
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_production_connections(self):
+        production = self.production_settings()
+        self.assertEqual(production['ANALYTICS_DATABASE'], 'analytics')
+        self.assertTrue(production['DATABASES']['analytics']['NAME'].endswith('?mode=ro'))
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'railway.sqlite3'
+        handler = ConnectionHandler({
+            'default': {**production['DATABASES']['default'], 'NAME': path},
+            'analytics': {**production['DATABASES']['analytics'], 'NAME': f'file:{path}?mode=ro'},
+        })
+        with override_settings(SQLITE_PRAGMAS=production['SQLITE_PRAGMAS']):
+            writer = self.connect(handler, 'default')
+            with writer.cursor() as cursor:
+                cursor.execute('CREATE TABLE sample (id INTEGER PRIMARY KEY)')
+            reader = self.connect(handler, 'analytics')
+
+        self.assertEqual(self.pragma(writer, 'journal_mode'), 'wal')
+        for wrapper in (writer, reader):
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+            self.assertEqual(self.pragma(wrapper, 'cache_size'), -65536)
+        # 只读连接不切换日志模式（WAL 由写连接持久化）
+        executed = [query['sql'] for query in reader.queries]
+        self.assertIn('PRAGMA synchronous = NORMAL', executed)
+        self.assertFalse(any('journal_mode' in sql for sql in executed))
+        self.assertEqual(self.pragma(reader, 'journal_mode'), 'wal')
+        with self.assertRaises(OperationalError), reader.cursor() as cursor:
+            cursor.execute('INSERT INTO sample (id) VALUES (1)')
+
+    def test_router_refuses_migrations_on_analytics(self):
+        router = ReadOnlyDatabaseRouter()
+        with override_settings(ANALYTICS_DATABASE='analytics'):
+            self.assertIs(router.allow_migrate('analytics', 'data_management'), False)
+            self.assertIsNone(router.allow_migrate('default', 'data_management'))
+        # 开发环境分析查询使用默认连接，迁移照常
+        self.assertIsNone(router.allow_migrate('default', 'data_management'))
+
+
+class PartitionTests(TestCase):
+    """客运记录按月分区：写入路由、查询裁剪、更新与删除"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(route_id=1, train_id=1, station_id=1, operation_date=day, passengers_in=10)
+            for day in (date(2024, 1, 5), date(2024, 1, 20), date(2024, 2, 3), date(2024, 3, 9))
+        ])
+
+    def test_bulk_create_routes_by_month(self):
+        self.assertEqual(partitions.list_partitions(),
+                         ['passenger_flow_202401', 'passenger_flow_202402', 'passenger_flow_202403'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM passenger_flow')
+            self.assertEqual(cursor.fetchone()[0], 0)
+            cursor.execute('SELECT COUNT(*) FROM passenger_flow_202401')
+            self.assertEqual(cursor.fetchone()[0], 2)
+        self.assertEqual(PassengerFlow.objects.count(), 4)
+
+    def test_query_reads_only_overlapping_partitions(self):
+        with CaptureQueriesContext(connection) as queries:
+            count = PassengerFlow.objects.filter(operation_date__range=('2024-02-01', '2024-02-29')).count()
+        self.assertEqual(count, 1)
+        sql = next(q['sql'] for q in queries if 'COUNT(*)' in q['sql'])
+        self.assertIn('"passenger_flow_202402"', sql)
+        self.assertNotIn('passenger_flow_202401', sql)
+        self.assertNotIn('passenger_flow_202403', sql)
+
+    def test_ids_do_not_collide_with_default_partition(self):
+        created = PassengerFlow.objects.create(
+            route_id=1, train_id=1, station_id=1, operation_date=date(2024, 4, 1))
+        ids = list(PassengerFlow.objects.values_list('id', flat=True))
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(created.id, max(ids))
+
+    def table_ids(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {table} ORDER BY id')
+            return [row[0] for row in cursor.fetchall()]
+
+    def test_update_in_place(self):
+        flow = PassengerFlow.objects.get(operation_date=date(2024, 2, 3))
+        flow.passengers_in = 99
+        flow.save()
+        self.assertEqual(self.table_ids('passenger_flow_202402'), [flow.id])
+        self.assertEqual(PassengerFlow.objects.get(id=flow.id).passengers_in, 99)
+
+        updated = PassengerFlow.objects.filter(operation_date__lt='2024-02-01').update(passengers_in=F('passengers_in') + 1)
+        self.assertEqual(updated, 2)
+        self.assertEqual(len(self.table_ids('passenger_flow_202401')), 2)
+        self.assertEqual(PassengerFlow.objects.filter(passengers_in=11).count(), 2)
+
+        # 删除起点站时外键置空的级联更新同样原地执行
+        Station.objects.create(id=2, name='站点2', telecode='T02')
+        PassengerFlow.objects.update(start_station_id=2)
+        Station.objects.filter(id=2).delete()
+        self.assertEqual(self.table_ids('passenger_flow'), [])
+        self.assertEqual(len(self.table_ids('passenger_flow_202401')), 2)
+        self.assertEqual(PassengerFlow.objects.filter(start_station__isnull=True).count(), 4)
+
+    def test_update_date_moves_to_month_partition(self):
+        january = self.table_ids('passenger_flow_202401')
+        updated = PassengerFlow.objects.filter(operation_date=date(2024, 1, 20)).update(operation_date=date(2024, 5, 1))
+        self.assertEqual(updated, 1)
+        self.assertEqual(self.table_ids('passenger_flow_202401'), january[:1])
+        self.assertEqual(self.table_ids('passenger_flow_202405'), january[1:])
+
+        flow = PassengerFlow.objects.get(operation_date=date(2024, 1, 5))
+        flow.operation_date = date(2024, 1, 28)
+        flow.save()
+        self.assertEqual(self.table_ids('passenger_flow_202401'), [flow.id])
+        self.assertEqual(self.table_ids('passenger_flow'), [])
+        self.assertEqual(PassengerFlow.objects.count(), 4)
+
+    def test_save_touches_only_own_partition(self):
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(route_id=1, train_id=1, station_id=1, operation_date=date(2023, month, 1))
+            for month in range(1, 13)
+        ])
+        flow = PassengerFlow.objects.get(operation_date=date(2024, 2, 3))
+        flow.passengers_in = 50
+        with CaptureQueriesContext(connection) as queries:
+            flow.save()
+        sql = [q['sql'] for q in queries]
+        self.assertFalse([s for s in sql if 'NOT BETWEEN' in s])
+        updates = [s for s in sql if s.startswith('UPDATE "passenger_flow')]
+        self.assertEqual(len([s for s in updates if 'passenger_flow_' in s]), 1)
+        self.assertIn('"passenger_flow_202402"', updates[0])
+        self.assertLessEqual(len(sql), 15)
+
+        # 运行日期改到其他月份时只移动这条记录
+        flow.operation_date = date(2024, 3, 1)
+        with CaptureQueriesContext(connection) as queries:
+            flow.save()
+        self.assertFalse([q for q in queries if 'NOT BETWEEN' in q['sql']])
+        self.assertEqual(self.table_ids('passenger_flow_202402'), [])
+        self.assertIn(flow.id, self.table_ids('passenger_flow_202403'))
+        self.assertEqual(PassengerFlow.objects.get(id=flow.id).passengers_in, 50)
+
+    def test_delete(self):
+        PassengerFlow.objects.get(operation_date=date(2024, 1, 5)).delete()
+        self.assertEqual(PassengerFlow.objects.count(), 3)
+        deleted, _ = PassengerFlow.objects.filter(operation_date__gte='2024-02-01').delete()
+        self.assertEqual(deleted, 2)
+        self.assertEqual(PassengerFlow.objects.count(), 1)
+
+    def test_drop_partition(self):
+        partitions.drop_partition('passenger_flow_202401')
+        self.assertEqual(PassengerFlow.objects.count(), 2)
+        self.assertNotIn('passenger_flow_202401', partitions.list_partitions())
+
+    def test_migrate_default_partition(self):
+        with connection.cursor() as cursor:
+            cursor.execute('INSERT INTO passenger_flow SELECT * FROM passenger_flow_202403')
+            cursor.execute('DELETE FROM passenger_flow_202403')
+        moved = partitions.migrate_default_partition()
+        self.assertEqual(moved, {'passenger_flow_202403': 1})
+        self.assertEqual(PassengerFlow.objects.count(), 4)
+
+
+class ArchiveTests(TestCase):
+    """冷数据归档为 Parquet 与恢复"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(route_id=1, train_id=1, station_id=1, operation_date=day,
+                          arrival_time=time(9, 15), passengers_in=10, revenue=Decimal('3.50'))
+            for day in (date(2024, 1, 5), date(2024, 1, 20), date(2024, 2, 3), date(2024, 3, 9))
+        ])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(FLOW_ARCHIVE_DIR=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_cold_tables(self):
+        self.assertEqual(archive.cold_tables(2), ['passenger_flow_202401'])
+        self.assertEqual(archive.cold_tables(3), [])
+
+    def test_archive_and_restore_round_trip(self):
+        original = list(PassengerFlow.objects.order_by('id').values())
+        archive.archive_partition('passenger_flow_202401')
+
+        self.assertEqual(archive.list_archives(), ['passenger_flow_202401'])
+        self.assertNotIn('passenger_flow_202401', partitions.list_partitions())
+        self.assertEqual(archive.archive_summary(), (2, date(2024, 1, 5), date(2024, 1, 20)))
+        stats = self.client.get('/api/data/stats/').json()
+        self.assertEqual(stats['totalRecords'], 4)
+        self.assertEqual(stats['dateRange']['minDate'], '2024-01-05')
+
+        self.assertEqual(archive.restore_partition('passenger_flow_202401'), 2)
+        self.assertEqual(archive.list_archives(), [])
+        self.assertEqual(list(PassengerFlow.objects.order_by('id').values()), original)
+
+
+class DataStatisticsTests(TestCase):
+    """数据统计计数随各写入路径维护，与重新统计的结果一致"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+        Station.objects.create(id=2, name='站点2', telecode='T02')
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(route_id=1, train_id=1, station_id=station_id, operation_date=day, passengers_in=10)
+            for day in (date(2024, 1, 5), date(2024, 1, 20), date(2024, 2, 3), date(2024, 3, 9))
+            for station_id in (1, 2)
+        ])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(FLOW_ARCHIVE_DIR=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def counters(self):
+        return stats.summary()[0], list(FlowDayCount.objects.values_list('operation_date', 'record_count'))
+
+    def assertCountersAccurate(self):
+        maintained = self.counters()
+        stats.rebuild()
+        self.assertEqual(maintained, self.counters())
+        return maintained
+
+    def test_write_paths(self):
+        rows, days = self.assertCountersAccurate()
+        self.assertEqual((rows['passenger_flow'], rows['station'], rows['route']), (8, 2, 1))
+        self.assertEqual(days[0], (date(2024, 1, 5), 2))
+
+        flow = PassengerFlow.objects.create(route_id=1, train_id=1, station_id=1, operation_date=date(2024, 4, 1))
+        self.assertCountersAccurate()
+        flow.operation_date = date(2024, 4, 2)
+        flow.save()
+        PassengerFlow.objects.filter(operation_date=date(2024, 1, 20)).update(operation_date=date(2024, 1, 21))
+        self.assertCountersAccurate()
+
+        flow.delete()
+        PassengerFlow.objects.filter(operation_date=date(2024, 2, 3), station_id=1).delete()
+        partitions.drop_partition('passenger_flow_202403')
+        self.assertCountersAccurate()
+
+        # 归档不改变计数，删除归档文件时扣减
+        archive.archive_partition('passenger_flow_202401')
+        self.assertEqual(self.assertCountersAccurate()[0]['passenger_flow'], 5)
+        archive.clear_archives()
+        self.assertEqual(self.assertCountersAccurate()[1], [(date(2024, 2, 3), 1)])
+
+        # 级联删除按分区批量扣减
+        Station.objects.filter(id=2).delete()
+        rows, days = self.assertCountersAccurate()
+        self.assertEqual((rows['station'], rows['passenger_flow'], days), (1, 0, []))
+
+    def test_cascade_delete_is_bulk(self):
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(route_id=1, train_id=1, station_id=1, operation_date=date(2024, 1, day))
+            for day in range(1, 29)
+        ])
+        version = versioning.get_versions(['passenger_flow'])['passenger_flow'][0]
+        with CaptureQueriesContext(connection) as queries:
+            Station.objects.filter(id=1).delete()
+        # 不逐条加载、删除客运记录
+        self.assertLess(len(queries), 40)
+        self.assertFalse([q for q in queries if '"passengers_in"' in q['sql']])
+        self.assertFalse(PassengerFlow.objects.filter(station_id=1).exists())
+        self.assertEqual(PassengerFlow.objects.count(), 4)
+        self.assertEqual(self.assertCountersAccurate()[0]['passenger_flow'], 4)
+        self.assertEqual(versioning.get_versions(['passenger_flow'])['passenger_flow'][0], version + 1)
+
+    def test_stats_endpoint(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/data/stats/')
+        data = response.json()
+        self.assertEqual((data['totalRecords'], data['stations'], data['trains'], data['lines']), (8, 2, 1, 1))
+        self.assertEqual(data['dateRange'], {'minDate': '2024-01-05', 'maxDate': '2024-03-09'})
+        self.assertNotIn('coverage', data)
+
+        coverage = self.client.get('/api/data/stats/', {'coverage': 'day', 'startDate': '2024-01-10'}).json()
+        self.assertEqual(coverage['coverage'], [
+            {'date': '2024-01-20', 'records': 2}, {'date': '2024-02-03', 'records': 2},
+            {'date': '2024-03-09', 'records': 2},
+        ])
+        coverage = self.client.get('/api/data/stats/', {'coverage': 'month'}).json()
+        self.assertEqual([(row['date'], row['records']) for row in coverage['coverage']],
+                         [('2024-01', 4), ('2024-02', 2), ('2024-03', 2)])
+
+    def test_import_command_refreshes_counts(self):
+        files = {
+            'stations.csv': 'zdid,lxid,ysfsbm,zdmc,station_code,station_telecode,station_shortname\n站点id,,,,,,\n'
+                            '3,1,1,站点3,10003,T03,\n4,1,1,站点4,10004,T04,\n',
+            'trains.csv': 'lcbm,lcdm,lcyn\n列车编码,,\n2,G2,600\n',
+            'route_stations.csv': 'yyxlbm,zdid,xlzdid,Q_zdid,yqzdjjl,H_zdid,sfqszd,sfzdzd,ysjl,xldm,sfytk\n'
+                                  '运营线路编码,,,,,,,,,,\n2,3,1,,0,4,1,0,0,200,1\n2,4,2,3,50,,0,1,50,200,1\n',
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            for name, content in files.items():
+                (Path(directory) / name).write_text(content, encoding='utf-8')
+            call_command('import_data', '--data-dir', directory, '--skip-passenger-flow', stdout=io.StringIO())
+
+        data = self.client.get('/api/data/stats/').json()
+        self.assertEqual((data['totalRecords'], data['stations'], data['trains'], data['lines']), (8, 4, 2, 2))
+        self.assertEqual(stats.summary()[0]['route_station'], 2)
+
+
+# 合成数据测试用的最小拓扑（导入格式，第二行为说明行）
+SYNTHETIC_TOPOLOGY = {
+    'stations.csv': 'zdid,lxid,ysfsbm,zdmc,station_code,station_telecode,station_shortname\n站点id,,,,,,\n'
+                    + ''.join(f'{i},1,1,站点{i},{10000 + i},T{i:02d},\n' for i in range(1, 5)),
+    'trains.csv': 'lcbm,lcdm,lcyn\n列车编码,,\n1,G1,600\n2,G2,\n3,D3,800\n',
+    'route_stations.csv': 'yyxlbm,zdid,xlzdid,Q_zdid,yqzdjjl,H_zdid,sfqszd,sfzdzd,ysjl,xldm,sfytk\n'
+                          '运营线路编码,,,,,,,,,,\n'
+                          '1,1,1,,0,2,1,0,0,100,1\n1,2,2,1,80,3,0,0,80,100,1\n1,3,3,2,120,,0,1,200,100,1\n'
+                          '2,4,1,,0,3,1,0,0,200,1\n2,3,2,4,60,,0,1,60,200,1\n',
+}
+
+
+class SyntheticFlowTests(TestCase):
+    """合成客运记录：行数、分块大小、可复现性，generate_flows 写入CSV与数据库"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.data_dir = Path(directory.name)
+        for name, content in SYNTHETIC_TOPOLOGY.items():
+            (self.data_dir / name).write_text(content, encoding='utf-8')
+        settings_override = override_settings(FLOW_ARCHIVE_DIR=self.data_dir / 'archive')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def generate(self, seed=7, rows=25, batch_size=4):
+        generator = SyntheticFlowGenerator(self.data_dir, seed=seed)
+        chunks = list(generator.generate(rows, date(2024, 1, 30), batch_size=batch_size))
+        return generator, chunks
+
+    def test_generate(self):
+        generator, chunks = self.generate()
+        self.assertEqual([len(chunk) for chunk in chunks], [4] * 6 + [1])
+        flows = pd.concat(chunks, ignore_index=True)
+        self.assertEqual(flows['xh'].tolist(), list(range(1, 26)))
+
+        days = -(-25 // generator.rows_per_day)
+        dates = pd.to_datetime(flows['yxrq'].astype(str)).dt.date
+        self.assertEqual((dates.min(), dates.max()), (date(2024, 1, 30), date(2024, 1, 29) + timedelta(days=days)))
+        self.assertTrue(flows['lcbm'].isin([1, 2, 3]).all())
+        self.assertTrue(flows['zdid'].isin([1, 2, 3, 4]).all())
+        self.assertTrue((flows['skl'] >= 0).all() and (flows['xkl'] >= 0).all())
+
+        # 相同 seed 的输出一致，与分块大小无关
+        pd.testing.assert_frame_equal(pd.concat(self.generate(batch_size=100)[1], ignore_index=True), flows)
+        self.assertFalse(pd.concat(self.generate(seed=8)[1], ignore_index=True).equals(flows))
+
+    def test_generate_flows_command(self):
+        output = self.data_dir / 'passenger_flow.csv'
+        call_command('generate_flows', '--rows', '25', '--start-date', '2024-01-30', '--seed', '7',
+                     '--data-dir', str(self.data_dir), '--output', str(output), '--batch-size', '4',
+                     stdout=io.StringIO())
+        written = pd.read_csv(output, skiprows=[1])
+        expected = pd.concat(self.generate()[1], ignore_index=True)
+        self.assertEqual(len(written), 25)
+        self.assertEqual(written['skl'].tolist(), expected['skl'].tolist())
+
+        call_command('import_data', '--data-dir', str(self.data_dir), '--skip-passenger-flow', stdout=io.StringIO())
+        call_command('generate_flows', '--rows', '25', '--start-date', '2024-01-30', '--seed', '7',
+                     '--data-dir', str(self.data_dir), '--to-db', '--batch-size', '4', stdout=io.StringIO())
+        self.assertEqual(PassengerFlow.objects.count(), 25)
+        self.assertEqual(PassengerFlow.objects.aggregate(Sum('passengers_in'))['passengers_in__sum'],
+                         int(expected['skl'].sum()))
+        self.assertIn('passenger_flow_202401', partitions.list_partitions())
+        self.assertEqual(self.client.get('/api/data/stats/').json()['totalRecords'], 25)
+
+
+class CalendarDimensionTests(TestCase):
+    """日历维度：迁移导入默认节假日文件，日期属性与上年同期对应日期"""
+
+    def test_calendar_days(self):
+        spring_festival = CalendarDay.objects.get(date=date(2024, 2, 10))
+        self.assertEqual(
+            (spring_festival.weekday, spring_festival.iso_week, spring_festival.quarter, spring_festival.holiday,
+             spring_festival.day_type, spring_festival.holiday_period, spring_festival.prior_year_date),
+            (6, 6, 1, '春节', CalendarDay.DAY_TYPE_HOLIDAY, '春运', date(2023, 1, 21)),
+        )
+        # 调休上班的周日
+        adjusted = CalendarDay.objects.get(date=date(2024, 2, 4))
+        self.assertEqual((adjusted.is_weekend, adjusted.is_adjusted_workday, adjusted.day_type),
+                         (True, True, CalendarDay.DAY_TYPE_WORKDAY))
+        # 上年假期较短时对应到上年假期最后一天；普通日期对应 52 周前的同一星期几
+        self.assertEqual(CalendarDay.objects.get(date=date(2024, 2, 17)).prior_year_date, date(2023, 1, 27))
+        ordinary = CalendarDay.objects.get(date=date(2024, 3, 12))
+        self.assertEqual((ordinary.day_type, ordinary.holiday, ordinary.prior_year_date),
+                         (CalendarDay.DAY_TYPE_WORKDAY, '', date(2023, 3, 14)))
+
+    def test_import_holidays(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'holidays.csv'
+            path.write_text('name,kind,start_date,end_date\n元旦,holiday,2024-01-01,2024-01-01\n'
+                            '元旦,holiday,2023-01-01,2023-01-02\n', encoding='utf-8')
+            self.assertEqual(calendar_days.import_holidays(path)[0], 2)
+            self.assertEqual(CalendarDay.objects.get(date=date(2024, 1, 1)).prior_year_date, date(2023, 1, 1))
+            self.assertEqual(CalendarDay.objects.get(date=date(2024, 2, 10)).holiday, '')
+
+            path.write_text('name,kind,start_date,end_date\n元旦,festival,2024-01-01,2024-01-01\n', encoding='utf-8')
+            with self.assertRaisesMessage(ValueError, '第 2 行'):
+                calendar_days.import_holidays(path)
+        self.assertEqual(Holiday.objects.count(), 2)
+
+    def test_extended_to_flow_dates(self):
+        FlowDayCount.objects.create(operation_date=date(2031, 6, 1), record_count=1)
+        self.assertGreater(calendar_days.ensure_covered(), 0)
+        self.assertEqual(CalendarDay.objects.order_by('date').last().date, date(2032, 12, 31))
+        self.assertEqual(calendar_days.ensure_covered(), 0)
+
+
+class CompactFlowStorageTests(TestCase):
+    """客运记录紧凑存储：时刻为分钟数、金额为整数分、起终点站为站点ID，接口输出保持原格式"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+        Station.objects.create(id=2, name='站点2', telecode='T02')
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(route_id=1, train_id=1, station_id=1, operation_date=date(2024, 1, 5),
+                          arrival_time=time(8, 30), departure_time=time(8, 32), passengers_in=10,
+                          ticket_price='45.50', revenue='455.05', start_station_id=1, end_station_id=2),
+            PassengerFlow(route_id=1, train_id=1, station_id=2, operation_date=date(2024, 1, 5),
+                          arrival_time=time(9, 5), revenue=Decimal('0.10')),
+        ])
+
+    def test_stored_values(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT arrival_time, departure_time, ticket_price, revenue, start_station_id, created_at '
+                           'FROM passenger_flow_202401 ORDER BY station_id')
+            self.assertEqual(cursor.fetchall(), [(510, 512, 4550, 45505, 1, None), (545, None, None, 10, None, None)])
+
+        flow = PassengerFlow.objects.get(station_id=1)
+        self.assertEqual((flow.arrival_time, flow.ticket_price, flow.revenue), (time(8, 30), Decimal('45.50'),
+                                                                                Decimal('455.05')))
+        self.assertEqual(PassengerFlow.objects.aggregate(total=Sum('revenue'))['total'], Decimal('455.15'))
+        self.assertEqual(PassengerFlow.objects.filter(revenue__gte=455.05).count(), 1)
+        self.assertEqual(PassengerFlow.objects.filter(arrival_time__lt=time(9, 0)).count(), 1)
+
+    def test_api_contract(self):
+        flow_id = PassengerFlow.objects.get(station_id=1).id
+        data = self.client.get(f'/api/passenger-flows/{flow_id}/').json()
+        self.assertEqual(
+            {key: data[key] for key in ('arrival_time', 'departure_time', 'ticket_price', 'revenue',
+                                        'start_station_telecode', 'end_station_telecode', 'created_at')},
+            {'arrival_time': '08:30:00', 'departure_time': '08:32:00', 'ticket_price': '45.50', 'revenue': '455.05',
+             'start_station_telecode': 'T01', 'end_station_telecode': 'T02', 'created_at': None},
+        )
+
+        response = self.client.post('/api/passenger-flows/', {
+            'route': 1, 'train': 1, 'station': 2, 'operation_date': '2024-02-01', 'arrival_time': '10:15:00',
+            'revenue': '12.30', 'start_station_telecode': 'T02', 'end_station_telecode': None,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201, response.content)
+        created = PassengerFlow.objects.get(id=response.json()['id'])
+        self.assertEqual((created.arrival_time, created.revenue, created.start_station_id, created.end_station_id),
+                         (time(10, 15), Decimal('12.30'), 2, None))
+        # 单条保存的记录带审计时间戳
+        self.assertIsNotNone(created.created_at)
+
+
+class CompactFlowMigrationTests(TransactionTestCase):
+    """迁移把默认分区与各月分区中的旧格式记录转换为紧凑存储"""
+
+    def test_convert_existing_rows(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(FLOW_ARCHIVE_DIR=Path(directory.name))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        # 迁移前格式的归档文件：时刻为 time、金额为浮点元、起终点为电报码
+        pq.write_table(pa.table({
+            'id': [9], 'serial_number': [None], 'route_id': [1], 'train_id': [1], 'station_id': [1],
+            'route_station_sequence': [None], 'operation_date': [date(2023, 1, 5)], 'arrival_time': [time(8, 30)],
+            'departure_time': [None], 'passengers_in': [3], 'passengers_out': [0], 'ticket_price': [45.5],
+            'start_station_telecode': ['T01'], 'end_station_telecode': ['X99'], 'revenue': [136.5],
+            'created_at': [None], 'updated_at': [None],
+        }, schema=pa.schema([
+            ('id', pa.int64()), ('serial_number', pa.int64()), ('route_id', pa.int64()), ('train_id', pa.int64()),
+            ('station_id', pa.int64()), ('route_station_sequence', pa.int64()), ('operation_date', pa.date32()),
+            ('arrival_time', pa.time64('us')), ('departure_time', pa.time64('us')), ('passengers_in', pa.int64()),
+            ('passengers_out', pa.int64()), ('ticket_price', pa.float64()), ('start_station_telecode', pa.string()),
+            ('end_station_telecode', pa.string()), ('revenue', pa.float64()), ('created_at', pa.timestamp('us')),
+            ('updated_at', pa.timestamp('us')),
+        ])), str(Path(directory.name) / 'passenger_flow_202301.parquet'))
+
+        executor = MigrationExecutor(connection)
+        executor.migrate([('data_management', '0006_calendar_dimension')])
+        self.addCleanup(lambda: MigrationExecutor(connection).migrate(
+            MigrationExecutor(connection).loader.graph.leaf_nodes()))
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO station (id, name, telecode, created_at, updated_at) "
+                           "VALUES (1, '站点1', 'T01', '2024-01-01', '2024-01-01')")
+            cursor.execute("INSERT INTO train (id, code, capacity, created_at, updated_at) "
+                           "VALUES (1, 'G1', 500, '2024-01-01', '2024-01-01')")
+            cursor.execute("INSERT INTO route (id, code, name, created_at, updated_at) "
+                           "VALUES (1, 100, '线路 1', '2024-01-01', '2024-01-01')")
+            partitions.ensure_partition(date(2024, 3, 1))
+            for table, day in (('passenger_flow', '2024-01-05'), ('passenger_flow_202403', '2024-03-09')):
+                cursor.execute(
+                    f'INSERT INTO {table} (route_id, train_id, station_id, operation_date, arrival_time, '
+                    'departure_time, passengers_in, passengers_out, ticket_price, start_station_telecode, '
+                    "end_station_telecode, revenue, created_at, updated_at) VALUES (1, 1, 1, %s, '23:59:00', NULL, "
+                    "3, 0, '45.50', 'T01', 'X99', '136.50', '2024-01-01', '2024-01-01')", [day]
+                )
+
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.addCleanup(PassengerFlow.objects.all().delete)
+        for table in ('passenger_flow', 'passenger_flow_202403'):
+            with connection.cursor() as cursor:
+                cursor.execute(f'SELECT arrival_time, departure_time, ticket_price, revenue, start_station_id, '
+                               f'end_station_id FROM {table}')
+                self.assertEqual(cursor.fetchall(), [(1439, None, 4550, 13650, 1, None)], table)
+        self.assertEqual(sorted(PassengerFlow.objects.values_list('revenue', flat=True)),
+                         [Decimal('136.50'), Decimal('136.50')])
+        converted = pq.read_table(Path(directory.name) / 'passenger_flow_202301.parquet')
+        self.assertEqual(converted.schema, archive.SCHEMA)
+        self.assertEqual(
+            [converted[column].to_pylist() for column in ('arrival_time', 'ticket_price', 'revenue',
+                                                          'start_station_id', 'end_station_id')],
+            [[510], [4550], [13650], [1], [None]],
+        )
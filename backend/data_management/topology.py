@@ -0,0 +1,168 @@
+"""线路拓扑缓存
+
+每条线路的站点序列以紧凑的列数组保存在进程内：站点ID、线路站点顺序、与上一站距离、累计距离、
+起终点/必停标志位，以及站点名称、电报码等展示字段。全部线路用一次关联查询构建。
+
+本进程内 Route/RouteStation/Station 写入或数据导入后立即失效；其他进程的写入由 data_version 中
+相关表的版本号变化发现，下次访问时重建。
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from rest_framework import serializers
+
+from railway_backend.metrics import record_cache
+from .models import Route, RouteStation, Station
+from .signals import data_imported
+from .versioning import get_versions
+
+# 拓扑依赖的数据表（版本变化时重建）
+TOPOLOGY_TABLES = ['route', 'route_station', 'station']
+
+# 站点标志位
+FLAG_START = 1
+FLAG_END = 2
+FLAG_MUST_STOP = 4
+
+# 上一站/下一站为空时的站点ID
+NO_STATION = -1
+
+_datetime_field = serializers.DateTimeField()
+
+
+class RouteTopology:
+    """单条线路按线路站点顺序排列的站点数组"""
+
+    def __init__(self, route_id, route_code, rows):
+        self.route_id = route_id
+        self.route_code = route_code
+        columns = list(zip(*rows)) if rows else [()] * 15
+        (ids, sequences, station_ids, distances, total_distances, is_start, is_end, must_stop,
+         previous_ids, next_ids, names, telecodes, previous_names, next_names, timestamps) = columns
+        self.ids = np.array(ids, dtype=np.int64)
+        self.sequences = np.array(sequences, dtype=np.int32)
+        self.station_ids = np.array(station_ids, dtype=np.int32)
+        self.distances = np.array(distances, dtype=np.int32)
+        self.total_distances = np.array(total_distances, dtype=np.int32)
+        self.flags = (
+            np.array(is_start, dtype=np.uint8) * FLAG_START
+            | np.array(is_end, dtype=np.uint8) * FLAG_END
+            | np.array(must_stop, dtype=np.uint8) * FLAG_MUST_STOP
+        )
+        self.previous_ids = np.array([NO_STATION if i is None else i for i in previous_ids], dtype=np.int32)
+        self.next_ids = np.array([NO_STATION if i is None else i for i in next_ids], dtype=np.int32)
+        self.names = tuple(names)
+        self.telecodes = tuple(telecodes)
+        self.previous_names = tuple(previous_names)
+        self.next_names = tuple(next_names)
+        # (created_at, updated_at) 预先格式化为接口输出的字符串
+        self.timestamps = tuple(timestamps)
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def has_flag(self, flag):
+        """各站点是否具有标志位 flag（布尔数组）"""
+        return (self.flags & flag) != 0
+
+    def rows(self):
+        """与 RouteStationSerializer 输出一致的站点列表"""
+        def station(station_id):
+            return None if station_id == NO_STATION else station_id
+
+        return [
+            {
+                'id': record_id,
+                'route_name': str(self.route_code),
+                'station_name': name,
+                'station_telecode': telecode,
+                'previous_station_name': previous_name,
+                'next_station_name': next_name,
+                'sequence': sequence,
+                'distance_to_previous': distance,
+                'total_distance': total_distance,
+                'is_start': bool(flags & FLAG_START),
+                'is_end': bool(flags & FLAG_END),
+                'must_stop': bool(flags & FLAG_MUST_STOP),
+                'created_at': created_at,
+                'updated_at': updated_at,
+                'route': self.route_id,
+                'station': station_id,
+                'previous_station': station(previous_id),
+                'next_station': station(next_id),
+            }
+            for (record_id, sequence, station_id, distance, total_distance, flags, previous_id, next_id,
+                 name, telecode, previous_name, next_name, (created_at, updated_at))
+            in zip(self.ids.tolist(), self.sequences.tolist(), self.station_ids.tolist(), self.distances.tolist(),
+                   self.total_distances.tolist(), self.flags.tolist(), self.previous_ids.tolist(),
+                   self.next_ids.tolist(), self.names, self.telecodes, self.previous_names, self.next_names,
+                   self.timestamps)
+        ]
+
+
+def build_topology(using=None):
+    """一次查询构建全部线路的拓扑：{线路ID: RouteTopology}（没有站点的线路也包含在内）"""
+    using = using or settings.ANALYTICS_DATABASE
+    records = RouteStation.objects.using(using).order_by('route_id', 'sequence').values_list(
+        'route_id', 'id', 'sequence', 'station_id', 'distance_to_previous', 'total_distance',
+        'is_start', 'is_end', 'must_stop', 'previous_station_id', 'next_station_id',
+        'station__name', 'station__telecode', 'previous_station__name', 'next_station__name',
+        'created_at', 'updated_at',
+    )
+    grouped = {}
+    for route_id, *values, created_at, updated_at in records:
+        grouped.setdefault(route_id, []).append(
+            (*values, (_datetime_field.to_representation(created_at),
+                       _datetime_field.to_representation(updated_at)))
+        )
+    return {
+        route_id: RouteTopology(route_id, code, grouped.get(route_id, []))
+        for route_id, code in Route.objects.using(using).values_list('id', 'code')
+    }
+
+
+class TopologyCache:
+    """进程级的线路拓扑缓存"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = None
+        self._routes = None
+
+    def invalidate(self):
+        with self._lock:
+            self._routes = None
+
+    def routes(self):
+        """全部线路的拓扑；相关表版本变化或本进程写入后重建"""
+        versions = get_versions(TOPOLOGY_TABLES)
+        versions = tuple(versions[table][0] for table in TOPOLOGY_TABLES)
+        with self._lock:
+            if self._routes is not None and self._versions == versions:
+                record_cache('route_topology', hit=True)
+                return self._routes
+        record_cache('route_topology', hit=False)
+        # 构建前读取的版本：构建期间若再有写入，下次访问会再重建一次
+        routes = build_topology()
+        with self._lock:
+            self._routes, self._versions = routes, versions
+        return routes
+
+    def get(self, route_id):
+        """单条线路的拓扑；线路不存在时返回 None"""
+        return self.routes().get(route_id)
+
+
+route_topology = TopologyCache()
+
+
+def _invalidate(sender, **kwargs):
+    route_topology.invalidate()
+
+
+data_imported.connect(_invalidate, dispatch_uid='route_topology_imported')
+for model in (Route, RouteStation, Station):
+    post_save.connect(_invalidate, sender=model, dispatch_uid=f'route_topology_{model._meta.db_table}_save')
+    post_delete.connect(_invalidate, sender=model, dispatch_uid=f'route_topology_{model._meta.db_table}_delete')
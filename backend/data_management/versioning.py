@@ -0,0 +1,104 @@
+import hashlib
+from calendar import timegm
+
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from railway_backend.metrics import record_cache
+from .models import Station, Train, Route, RouteStation, PassengerFlow, DataVersion
+from .signals import data_imported
+
+# 导入时整体替换的基础数据表
+DATA_TABLES = ['station', 'train', 'route', 'route_station', 'passenger_flow']
+
+# 通过 API 单条写入时只递增对应表的版本
+TRACKED_MODELS = [Station, Train, Route, RouteStation, PassengerFlow]
+
+
+def bump_versions(*tables):
+    """递增数据表版本并记录更新时间（与数据写入处于同一事务）"""
+    now = timezone.now()
+    DataVersion.objects.bulk_create(
+        [DataVersion(table=table, updated_at=now) for table in tables], ignore_conflicts=True
+    )
+    DataVersion.objects.filter(table__in=tables).update(version=F('version') + 1, updated_at=now)
+
+
+def get_versions(tables):
+    """返回 {表名: (版本号, 更新时间)}，未记录的表为 (0, None)"""
+    versions = {table: (0, None) for table in tables}
+    for table, version, updated_at in DataVersion.objects.filter(table__in=tables).values_list(
+        'table', 'version', 'updated_at'
+    ):
+        versions[table] = (version, updated_at)
+    return versions
+
+
+def validators(request, tables):
+    """由依赖表的版本生成 (ETag, Last-Modified 时间戳)
+
+    ETag 同时包含请求路径、查询参数与 Accept，不同参数或表示形式互不混淆。
+    """
+    versions = get_versions(tables)
+    digest = hashlib.md5(usedforsecurity=False)
+    for table in sorted(versions):
+        digest.update(f'{table}:{versions[table][0]};'.encode())
+    digest.update(request.get_full_path().encode())
+    digest.update(request.META.get('HTTP_ACCEPT', '').encode())
+
+    modified = [updated_at for _, updated_at in versions.values() if updated_at is not None]
+    last_modified = timegm(max(modified).utctimetuple()) if modified else None
+    return quote_etag(digest.hexdigest()), last_modified
+
+
+def not_modified_response(request, etag, last_modified):
+    """条件请求命中时返回 304（或 412），否则返回 None"""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    record_cache('conditional_get', hit=response is not None)
+    return response
+
+
+def set_validators(response, etag, last_modified):
+    """写入 ETag/Last-Modified，并要求客户端每次使用前重新验证"""
+    if response.status_code in (200, 304):
+        if not response.has_header('ETag'):
+            response.headers['ETag'] = etag
+        if last_modified and not response.has_header('Last-Modified'):
+            response.headers['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+    return response
+
+
+class ConditionalGetMixin:
+    """GET/HEAD 按 data_tables 的数据版本做条件请求：未变化时直接返回 304，不执行查询与序列化"""
+    data_tables = DATA_TABLES
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+
+        etag, last_modified = validators(request, self.data_tables)
+        response = not_modified_response(request, etag, last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+        return set_validators(response, etag, last_modified)
+
+
+@receiver(data_imported)
+def bump_imported_tables(sender, **kwargs):
+    bump_versions(*DATA_TABLES)
+
+
+def bump_model_table(sender, **kwargs):
+    bump_versions(sender._meta.db_table)
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(bump_model_table, sender=model, dispatch_uid=f'version_{model._meta.db_table}_save')
+    # 客运记录的批量删除自行递增版本，见 PartitionedQuerySet.delete
+    if model is not PassengerFlow:
+        post_delete.connect(bump_model_table, sender=model, dispatch_uid=f'version_{model._meta.db_table}_delete')
@@ -3,22 +3,30 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
 from django.db.models import Sum, Count, Avg, F, Q, Min, Max
 from django.db.models.functions import Trunc
 import pandas as pd
 from datetime import datetime, timedelta
 
+from analytics import aggregates
+from railway_backend.renderers import is_columnar, serializer_columns, to_columnar
+from . import archive, sketches, stats
+from .fields import hour_start
 from .models import Station, Train, Route, RouteStation, PassengerFlow
+from .topology import route_topology
+from .versioning import ConditionalGetMixin
 from .serializers import (
     StationSerializer, TrainSerializer, RouteSerializer,
     RouteStationSerializer, PassengerFlowSerializer,
-    PassengerFlowSummarySerializer, StationRankingSerializer,
-    TimeDistributionSerializer, FlowAnalysisRequestSerializer
+    PassengerFlowSummarySerializer, StationRankingSerializer, TravelAreaRankingSerializer,
+    StationRankingRequestSerializer, TimeDistributionSerializer, FlowAnalysisRequestSerializer
 )
 
 
-class StationViewSet(viewsets.ModelViewSet):
+class StationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """站点视图集"""
+    data_tables = ['station']
     queryset = Station.objects.all()
     serializer_class = StationSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -42,8 +50,9 @@ class StationViewSet(viewsets.ModelViewSet):
         return Response([])
 
 
-class TrainViewSet(viewsets.ModelViewSet):
+class TrainViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """列车视图集"""
+    data_tables = ['train']
     queryset = Train.objects.all()
     serializer_class = TrainSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -53,8 +62,9 @@ class TrainViewSet(viewsets.ModelViewSet):
     ordering = ['id']
 
 
-class RouteViewSet(viewsets.ModelViewSet):
+class RouteViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """线路视图集"""
+    data_tables = ['route', 'route_station', 'station']
     queryset = Route.objects.all()
     serializer_class = RouteSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -65,16 +75,16 @@ class RouteViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'])
     def stations(self, request, pk=None):
-        """获取线路的所有站点"""
+        """获取线路的所有站点（读取线路拓扑缓存）"""
         route = self.get_object()
-        route_stations = RouteStation.objects.filter(route=route).order_by('sequence')
-        serializer = RouteStationSerializer(route_stations, many=True)
-        return Response(serializer.data)
+        topology = route_topology.get(route.id)
+        return Response(topology.rows() if topology is not None else [])
 
 
-class RouteStationViewSet(viewsets.ModelViewSet):
+class RouteStationViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """线路站点视图集"""
-    queryset = RouteStation.objects.all()
+    data_tables = ['route_station', 'route', 'station']
+    queryset = RouteStation.objects.select_related('route', 'station', 'previous_station', 'next_station')
     serializer_class = RouteStationSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['route', 'station', 'is_start', 'is_end', 'must_stop']
@@ -82,9 +92,10 @@ class RouteStationViewSet(viewsets.ModelViewSet):
     ordering = ['route', 'sequence']
 
 
-class PassengerFlowViewSet(viewsets.ModelViewSet):
+class PassengerFlowViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """客运记录视图集"""
-    queryset = PassengerFlow.objects.all()
+    # 起终点站以站点ID保存，输出电报码时一并关联
+    queryset = PassengerFlow.objects.select_related('start_station', 'end_station')
     serializer_class = PassengerFlowSerializer
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['route', 'train', 'station', 'operation_date']
@@ -110,49 +121,31 @@ class PassengerFlowViewSet(viewsets.ModelViewSet):
         """获取客运记录汇总"""
         queryset = self.filter_queryset(self.get_queryset())
 
-        # 按日期分组汇总
-        summary_data = queryset.values('operation_date').annotate(
-            total_passengers=Sum(F('passengers_in') + F('passengers_out')),
-            total_revenue=Sum('revenue'),
-            train_count=Count('train', distinct=True),
-            station_count=Count('station', distinct=True)
-        ).annotate(
-            avg_passengers_per_train=F('total_passengers') / F('train_count')
-        ).order_by('operation_date')
+        # 按日期分组汇总（exact=true 时去重计数扫描记录，不使用每日草图）
+        exact = request.query_params.get('exact', '').lower() in ('1', 'true')
+        summary_data = aggregates.daily_summary(queryset, exact=exact)
 
+        if is_columnar(request):
+            return Response(to_columnar(summary_data, serializer_columns(PassengerFlowSummarySerializer)))
         serializer = PassengerFlowSummarySerializer(summary_data, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
     def station_ranking(self, request):
-        """获取站点客流排名"""
+        """获取站点（或旅行区）客流排名，支持 metric、group_by、limit、offset 参数"""
+        params = StationRankingRequestSerializer(data=request.query_params)
+        if not params.is_valid():
+            return Response(params.errors, status=status.HTTP_400_BAD_REQUEST)
         queryset = self.filter_queryset(self.get_queryset())
 
-        # 按站点分组汇总
-        station_stats = queryset.values(
-            'station__id', 'station__name', 'station__telecode'
-        ).annotate(
-            total_passengers=Sum(F('passengers_in') + F('passengers_out')),
-            passengers_in=Sum('passengers_in'),
-            passengers_out=Sum('passengers_out'),
-            total_revenue=Sum('revenue')
-        ).order_by('-total_passengers')
-
-        # 添加排名
-        ranked_data = []
-        for i, stat in enumerate(station_stats, 1):
-            ranked_data.append({
-                'station_id': stat['station__id'],
-                'station_name': stat['station__name'],
-                'station_telecode': stat['station__telecode'],
-                'total_passengers': stat['total_passengers'] or 0,
-                'passengers_in': stat['passengers_in'] or 0,
-                'passengers_out': stat['passengers_out'] or 0,
-                'total_revenue': stat['total_revenue'] or 0,
-                'ranking': i
-            })
+        # 按分组汇总并排名，只返回所请求的一页
+        ranked_data = aggregates.station_ranking(queryset, **params.validated_data)
 
-        serializer = StationRankingSerializer(ranked_data, many=True)
+        serializer_class = (StationRankingSerializer if params.validated_data['group_by'] == 'station'
+                            else TravelAreaRankingSerializer)
+        if is_columnar(request):
+            return Response(to_columnar(ranked_data, serializer_columns(serializer_class)))
+        serializer = serializer_class(ranked_data, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=['get'])
@@ -161,39 +154,21 @@ class PassengerFlowViewSet(viewsets.ModelViewSet):
         queryset = self.filter_queryset(self.get_queryset())
 
         # 按小时分组
-        hourly_stats = []
-        for hour in range(24):
-            hour_queryset = queryset.filter(
-                arrival_time__hour=hour
-            ).aggregate(
-                total_passengers=Sum(F('passengers_in') + F('passengers_out')),
-                passengers_in=Sum('passengers_in'),
-                passengers_out=Sum('passengers_out'),
-                record_count=Count('id')
-            )
-
-            total_passengers = hour_queryset['total_passengers'] or 0
-            avg_passengers = total_passengers / (hour_queryset['record_count'] or 1)
-
-            hourly_stats.append({
-                'hour': hour,
-                'total_passengers': total_passengers,
-                'passengers_in': hour_queryset['passengers_in'] or 0,
-                'passengers_out': hour_queryset['passengers_out'] or 0,
-                'avg_passengers': avg_passengers,
-                'percentage': 0  # 将在后面计算
-            })
-
-        # 计算百分比
-        total = sum(stat['total_passengers'] for stat in hourly_stats)
-        if total > 0:
-            for stat in hourly_stats:
-                stat['percentage'] = (stat['total_passengers'] / total) * 100
+        hourly_stats = aggregates.time_distribution(queryset)
 
+        if is_columnar(request):
+            return Response(to_columnar(hourly_stats, serializer_columns(TimeDistributionSerializer)))
         serializer = TimeDistributionSerializer(hourly_stats, many=True)
         return Response(serializer.data)
 
 
+# 客流分析结果的列（行式输出的字段顺序，列式输出的列名）
+FLOW_ANALYSIS_COLUMNS = [
+    'time_period', 'total_passengers', 'passengers_in', 'passengers_out',
+    'total_revenue', 'train_count', 'station_count', 'avg_passengers_per_train',
+]
+
+
 class FlowAnalysisView(APIView):
     """客流分析视图"""
 
@@ -212,7 +187,7 @@ class FlowAnalysisView(APIView):
         time_granularity = data['time_granularity']
 
         # 构建查询
-        queryset = PassengerFlow.objects.filter(
+        queryset = PassengerFlow.objects.using(settings.ANALYTICS_DATABASE).filter(
             operation_date__range=[start_date, end_date]
         )
 
@@ -227,7 +202,7 @@ class FlowAnalysisView(APIView):
         if time_granularity == 'hour':
             # 按小时分组
             queryset = queryset.annotate(
-                time_period=Trunc('arrival_time', 'hour')
+                time_period=hour_start('arrival_time')
             )
         elif time_granularity == 'day':
             queryset = queryset.annotate(
@@ -250,15 +225,30 @@ class FlowAnalysisView(APIView):
                 time_period=Trunc('operation_date', 'year')
             )
 
-        # 执行聚合
-        results = queryset.values('time_period').annotate(
+        # 执行聚合；未按站点/线路/列车过滤时各周期的去重计数由每日草图合并。
+        # 本接口只统计库中记录，草图包含已归档日期，区间与归档月份相交时仍扫描记录
+        use_sketches = not (station_ids or route_ids or train_ids or data['exact'] or time_granularity == 'hour'
+                            or archive.archives_for_ranges([(start_date, end_date)]))
+        sums = dict(
             total_passengers=Sum(F('passengers_in') + F('passengers_out')),
             passengers_in=Sum('passengers_in'),
             passengers_out=Sum('passengers_out'),
             total_revenue=Sum('revenue'),
-            train_count=Count('train', distinct=True),
-            station_count=Count('station', distinct=True)
-        ).order_by('time_period')
+        )
+        if use_sketches:
+            results = list(queryset.values('time_period').annotate(**sums).order_by('time_period'))
+            counts = sketches.distinct_counts(
+                start_date, end_date, period=lambda day: sketches.period_start(day, time_granularity)
+            )
+            for result in results:
+                period_counts = counts.get(result['time_period'], sketches.EMPTY)
+                result['train_count'], result['station_count'] = period_counts.trains, period_counts.stations
+        else:
+            results = queryset.values('time_period').annotate(
+                **sums,
+                train_count=Count('train', distinct=True),
+                station_count=Count('station', distinct=True)
+            ).order_by('time_period')
 
         # 格式化结果
         formatted_results = []
@@ -276,7 +266,7 @@ class FlowAnalysisView(APIView):
 
         return Response({
             'success': True,
-            'data': formatted_results,
+            'data': to_columnar(formatted_results, FLOW_ANALYSIS_COLUMNS) if is_columnar(request) else formatted_results,
             'summary': {
                 'total_records': queryset.count(),
                 'time_periods': len(formatted_results),
@@ -286,44 +276,49 @@ class FlowAnalysisView(APIView):
 
 
 # 数据管理API
-class DataStatsView(APIView):
-    """数据统计视图"""
+class DataStatsView(ConditionalGetMixin, APIView):
+    """数据统计视图（读取写入时维护的计数，不扫描数据表）"""
 
     def get(self, request):
-        """获取数据统计"""
+        """获取数据统计；coverage=day/month 时附带各运行日（月）的记录数"""
         try:
-            # 获取各实体的数量
-            total_records = PassengerFlow.objects.count()
-            stations_count = Station.objects.count()
-            trains_count = Train.objects.count()
-            routes_count = Route.objects.count()
-
-            # 获取客运记录的日期范围
-            date_range = PassengerFlow.objects.aggregate(
-                min_date=Min('operation_date'),
-                max_date=Max('operation_date')
-            )
+            # 各实体的数量与客运记录的日期范围（客运记录含已归档月份）
+            rows, min_date, max_date = stats.summary()
 
             # 获取最近上传（这里简化处理，返回空数组）
             recent_uploads = []
 
-            return Response({
-                'totalRecords': total_records,
-                'stations': stations_count,
-                'trains': trains_count,
-                'lines': routes_count,
+            data = {
+                'totalRecords': rows['passenger_flow'],
+                'stations': rows['station'],
+                'trains': rows['train'],
+                'lines': rows['route'],
                 'dateRange': {
-                    'minDate': date_range['min_date'].strftime('%Y-%m-%d') if date_range['min_date'] else None,
-                    'maxDate': date_range['max_date'].strftime('%Y-%m-%d') if date_range['max_date'] else None
+                    'minDate': min_date.strftime('%Y-%m-%d') if min_date else None,
+                    'maxDate': max_date.strftime('%Y-%m-%d') if max_date else None
                 },
                 'lastUpdated': datetime.now().isoformat(),
                 'recentUploads': recent_uploads
-            })
+            }
+
+            granularity = request.query_params.get('coverage')
+            if granularity in ('day', 'month'):
+                days = stats.coverage(request.query_params.get('startDate'), request.query_params.get('endDate'))
+                if granularity == 'month':
+                    months = {}
+                    for day, records in days:
+                        key = day.strftime('%Y-%m')
+                        months[key] = months.get(key, 0) + records
+                    data['coverage'] = [{'date': key, 'records': records} for key, records in months.items()]
+                else:
+                    data['coverage'] = [{'date': day.strftime('%Y-%m-%d'), 'records': records}
+                                        for day, records in days]
+            return Response(data)
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class DataRecordsView(APIView):
+class DataRecordsView(ConditionalGetMixin, APIView):
     """数据记录查询视图"""
 
     def get(self, request):
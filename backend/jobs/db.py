@@ -0,0 +1,24 @@
+from django.conf import settings
+
+APP_LABEL = 'jobs'
+
+
+class JobsDatabaseRouter:
+    """任务表读写与迁移只在独立的任务库（JOBS_DATABASE）上进行，其他应用的表不会迁移到任务库"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == APP_LABEL:
+            return settings.JOBS_DATABASE
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == APP_LABEL:
+            return settings.JOBS_DATABASE
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if app_label == APP_LABEL:
+            return db == settings.JOBS_DATABASE
+        if db == settings.JOBS_DATABASE:
+            return False
+        return None
@@ -0,0 +1,34 @@
+import os
+import socket
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from jobs.services import WorkerPool
+
+
+class Command(BaseCommand):
+    help = '启动后台任务工作进程（启动前自动迁移任务库）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.JOB_WORKERS,
+            help=f'工作线程数（默认 {settings.JOB_WORKERS}）',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='执行完当前排队的任务后退出',
+        )
+
+    def handle(self, *args, **options):
+        call_command('migrate', 'jobs', database=settings.JOBS_DATABASE, verbosity=0)
+
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        pool = WorkerPool(max(options['workers'], 1), name, idle_exit=options['once'])
+        self.stdout.write(f'后台任务工作进程 {name} 已启动（{len(pool.threads)} 个工作线程），Ctrl+C 停止')
+        pool.run()
+        self.stdout.write(self.style.SUCCESS('后台任务工作进程已停止'))
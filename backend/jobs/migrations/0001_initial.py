@@ -0,0 +1,48 @@
+# Generated by Django 4.2.16 on 2026-10-19 19:13
+
+from django.db import migrations, models
+import django.utils.timezone
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False, verbose_name='任务ID')),
+                ('kind', models.CharField(max_length=50, verbose_name='任务类型')),
+                ('params', models.JSONField(blank=True, default=dict, verbose_name='任务参数')),
+                ('dedup_key', models.CharField(max_length=64, verbose_name='去重键')),
+                ('status', models.CharField(choices=[('queued', '排队中'), ('running', '执行中'), ('succeeded', '已完成'), ('failed', '失败'), ('cancelled', '已取消')], default='queued', max_length=20, verbose_name='状态')),
+                ('progress', models.FloatField(default=0, verbose_name='进度')),
+                ('message', models.CharField(blank=True, default='', max_length=200, verbose_name='进度说明')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='结果')),
+                ('result_file', models.CharField(blank=True, default='', max_length=255, verbose_name='结果文件')),
+                ('error', models.TextField(blank=True, default='', verbose_name='错误信息')),
+                ('cancel_requested', models.BooleanField(default=False, verbose_name='已请求取消')),
+                ('worker', models.CharField(blank=True, default='', max_length=100, verbose_name='工作线程')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='提交时间')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='开始时间')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='心跳时间')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='结束时间')),
+            ],
+            options={
+                'verbose_name': '后台任务',
+                'verbose_name_plural': '后台任务',
+                'db_table': 'job',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='job_status_32da21_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['queued', 'running'])), fields=('dedup_key',), name='job_unique_active'),
+        ),
+    ]
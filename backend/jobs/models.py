@@ -0,0 +1,62 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    """后台任务（由 run_jobs 工作进程领取执行）"""
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, '排队中'),
+        (STATUS_RUNNING, '执行中'),
+        (STATUS_SUCCEEDED, '已完成'),
+        (STATUS_FAILED, '失败'),
+        (STATUS_CANCELLED, '已取消'),
+    ]
+    # 未结束的任务：相同任务类型与参数的提交会复用这些任务
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False, verbose_name='任务ID')
+    kind = models.CharField(max_length=50, verbose_name='任务类型')
+    params = models.JSONField(default=dict, blank=True, verbose_name='任务参数')
+    dedup_key = models.CharField(max_length=64, verbose_name='去重键')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, verbose_name='状态')
+    progress = models.FloatField(default=0, verbose_name='进度')
+    message = models.CharField(max_length=200, blank=True, default='', verbose_name='进度说明')
+    result = models.JSONField(null=True, blank=True, verbose_name='结果')
+    result_file = models.CharField(max_length=255, blank=True, default='', verbose_name='结果文件')
+    error = models.TextField(blank=True, default='', verbose_name='错误信息')
+    cancel_requested = models.BooleanField(default=False, verbose_name='已请求取消')
+    worker = models.CharField(max_length=100, blank=True, default='', verbose_name='工作线程')
+    created_at = models.DateTimeField(default=timezone.now, verbose_name='提交时间')
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name='开始时间')
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name='心跳时间')
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name='结束时间')
+
+    class Meta:
+        db_table = 'job'
+        verbose_name = '后台任务'
+        verbose_name_plural = '后台任务'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='job_unique_active',
+            ),
+        ]
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.kind} {self.id}: {self.get_status_display()}'
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
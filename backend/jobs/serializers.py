@@ -0,0 +1,32 @@
+from rest_framework import serializers
+
+from .models import Job
+from .services import TASKS
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """后台任务序列化器"""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    has_result_file = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'kind', 'params', 'status', 'status_display', 'progress', 'message', 'result',
+            'has_result_file', 'error', 'cancel_requested', 'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+    def get_has_result_file(self, obj):
+        return bool(obj.result_file)
+
+
+class JobSubmitSerializer(serializers.Serializer):
+    """任务提交请求：任务类型与参数（参数按任务类型校验）"""
+    kind = serializers.ChoiceField(choices=[])
+    params = serializers.DictField(required=False, default=dict)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 任务类型在各应用加载后注册
+        self.fields['kind'].choices = sorted(TASKS)
@@ -0,0 +1,216 @@
+"""后台任务队列
+
+任务保存在独立的 SQLite 库（JOBS_DATABASE）中：导入等长事务持有数据库写锁时，进度与状态仍可写入。
+Web 进程只负责提交与查询，run_jobs 管理命令启动的工作线程领取排队任务执行；领取以条件更新实现，
+多个 run_jobs 进程可以同时运行。
+
+相同任务类型与参数的未结束任务只保留一个，重复提交返回已有任务。取消为协作式：排队中的任务直接取消，
+执行中的任务在下一次报告进度时中止。
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from railway_backend.metrics import JOB_DURATION, JOBS_SUBMITTED
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelled(Exception):
+    """任务已被请求取消"""
+
+
+# 已注册的任务类型：{任务类型: (任务函数, 参数序列化器)}
+TASKS = {}
+
+
+def task(kind, serializer_class=None):
+    """注册任务函数：func(context, **params)，返回可序列化为 JSON 的结果；serializer_class 校验提交的参数"""
+    def decorator(func):
+        TASKS[kind] = (func, serializer_class)
+        return func
+    return decorator
+
+
+def validate_params(kind, params):
+    """校验并规范化任务参数；参数错误时抛出 serializers.ValidationError"""
+    serializer_class = TASKS[kind][1]
+    if serializer_class is None:
+        return {}
+    serializer = serializer_class(data=params)
+    serializer.is_valid(raise_exception=True)
+    # 以序列化器输出的表示形式保存（日期等转为字符串），便于比较与 JSON 存储
+    return dict(serializer_class(serializer.validated_data).data)
+
+
+def dedup_key(kind, params):
+    payload = json.dumps([kind, params], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def submit(kind, params):
+    """提交任务，返回 (任务, 是否新建)；已有相同的未结束任务时直接返回该任务"""
+    key = dedup_key(kind, params)
+    existing = Job.objects.filter(dedup_key=key, status__in=Job.ACTIVE_STATUSES).first()
+    if existing is not None:
+        JOBS_SUBMITTED.inc(kind=kind, result='deduplicated')
+        return existing, False
+    try:
+        with transaction.atomic(using=settings.JOBS_DATABASE):
+            job = Job.objects.create(kind=kind, params=params, dedup_key=key)
+    except IntegrityError:
+        # 并发提交时由部分唯一索引保证只有一个未结束的任务
+        JOBS_SUBMITTED.inc(kind=kind, result='deduplicated')
+        return Job.objects.get(dedup_key=key, status__in=Job.ACTIVE_STATUSES), False
+    JOBS_SUBMITTED.inc(kind=kind, result='created')
+    return job, True
+
+
+def cancel(job):
+    """取消任务：排队中的任务立即取消，执行中的任务标记取消请求；返回刷新后的任务"""
+    now = timezone.now()
+    if not Job.objects.filter(id=job.id, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_CANCELLED, cancel_requested=True, finished_at=now
+    ):
+        Job.objects.filter(id=job.id, status=Job.STATUS_RUNNING).update(cancel_requested=True)
+    job.refresh_from_db()
+    return job
+
+
+def claim_next(worker):
+    """领取最早提交的排队任务；没有可领取的任务时返回 None"""
+    candidates = Job.objects.filter(status=Job.STATUS_QUEUED).order_by('created_at').values_list('id', flat=True)
+    for job_id in candidates[:10]:
+        now = timezone.now()
+        # 条件更新保证同一任务只会被一个工作线程领取
+        if Job.objects.filter(id=job_id, status=Job.STATUS_QUEUED).update(
+            status=Job.STATUS_RUNNING, worker=worker, started_at=now, heartbeat_at=now
+        ):
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def fail_stale_jobs():
+    """心跳超过 JOB_STALE_SECONDS 未更新的执行中任务（工作进程已退出）标记为失败，返回任务数"""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    return Job.objects.filter(status=Job.STATUS_RUNNING, heartbeat_at__lt=cutoff).update(
+        status=Job.STATUS_FAILED, error='工作进程已退出', finished_at=timezone.now()
+    )
+
+
+def result_dir():
+    return Path(settings.JOB_RESULT_DIR)
+
+
+def result_path(job):
+    return result_dir() / job.result_file
+
+
+class JobContext:
+    """任务函数的执行上下文：报告进度、检查取消请求、分配结果文件"""
+
+    def __init__(self, job):
+        self.job = job
+        self.result_file = ''
+
+    def progress(self, fraction, message=''):
+        """更新进度（0~1）；任务已被请求取消时抛出 JobCancelled"""
+        if not Job.objects.filter(id=self.job.id, cancel_requested=False).update(
+            progress=min(max(fraction, 0.0), 1.0), message=message[:200], heartbeat_at=timezone.now()
+        ):
+            raise JobCancelled()
+
+    def result_path(self, suffix):
+        """任务的结果文件路径（任务成功后可通过结果下载接口获取）"""
+        self.result_file = f'{self.job.id}{suffix}'
+        directory = result_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        return directory / self.result_file
+
+
+def run_job(job):
+    """执行已领取的任务并记录结果状态"""
+    context = JobContext(job)
+    fields = {}
+    started = time.perf_counter()
+    try:
+        func = TASKS[job.kind][0]
+        result = func(context, **job.params)
+    except JobCancelled:
+        fields = {'status': Job.STATUS_CANCELLED}
+    except Exception as e:
+        logger.exception('后台任务执行失败: %s %s', job.kind, job.id)
+        fields = {'status': Job.STATUS_FAILED, 'error': str(e) or e.__class__.__name__}
+    else:
+        fields = {'status': Job.STATUS_SUCCEEDED, 'result': result, 'result_file': context.result_file,
+                  'progress': 1.0}
+    JOB_DURATION.observe(time.perf_counter() - started, kind=job.kind, status=fields['status'])
+
+    if fields['status'] != Job.STATUS_SUCCEEDED and context.result_file:
+        (result_dir() / context.result_file).unlink(missing_ok=True)
+    Job.objects.filter(id=job.id).update(finished_at=timezone.now(), **fields)
+    job.refresh_from_db()
+    return job
+
+
+def work(worker, stop, idle_exit=False):
+    """工作线程主循环：领取并执行任务，直到 stop 被设置（idle_exit 时队列为空即退出）"""
+    while not stop.is_set():
+        close_old_connections()
+        job = claim_next(worker)
+        if job is None:
+            if idle_exit:
+                break
+            stop.wait(settings.JOB_POLL_INTERVAL)
+            continue
+        logger.info('开始执行后台任务: %s %s', job.kind, job.id)
+        run_job(job)
+    close_old_connections()
+
+
+class WorkerPool:
+    """本进程的工作线程池；主线程定期为执行中的任务更新心跳并清理失联任务"""
+
+    def __init__(self, size, name, idle_exit=False):
+        self.stop = threading.Event()
+        self.threads = [
+            threading.Thread(target=work, args=(f'{name}-{index}', self.stop, idle_exit),
+                             name=f'job-worker-{index}', daemon=True)
+            for index in range(1, size + 1)
+        ]
+        self.name = name
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def heartbeat(self):
+        Job.objects.filter(status=Job.STATUS_RUNNING, worker__startswith=f'{self.name}-').update(
+            heartbeat_at=timezone.now()
+        )
+        fail_stale_jobs()
+        close_old_connections()
+
+    def run(self):
+        """运行至全部工作线程退出或收到中断"""
+        self.start()
+        try:
+            while any(thread.is_alive() for thread in self.threads):
+                self.heartbeat()
+                for thread in self.threads:
+                    thread.join(timeout=settings.JOB_HEARTBEAT_SECONDS / len(self.threads))
+        except KeyboardInterrupt:
+            logger.warning('收到中断，等待执行中的任务完成')
+        finally:
+            self.stop.set()
+            for thread in self.threads:
+                thread.join()
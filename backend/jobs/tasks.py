@@ -0,0 +1,116 @@
+"""后台任务类型
+
+任务函数的参数来自提交时经序列化器校验的 JSON（日期为 ISO 字符串），长时间运行的步骤之间调用
+context.progress 报告进度，同时响应取消请求。
+"""
+import csv
+
+from django.conf import settings
+from rest_framework import serializers
+
+from analytics.aggregates import filtered_flows, reader
+from analytics.serializers import FlowFilterSerializer
+from analytics.services import AnomalyDetectionService
+from data_management import archive
+from data_management.models import Station, Train, Route, PassengerFlow
+from data_management.services import DataImportService
+from data_management.signals import data_imported
+from .services import task
+
+# 导出文件的列（与 passenger_flow 表的列名一致）
+EXPORT_COLUMNS = [
+    'id', 'operation_date', 'route_id', 'train_id', 'station_id', 'route_station_sequence',
+    'arrival_time', 'departure_time', 'passengers_in', 'passengers_out', 'ticket_price', 'revenue',
+]
+# 归档中以整数分保存的金额列与以当日分钟数保存的时刻列，导出格式与数据库读出的值一致
+MONEY_COLUMNS = {'ticket_price', 'revenue'}
+TIME_COLUMNS = {'arrival_time', 'departure_time'}
+EXPORT_CHUNK_SIZE = 50_000
+
+
+class ImportDataSerializer(serializers.Serializer):
+    """数据导入任务参数"""
+    clear = serializers.BooleanField(default=False)
+
+
+class ArchivePartitionsSerializer(serializers.Serializer):
+    """冷数据归档任务参数（默认使用 FLOW_HOT_MONTHS）"""
+    hot_months = serializers.IntegerField(required=False, min_value=1)
+
+
+@task('import_data', ImportDataSerializer)
+def import_data(context, clear=False):
+    """从 CSV 文件导入基础数据与客运记录，完成后重建派生分析数据"""
+    service = DataImportService()
+    if clear:
+        context.progress(0, '清除现有数据')
+        service.clear_all_data()
+    service.import_all_data(progress=context.progress)
+    return {
+        'stations': Station.objects.count(),
+        'trains': Train.objects.count(),
+        'routes': Route.objects.count(),
+        'passenger_flows': PassengerFlow.objects.count(),
+    }
+
+
+@task('refresh_analytics')
+def refresh_analytics(context):
+    """重建派生分析数据（站点角色等）"""
+    context.progress(0, '重建派生分析数据')
+    data_imported.send(sender=DataImportService)
+    return None
+
+
+@task('detect_anomalies')
+def detect_anomalies(context):
+    """重新检测站点与线路的日客流异常"""
+    return AnomalyDetectionService().rebuild(progress=context.progress)
+
+
+@task('archive_partitions', ArchivePartitionsSerializer)
+def archive_partitions(context, hot_months=None):
+    """将热数据窗口之外的月分区归档为 Parquet 文件"""
+    tables = archive.cold_tables(hot_months or settings.FLOW_HOT_MONTHS)
+    archived = {}
+    for index, table in enumerate(tables):
+        context.progress(index / len(tables), f'归档 {table}')
+        archived[table] = archive.archive_partition(table)
+    return {'archived': archived}
+
+
+def _cold_rows(table):
+    """按日期、ID 排序逐批产出归档记录行"""
+    table = table.sort_by([('operation_date', 'ascending'), ('id', 'ascending')])
+    for batch in table.to_batches(EXPORT_CHUNK_SIZE):
+        columns = batch.to_pydict()
+        for name in MONEY_COLUMNS:
+            columns[name] = [None if value is None else f'{value / 100:.2f}' for value in columns[name]]
+        for name in TIME_COLUMNS:
+            columns[name] = [None if value is None else f'{value // 60:02d}:{value % 60:02d}:00'
+                             for value in columns[name]]
+        yield from zip(*(columns[name] for name in EXPORT_COLUMNS))
+
+
+@task('export_flows', FlowFilterSerializer)
+def export_flows(context, start_date, end_date, station_ids=None, route_ids=None, train_ids=None):
+    """按过滤条件将客运记录（含已归档月份）导出为 CSV 文件"""
+    queryset = filtered_flows(start_date, end_date, station_ids, route_ids, train_ids)
+    cold = archive.scan_queryset(queryset, EXPORT_COLUMNS)
+    hot_rows = reader(queryset).order_by('operation_date', 'id').values_list(*EXPORT_COLUMNS)
+    total = hot_rows.count() + (cold.num_rows if cold is not None else 0)
+
+    # 归档月份早于数据库中的月份，先写归档数据以保持日期顺序
+    sources = ([_cold_rows(cold)] if cold is not None else []) + [hot_rows.iterator(chunk_size=EXPORT_CHUNK_SIZE)]
+    written = 0
+    # 带 BOM 的 UTF-8，Excel 可直接打开中文内容
+    with open(context.result_path('.csv'), 'w', newline='', encoding='utf-8-sig') as file:
+        writer = csv.writer(file)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in sources:
+            for row in rows:
+                writer.writerow(row)
+                written += 1
+                if written % EXPORT_CHUNK_SIZE == 0:
+                    context.progress(written / total, f'已导出 {written}/{total} 条')
+    return {'rows': written}
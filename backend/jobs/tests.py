@@ -0,0 +1,144 @@
+import csv
+import io
+import tempfile
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from data_management.models import Station, Train, Route, PassengerFlow
+from . import services
+from .models import Job
+
+
+class JobQueueTests(TestCase):
+    """任务提交去重、执行、取消与结果下载"""
+    databases = {'default', 'jobs'}
+
+    @classmethod
+    def setUpTestData(cls):
+        Station.objects.bulk_create([
+            Station(id=i, name=f'站点{i}', telecode=f'T{i:02d}') for i in range(1, 3)
+        ])
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.bulk_create([
+            PassengerFlow(
+                route_id=1, train_id=1, station_id=station_id, operation_date=date(2024, 1, day),
+                passengers_in=day, passengers_out=station_id, revenue='12.50',
+            )
+            for day in range(1, 6) for station_id in range(1, 3)
+        ])
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(JOB_RESULT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def submit(self, kind, params=None):
+        return self.client.post('/api/jobs/', {'kind': kind, 'params': params or {}}, content_type='application/json')
+
+    def run_next(self):
+        job = services.claim_next('test-1')
+        self.assertIsNotNone(job)
+        return services.run_job(job)
+
+    def test_identical_active_jobs_are_deduplicated(self):
+        params = {'start_date': '2024-01-02', 'end_date': '2024-01-04', 'station_ids': [1]}
+        first = self.submit('export_flows', params)
+        second = self.submit('export_flows', dict(reversed(params.items())))
+        other = self.submit('export_flows', {**params, 'station_ids': [2]})
+        self.assertEqual((first.status_code, second.status_code, other.status_code), (202, 200, 202))
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertNotEqual(first.json()['id'], other.json()['id'])
+
+        # 任务结束后相同的提交新建任务
+        self.run_next()
+        self.run_next()
+        self.assertEqual(self.submit('export_flows', params).status_code, 202)
+
+    def test_export_result_download(self):
+        job_id = self.submit('export_flows', {'start_date': '2024-01-02', 'end_date': '2024-01-04'}).json()['id']
+        self.assertEqual(self.client.get(f'/api/jobs/{job_id}/result/').status_code, 409)
+
+        job = self.run_next()
+        self.assertEqual((job.status, job.progress, job.result), (Job.STATUS_SUCCEEDED, 1.0, {'rows': 6}))
+        status = self.client.get(f'/api/jobs/{job_id}/').json()
+        self.assertEqual((status['status'], status['has_result_file']), ('succeeded', True))
+
+        response = self.client.get(f'/api/jobs/{job_id}/result/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row['operation_date'] for row in rows[::2]], ['2024-01-02', '2024-01-03', '2024-01-04'])
+        self.assertEqual(rows[0]['revenue'], '12.50')
+
+    def test_cancel(self):
+        queued = self.submit('refresh_analytics').json()
+        response = self.client.post(f'/api/jobs/{queued["id"]}/cancel/')
+        self.assertEqual(response.json()['status'], 'cancelled')
+        self.assertIsNone(services.claim_next('test-1'))
+
+        # 执行中的任务在下一次报告进度时中止，已写入的结果文件被删除
+        def slow_export(context):
+            context.result_path('.csv').write_text('partial')
+            services.cancel(context.job)
+            context.progress(0.5)
+
+        with mock.patch.dict(services.TASKS, {'slow_export': (slow_export, None)}):
+            job_id = self.submit('slow_export').json()['id']
+            job = self.run_next()
+        self.assertEqual((str(job.id), job.status, job.result_file), (job_id, Job.STATUS_CANCELLED, ''))
+        self.assertFalse(any(services.result_dir().iterdir()))
+
+    def test_failed_job_and_validation(self):
+        def broken(context):
+            raise ValueError('数据文件不存在')
+
+        with mock.patch.dict(services.TASKS, {'broken': (broken, None)}), self.assertLogs('jobs.services', 'ERROR'):
+            self.submit('broken')
+            job = self.run_next()
+        self.assertEqual((job.status, job.error), (Job.STATUS_FAILED, '数据文件不存在'))
+
+        self.assertEqual(self.submit('unknown').status_code, 400)
+        response = self.submit('export_flows', {'start_date': '2024-01-05', 'end_date': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Job.objects.count(), 1)
+
+    def test_stale_running_jobs_fail(self):
+        self.submit('refresh_analytics')
+        job = services.claim_next('lost-1')
+        Job.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(services.fail_stale_jobs(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_FAILED)
+
+
+class WorkerCommandTests(TransactionTestCase):
+    """run_jobs 工作线程领取并执行排队任务"""
+    databases = {'default', 'jobs'}
+
+    def setUp(self):
+        Station.objects.create(id=1, name='站点1', telecode='T01')
+        Train.objects.create(id=1, code='G1', capacity=500)
+        Route.objects.create(id=1, code=100, name='线路 1')
+        PassengerFlow.objects.create(route_id=1, train_id=1, station_id=1, operation_date=date(2024, 1, 1),
+                                     passengers_in=3, passengers_out=2)
+        # 分区表不在 TransactionTestCase 的清理范围内，测试结束时删除
+        self.addCleanup(PassengerFlow.objects.all().delete)
+
+    def test_run_once(self):
+        jobs = [services.submit('refresh_analytics', {})[0],
+                services.submit('archive_partitions', {'hot_months': 6})[0]]
+        call_command('run_jobs', '--once', '--workers', '2', stdout=io.StringIO())
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual(job.status, Job.STATUS_SUCCEEDED, job.error)
+            self.assertTrue(job.worker)
+        self.assertEqual(jobs[1].result, {'archived': {}})
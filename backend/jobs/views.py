@@ -0,0 +1,54 @@
+from django.http import FileResponse
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import mixins, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import services
+from .models import Job
+from .serializers import JobSerializer, JobSubmitSerializer
+
+
+class JobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """后台任务视图集：提交、查询状态与进度、取消、下载结果"""
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['kind', 'status']
+
+    def create(self, request):
+        """提交任务；已有相同类型与参数的未结束任务时返回该任务（200），否则新建（202）"""
+        serializer = JobSubmitSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        kind = serializer.validated_data['kind']
+        params = services.validate_params(kind, serializer.validated_data['params'])
+        job, created = services.submit(kind, params)
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED if created else status.HTTP_200_OK
+        )
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        """取消任务（已结束的任务不受影响）"""
+        job = services.cancel(self.get_object())
+        return Response(JobSerializer(job).data)
+
+    @action(detail=True, methods=['get'])
+    def result(self, request, pk=None):
+        """下载任务结果：有结果文件时返回文件，否则返回 JSON 结果"""
+        job = self.get_object()
+        if job.status != Job.STATUS_SUCCEEDED:
+            return Response(
+                {'error': f'任务{job.get_status_display()}，没有可下载的结果'},
+                status=status.HTTP_409_CONFLICT
+            )
+        if not job.result_file:
+            return Response(job.result)
+        path = services.result_path(job)
+        if not path.exists():
+            return Response({'error': '结果文件已被清理'}, status=status.HTTP_410_GONE)
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True,
+            filename=f'{job.kind}-{job.created_at:%Y%m%d%H%M%S}{path.suffix}'
+        )
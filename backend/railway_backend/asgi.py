@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Run in production with e.g.:
+    uvicorn railway_backend.asgi:application --workers 4
 """
 
 import os
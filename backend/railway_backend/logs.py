@@ -0,0 +1,10 @@
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+
+class LazyRotatingFileHandler(RotatingFileHandler):
+    """首次写入时才创建日志目录的滚动文件处理器（配合 delay=True，加载配置不产生目录）"""
+
+    def _open(self):
+        Path(self.baseFilename).parent.mkdir(parents=True, exist_ok=True)
+        return super()._open()
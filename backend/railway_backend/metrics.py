@@ -0,0 +1,338 @@
+"""进程间共享的运行指标，以 Prometheus 文本格式输出
+
+每个进程把自己的指标写入 METRICS_DIR 下独立的 mmap 文件（只有本进程写入，无需跨进程锁），
+/metrics 抓取时读取目录中全部文件并求和，因此 gunicorn 多 worker 下得到的是全局数值。
+已退出进程（worker 重启、管理命令）的文件在抓取或新进程启动时累加进 metrics_archive.db 并删除，
+目录中的文件数不随重启增长；判断进程是否存活依赖 PID，METRICS_DIR 不能在多台主机或容器间共享。
+部署新版本时清空 METRICS_DIR 即可让计数从零开始（Prometheus 会按计数器重置处理）。
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境不合并，目录中的文件照常汇总
+    fcntl = None
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse
+
+# 文件头：已使用字节数（int32，4字节对齐填充至8字节）
+_HEADER_SIZE = 8
+_INITIAL_SIZE = 1 << 20
+
+# 已退出进程的指标累加到该文件
+_ARCHIVE_NAME = 'metrics_archive.db'
+_LOCK_NAME = '.merge.lock'
+
+# 请求耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# 导入/派生任务耗时桶上界（秒）
+JOB_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+
+def _read_entries(data, used):
+    """解析文件内容，依次产出 (键, 值, 值偏移)"""
+    pos = _HEADER_SIZE
+    while pos < used:
+        key_length = struct.unpack_from('<i', data, pos)[0]
+        key_end = pos + 4 + key_length
+        key = bytes(data[pos + 4:key_end]).decode('utf-8')
+        value_pos = key_end + (8 - (4 + key_length) % 8) % 8
+        yield key, struct.unpack_from('<d', data, value_pos)[0], value_pos
+        pos = value_pos + 8
+
+
+def _read_file(path):
+    """读取指标文件，返回 {键: 值}"""
+    data = path.read_bytes()
+    if len(data) < _HEADER_SIZE:
+        return {}
+    used = struct.unpack_from('<i', data, 0)[0]
+    return {key: value for key, value, _ in _read_entries(data, used)}
+
+
+def _is_dead(path):
+    """指标文件所属的进程是否已退出（合并文件与本进程的文件除外）"""
+    try:
+        pid = int(path.stem[len('metrics_'):])
+    except ValueError:
+        return False
+    if pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def merge_dead_processes(directory):
+    """把已退出进程的指标文件累加进合并文件后删除，返回合并的文件数"""
+    directory = Path(directory)
+    if fcntl is None or not directory.is_dir():
+        return 0
+    with open(directory / _LOCK_NAME, 'a+b') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [path for path in sorted(directory.glob('metrics_*.db')) if _is_dead(path)]
+        if not dead:
+            return 0
+        archive = _ProcessFile(directory / _ARCHIVE_NAME)
+        try:
+            for path in dead:
+                for key, value in _read_file(path).items():
+                    archive.increment(key, value)
+                path.unlink()
+        finally:
+            archive.close()
+    return len(dead)
+
+
+class _ProcessFile:
+    """单个进程独占写入的 mmap 指标文件：顺序追加 (键长度, 键, 8字节浮点值)"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a+b')
+        capacity = os.fstat(self._file.fileno()).st_size
+        if capacity == 0:
+            capacity = _INITIAL_SIZE
+            self._file.truncate(capacity)
+        self._capacity = capacity
+        self._map = mmap.mmap(self._file.fileno(), capacity)
+        self._used = struct.unpack_from('<i', self._map, 0)[0] or _HEADER_SIZE
+        self._positions = {key: pos for key, _, pos in _read_entries(self._map, self._used)}
+
+    def _allocate(self, key):
+        encoded = key.encode('utf-8')
+        padding = (8 - (4 + len(encoded)) % 8) % 8
+        entry = struct.pack('<i', len(encoded)) + encoded + b' ' * padding + struct.pack('<d', 0.0)
+        while self._used + len(entry) > self._capacity:
+            self._capacity *= 2
+            self._map.close()
+            self._file.truncate(self._capacity)
+            self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._map[self._used:self._used + len(entry)] = entry
+        self._positions[key] = self._used + len(entry) - 8
+        self._used += len(entry)
+        # 先写条目、后更新文件头，读取方不会看到写了一半的条目
+        struct.pack_into('<i', self._map, 0, self._used)
+
+    def increment(self, key, amount):
+        if key not in self._positions:
+            self._allocate(key)
+        pos = self._positions[key]
+        value = struct.unpack_from('<d', self._map, pos)[0]
+        struct.pack_into('<d', self._map, pos, value + amount)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class MetricsStore:
+    """按进程懒加载指标文件；fork 后或 METRICS_DIR 变化时自动切换到新文件"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._file = None
+        self._owner = None
+
+    def _process_file(self):
+        owner = (os.getpid(), str(settings.METRICS_DIR))
+        if owner != self._owner:
+            directory = Path(settings.METRICS_DIR)
+            directory.mkdir(parents=True, exist_ok=True)
+            merge_dead_processes(directory)
+            self._file = _ProcessFile(directory / f'metrics_{owner[0]}.db')
+            self._owner = owner
+        return self._file
+
+    def increment(self, key, amount=1.0):
+        with self._lock:
+            self._process_file().increment(key, amount)
+
+    @staticmethod
+    def collect(directory):
+        """先合并已退出进程的文件，再汇总目录中所有文件，返回 {键: 值}"""
+        merge_dead_processes(directory)
+        totals = defaultdict(float)
+        # 文件名中 PID 的数字排在 archive 之前，读取期间被其他进程合并的文件已计入合并文件
+        for path in sorted(Path(directory).glob('metrics_*.db')):
+            try:
+                entries = _read_file(path)
+            except FileNotFoundError:
+                continue
+            for key, value in entries.items():
+                totals[key] += value
+        return totals
+
+
+store = MetricsStore()
+REGISTRY = {}
+
+
+def _key(name, suffix, labels):
+    return json.dumps([name, suffix, labels], ensure_ascii=False, sort_keys=True)
+
+
+class Counter:
+    """单调递增计数器"""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY[name] = self
+
+    def inc(self, amount=1, **labels):
+        if settings.METRICS_ENABLED:
+            store.increment(_key(self.name, '_total', labels), amount)
+
+    def samples(self, entries):
+        for suffix, labels, value in sorted(entries, key=_sample_order):
+            yield f'{self.name}{suffix}', labels, value
+
+
+class Histogram:
+    """直方图：按桶计数，输出时累加为 Prometheus 的累计桶"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        REGISTRY[name] = self
+
+    def observe(self, value, **labels):
+        if not settings.METRICS_ENABLED:
+            return
+        bound = next((b for b in self.buckets if value <= b), '+Inf')
+        store.increment(_key(self.name, '_bucket', dict(labels, le=_format_bound(bound))))
+        store.increment(_key(self.name, '_sum', labels), value)
+        store.increment(_key(self.name, '_count', labels))
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self, entries):
+        series = defaultdict(dict)
+        for suffix, labels, value in entries:
+            base = {k: v for k, v in labels.items() if k != 'le'}
+            series[json.dumps(base, sort_keys=True)][(suffix, labels.get('le'))] = value
+        for base_key in sorted(series):
+            base = json.loads(base_key)
+            values_by_suffix = series[base_key]
+            cumulative = 0.0
+            for bound in [_format_bound(b) for b in self.buckets] + ['+Inf']:
+                cumulative += values_by_suffix.get(('_bucket', bound), 0.0)
+                yield f'{self.name}_bucket', dict(base, le=bound), cumulative
+            yield f'{self.name}_sum', base, values_by_suffix.get(('_sum', None), 0.0)
+            yield f'{self.name}_count', base, values_by_suffix.get(('_count', None), 0.0)
+
+
+def _format_bound(bound):
+    return bound if isinstance(bound, str) else repr(float(bound))
+
+
+def _sample_order(entry):
+    suffix, labels, _ = entry
+    return suffix, sorted(labels.items())
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', r'\\').replace('\n', r'\n').replace('"', r'\"')
+
+
+def render_metrics(directory=None):
+    """生成 Prometheus 文本格式（0.0.4）"""
+    grouped = defaultdict(list)
+    for key, value in MetricsStore.collect(directory or settings.METRICS_DIR).items():
+        name, suffix, labels = json.loads(key)
+        grouped[name].append((suffix, labels, value))
+
+    lines = []
+    for name, metric in sorted(REGISTRY.items()):
+        lines.append(f'# HELP {name} {metric.documentation}')
+        lines.append(f'# TYPE {name} {metric.type}')
+        for sample, labels, value in metric.samples(grouped[name]):
+            label_text = ','.join(f'{k}="{_escape(v)}"' for k, v in labels.items())
+            lines.append(f'{sample}{{{label_text}}} {_format_value(value)}' if label_text
+                         else f'{sample} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus 抓取端点"""
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# 指标定义
+REQUESTS = Counter(
+    'railway_http_requests', '按URL名称、方法与状态码统计的请求数', ['view', 'method', 'status'])
+REQUEST_LATENCY = Histogram(
+    'railway_http_request_duration_seconds', '按URL名称统计的请求耗时', ['view', 'method'])
+DB_CONNECTIONS = Counter(
+    'railway_db_connections_opened', '新建数据库连接数', ['alias'])
+DB_QUERIES = Counter(
+    'railway_db_queries', '执行的SQL语句数', ['alias'])
+DB_QUERY_SECONDS = Counter(
+    'railway_db_query_seconds', 'SQL执行累计耗时（秒）', ['alias'])
+CACHE_REQUESTS = Counter(
+    'railway_cache_requests', '分析缓存查找次数（result=hit/miss）', ['cache', 'result'])
+IMPORT_DURATION = Histogram(
+    'railway_import_duration_seconds', '数据导入与派生表重建耗时', ['job'], buckets=JOB_BUCKETS)
+JOBS_SUBMITTED = Counter(
+    'railway_jobs_submitted', '后台任务提交次数（result=created/deduplicated）', ['kind', 'result'])
+JOB_DURATION = Histogram(
+    'railway_job_duration_seconds', '后台任务执行耗时', ['kind', 'status'], buckets=JOB_BUCKETS)
+
+
+def record_cache(cache, hit):
+    """记录一次缓存查找（命中率 = hit / (hit + miss)）"""
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def _count_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        alias = context['connection'].alias
+        DB_QUERIES.inc(alias=alias)
+        DB_QUERY_SECONDS.inc(time.perf_counter() - started, alias=alias)
+
+
+def install_query_metrics(connection):
+    # 插到最前面，避免被 connection.execute_wrapper() 退出时弹出（见 middleware.install_query_profiler）
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+@receiver(connection_created)
+def _track_new_connection(sender, connection, **kwargs):
+    if settings.METRICS_ENABLED:
+        DB_CONNECTIONS.inc(alias=connection.alias)
+        install_query_metrics(connection)
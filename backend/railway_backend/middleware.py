@@ -0,0 +1,204 @@
+import heapq
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+slow_request_logger = logging.getLogger('railway_backend.slow_requests')
+
+# 当前请求的剖析数据；sync_to_async 与分析查询线程池会复制上下文，
+# 因此这些线程中执行的 SQL 也会计入同一请求
+_current_profile = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """单个请求的耗时与SQL统计"""
+
+    def __init__(self, top_statements):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.view_started = None
+        self.view_time = None
+        self.render_started = None
+        self.render_time = 0.0
+        self._top_statements = top_statements
+        self._slowest = []
+        self._lock = threading.Lock()
+
+    def record_query(self, sql, duration):
+        with self._lock:
+            self.query_count += 1
+            self.sql_time += duration
+            if len(self._slowest) < self._top_statements:
+                heapq.heappush(self._slowest, (duration, self.query_count, sql))
+            elif duration > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, (duration, self.query_count, sql))
+
+    @property
+    def slowest_statements(self):
+        return [(duration, sql) for duration, _, sql in sorted(self._slowest, reverse=True)]
+
+
+def _profile_query(execute, sql, params, many, context):
+    """execute_wrapper：有活动剖析时记录SQL耗时"""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - started)
+
+
+def install_query_profiler(connection):
+    """每个连接只安装一次，由 _current_profile 决定是否记录
+
+    插到包装器列表最前面：connection.execute_wrapper() 退出时弹出的是列表末尾，
+    在其作用范围内新建连接时追加到末尾会被误弹出，同时留下调用方的包装器。
+    """
+    if _profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _profile_query)
+
+
+@receiver(connection_created)
+def _install_on_new_connection(sender, connection, **kwargs):
+    if settings.REQUEST_PROFILING_ENABLED:
+        install_query_profiler(connection)
+
+
+class RequestProfilingMiddleware:
+    """记录每个请求的SQL次数与耗时、最慢语句、视图与序列化耗时
+
+    结果以 Server-Timing 响应头返回，超过 SLOW_REQUEST_THRESHOLD_MS 的请求
+    写入慢请求日志。REQUEST_PROFILING_ENABLED 关闭时中间件不会挂载。
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.threshold = settings.SLOW_REQUEST_THRESHOLD_MS / 1000
+        self.top_statements = settings.SLOW_REQUEST_TOP_STATEMENTS
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for alias in connections:
+            install_query_profiler(connections[alias])
+        profile = RequestProfile(self.top_statements)
+        token = _current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = RequestProfile(self.top_statements)
+        token = _current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_profile.reset(token)
+        return self.finish(request, response, profile)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.view_started = time.perf_counter()
+        return None
+
+    def process_template_response(self, request, response):
+        """视图返回待渲染响应（DRF Response）时，区分视图与序列化耗时"""
+        profile = _current_profile.get()
+        if profile is not None and profile.view_started is not None:
+            profile.render_started = time.perf_counter()
+            profile.view_time = profile.render_started - profile.view_started
+
+            def render_finished(rendered):
+                profile.render_time = time.perf_counter() - profile.render_started
+            response.add_post_render_callback(render_finished)
+        return response
+
+    def finish(self, request, response, profile):
+        total = time.perf_counter() - profile.started
+        view_time = profile.view_time
+        if view_time is None and profile.view_started is not None:
+            view_time = total - (profile.view_started - profile.started)
+
+        metrics = [
+            f'db;dur={profile.sql_time * 1000:.1f};desc="{profile.query_count} queries"',
+        ]
+        if view_time is not None:
+            metrics.append(f'view;dur={view_time * 1000:.1f}')
+        if profile.render_time:
+            metrics.append(f'render;dur={profile.render_time * 1000:.1f};desc="serialization"')
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(metrics)
+
+        if total >= self.threshold:
+            self.log_slow_request(request, response, profile, total, view_time)
+        return response
+
+    def log_slow_request(self, request, response, profile, total, view_time):
+        lines = [
+            f'{request.method} {request.get_full_path()} {response.status_code} '
+            f'total={total * 1000:.1f}ms '
+            f'view={(view_time or 0) * 1000:.1f}ms '
+            f'render={profile.render_time * 1000:.1f}ms '
+            f'sql={profile.sql_time * 1000:.1f}ms queries={profile.query_count}'
+        ]
+        for duration, sql in profile.slowest_statements:
+            lines.append(f'    {duration * 1000:.1f}ms  {sql}')
+        slow_request_logger.warning('\n'.join(lines))
+
+
+class MetricsMiddleware:
+    """按URL名称记录请求数与耗时直方图，供 /metrics 输出；METRICS_ENABLED 关闭时不挂载"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for alias in connections:
+            metrics.install_query_metrics(connections[alias])
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def record(request, response, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.REQUESTS.inc(view=view, method=request.method, status=str(response.status_code))
+        metrics.REQUEST_LATENCY.observe(duration, view=view, method=request.method)
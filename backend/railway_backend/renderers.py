@@ -0,0 +1,48 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+# ?layout=columnar：图表接口按列返回，直接对应 ECharts 的数组数据
+COLUMNAR_LAYOUT = 'columnar'
+
+_fallback_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """基于 orjson 的 JSON 渲染器
+
+    orjson 无法直接处理的类型（Decimal、惰性翻译字符串等）交给 DRF 的 JSONEncoder.default，
+    与默认渲染器输出一致；NaN 输出为 null。
+    """
+    options = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        options = self.options
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_fallback_encoder.default, option=options)
+
+
+def is_columnar(request):
+    return request.query_params.get('layout') == COLUMNAR_LAYOUT
+
+
+def serializer_columns(serializer_class):
+    """按序列化器字段生成 {输出列名: 行内键}，列式与行式输出的字段名保持一致"""
+    return {name: field.source for name, field in serializer_class().fields.items()}
+
+
+def to_columnar(rows, columns):
+    """将行字典列表转为 {"columns": [...], "data": {列名: [...]}}，不逐行实例化序列化器
+
+    columns 为列名列表或 {输出列名: 行内键} 映射。
+    """
+    if not isinstance(columns, dict):
+        columns = {name: name for name in columns}
+    return {
+        'columns': list(columns),
+        'data': {name: [row[key] for row in rows] for name, key in columns.items()},
+    }
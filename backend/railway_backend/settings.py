@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -41,9 +42,12 @@ INSTALLED_APPS = [
     'corsheaders',
     'data_management',
     'analytics',
+    'jobs',
 ]
 
 MIDDLEWARE = [
+    'railway_backend.middleware.MetricsMiddleware',
+    'railway_backend.middleware.RequestProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -78,13 +82,59 @@ WSGI_APPLICATION = 'railway_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# 数据库配置档：development（默认）或 production，通过环境变量 RAILWAY_DB_PROFILE 选择
+DATABASE_PROFILE = os.environ.get('RAILWAY_DB_PROFILE', 'development')
+
+DATABASE_PATH = BASE_DIR / 'db' / 'railway.sqlite3'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db' / 'railway.sqlite3',
+        'NAME': DATABASE_PATH,
     }
 }
 
+# 分析类只读查询使用的连接别名
+ANALYTICS_DATABASE = 'default'
+
+# 新建 SQLite 连接时执行的 PRAGMA（见 data_management/db.py）
+SQLITE_PRAGMAS = {}
+
+# 后台任务队列使用独立的 SQLite 文件：导入等长事务持有数据库写锁时，任务进度与状态仍可写入
+JOBS_DATABASE = 'jobs'
+DATABASES[JOBS_DATABASE] = {
+    'ENGINE': 'django.db.backends.sqlite3',
+    'NAME': BASE_DIR / 'db' / 'jobs.sqlite3',
+    'OPTIONS': {'timeout': 20},
+}
+
+DATABASE_ROUTERS = ['jobs.db.JobsDatabaseRouter', 'data_management.db.ReadOnlyDatabaseRouter']
+
+if DATABASE_PROFILE == 'production':
+    # 持久连接；导入期间写锁等待上限 20 秒
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+    })
+    # 分析查询走独立的只读连接，WAL 模式下不会被导入事务阻塞
+    DATABASES['analytics'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': f'file:{DATABASE_PATH}?mode=ro',
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+    ANALYTICS_DATABASE = 'analytics'
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 268435456,
+        'cache_size': -65536,
+        'temp_store': 'MEMORY',
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -133,9 +183,92 @@ CORS_ALLOW_CREDENTIALS = True
 
 # REST Framework settings
 REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': [
+        'railway_backend.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
 }
+
+# Passenger flow partitioning
+# 批量导入的客运记录按月写入 passenger_flow_YYYYMM 分区表；关闭后写入单表
+PASSENGER_FLOW_PARTITIONING = os.environ.get('RAILWAY_FLOW_PARTITIONS', '1') == '1'
+# 早于最近 FLOW_HOT_MONTHS 个月（以最新分区为基准）的分区可归档为 FLOW_ARCHIVE_DIR 下的 Parquet 文件，
+# 分析聚合会合并归档数据
+FLOW_ARCHIVE_DIR = Path(os.environ.get('RAILWAY_FLOW_ARCHIVE_DIR', BASE_DIR / 'archive'))
+FLOW_HOT_MONTHS = int(os.environ.get('RAILWAY_FLOW_HOT_MONTHS', '6'))
+
+# Calendar dimension
+# 节假日定义文件（CSV：name, kind, start_date, end_date），迁移时导入，import_holidays 命令可重新导入
+CALENDAR_HOLIDAYS_FILE = Path(os.environ.get(
+    'RAILWAY_HOLIDAYS_FILE', BASE_DIR / 'data_management' / 'holidays.csv'
+))
+
+# Analytics settings
+# 异步分析视图并发执行查询的线程数（即占用的数据库连接上限）
+ANALYTICS_QUERY_WORKERS = 4
+# 数据变更推送（/api/analytics/events/）：检查数据版本的间隔、无事件时的保活间隔、单个事件流的最长时长（秒）
+EVENTS_POLL_INTERVAL = 0.5
+EVENTS_KEEPALIVE_SECONDS = 15
+EVENTS_STREAM_SECONDS = 300
+
+# Background jobs settings
+# run_jobs 默认的工作线程数；空闲时检查新任务的间隔（秒）
+JOB_WORKERS = int(os.environ.get('RAILWAY_JOB_WORKERS', '2'))
+JOB_POLL_INTERVAL = 1.0
+# 执行中任务的心跳间隔；心跳超过 JOB_STALE_SECONDS 未更新的任务视为工作进程已退出（秒）
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = 120
+# 任务结果文件（导出文件等）的保存目录
+JOB_RESULT_DIR = Path(os.environ.get('RAILWAY_JOB_RESULT_DIR', BASE_DIR / 'job_results'))
+
+# Request profiling settings
+# 请求剖析：SQL 次数与耗时、视图与序列化耗时写入 Server-Timing 响应头；关闭时中间件不挂载。
+# 默认只在 DEBUG 下开启，生产环境通过 RAILWAY_REQUEST_PROFILING=1 启用
+REQUEST_PROFILING_ENABLED = os.environ.get('RAILWAY_REQUEST_PROFILING', '1' if DEBUG else '0') == '1'
+# 超过该耗时（毫秒）的请求写入慢请求日志
+SLOW_REQUEST_THRESHOLD_MS = int(os.environ.get('RAILWAY_SLOW_REQUEST_MS', '500'))
+# 慢请求日志中记录的最慢SQL条数
+SLOW_REQUEST_TOP_STATEMENTS = 5
+
+# Metrics settings
+# /metrics 端点与请求指标采集；各进程的指标文件写入 METRICS_DIR，抓取时汇总。
+# 开启后每条SQL都会计数，管理命令与任务进程同样如此，因此默认关闭，部署时通过 RAILWAY_METRICS=1 启用
+METRICS_ENABLED = os.environ.get('RAILWAY_METRICS', '0') == '1'
+METRICS_DIR = Path(os.environ.get('RAILWAY_METRICS_DIR', BASE_DIR / 'metrics'))
+
+# 慢请求日志目录，首次写入时创建
+LOG_DIR = Path(os.environ.get('RAILWAY_LOG_DIR', BASE_DIR / 'logs'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'timestamped': {
+            'format': '{asctime} {message}',
+            'style': '{',
+        },
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'railway_backend.logs.LazyRotatingFileHandler',
+            'filename': LOG_DIR / 'slow_requests.log',
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'encoding': 'utf-8',
+            'delay': True,
+            'formatter': 'timestamped',
+        },
+    },
+    'loggers': {
+        'railway_backend.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
@@ -18,6 +18,9 @@ from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 from data_management import views as data_views
+from analytics import views as analytics_views
+from jobs import views as job_views
+from railway_backend.metrics import metrics_view
 
 router = routers.DefaultRouter()
 router.register(r'stations', data_views.StationViewSet)
@@ -25,11 +28,26 @@ router.register(r'trains', data_views.TrainViewSet)
 router.register(r'routes', data_views.RouteViewSet)
 router.register(r'route-stations', data_views.RouteStationViewSet)
 router.register(r'passenger-flows', data_views.PassengerFlowViewSet)
+router.register(r'analytics/station-roles', analytics_views.StationRoleViewSet)
+router.register(r'analytics/trains', analytics_views.TrainTimetableViewSet)
+router.register(r'analytics/train-occupancy', analytics_views.TrainOccupancyViewSet)
+router.register(r'analytics/anomalies', analytics_views.FlowAnomalyViewSet)
+router.register(r'jobs', job_views.JobViewSet)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', include(router.urls)),
     path('api/analytics/flow/', data_views.FlowAnalysisView.as_view(), name='flow-analysis'),
+    path('api/analytics/trend/', analytics_views.TrendAnalysisView.as_view(), name='flow-trend'),
+    path('api/analytics/calendar/', analytics_views.CalendarAnalysisView.as_view(), name='flow-calendar'),
+    path('api/analytics/overview/', analytics_views.AnalyticsOverviewView.as_view(), name='analytics-overview'),
+    path('api/analytics/batch/', analytics_views.BatchAnalyticsView.as_view(), name='analytics-batch'),
+    path('api/analytics/events/', analytics_views.DataEventsView.as_view(), name='analytics-events'),
+    path('api/analytics/occupancy/trains/', analytics_views.OccupancyDistributionView.as_view(group='train'),
+         name='occupancy-trains'),
+    path('api/analytics/occupancy/routes/', analytics_views.OccupancyDistributionView.as_view(group='route'),
+         name='occupancy-routes'),
     # 数据管理API
     path('api/data/stats/', data_views.DataStatsView.as_view(), name='data-stats'),
     path('api/data/records/', data_views.DataRecordsView.as_view(), name='data-records'),
@@ -87,6 +87,22 @@ export interface TrendData {
   total: number
   inbound: number
   outbound: number
+  previousTotal?: number | null
+  growthRate?: number | null
+}
+
+export type CalendarGroupBy = 'weekday' | 'dayType' | 'holiday' | 'holidayPeriod' | 'isoWeek' | 'month' | 'quarter'
+
+export interface CalendarGroupData {
+  group: string
+  days: number
+  total: number
+  inbound: number
+  outbound: number
+  revenue: number
+  averagePerDay: number
+  previousTotal: number | null
+  growthRate: number | null
 }
 
 export interface TimePeriodData {
@@ -106,9 +122,65 @@ export interface TrainRecord {
   arrivalStation: string
   departureTime: string
   arrivalTime: string
-  occupancy: number
+  occupancy: number | null
   status: 'running' | 'scheduled' | 'delayed' | 'cancelled'
   statusText: string
+  routeId: number | null
+  stopCount: number
+  totalDistance: number | null
+  travelMinutes: number | null
+  averageSpeed: number | null
+  daysOperated: number
+  firstDate: string
+  lastDate: string
+}
+
+export interface TrainTimetableStop {
+  stopIndex: number
+  stationId: number
+  stationName: string
+  arrivalTime: string | null
+  departureTime: string | null
+  dwellSeconds: number | null
+  sectionDistance: number | null
+  sectionSeconds: number | null
+  sectionSpeed: number | null
+  daysObserved: number
+}
+
+export interface TrainTimetable extends TrainRecord {
+  stops: TrainTimetableStop[]
+}
+
+export interface OccupancyDistribution {
+  id: number | null
+  name: string | null
+  days: number
+  overloadedDays: number
+  overloadRate: number
+  averageLoadFactor: number | null
+  medianPeakLoadFactor: number | null
+  p90PeakLoadFactor: number | null
+  maxPeakLoadFactor: number | null
+  maxLoad: number
+  peakLoadFactorDistribution: Record<string, number>
+}
+
+export interface FlowAnomaly {
+  id: number
+  scope: 'station' | 'route'
+  station: number | null
+  station_name: string | null
+  route: number | null
+  route_name: string | null
+  operation_date: string
+  kind: 'gap' | 'spike' | 'drop'
+  passengers: number
+  expected: number
+  robust_score: number
+  seasonal_expected: number | null
+  seasonal_score: number | null
+  computed_at: string
 }
 
 // 数据管理相关接口
@@ -211,6 +283,8 @@ export interface DataStats {
     uploadedAt: string
     records: number
   }>
+  // 按 coverage=day/month 请求时返回各运行日（月）的记录数
+  coverage?: Array<{ date: string; records: number }>
 }
 
 export interface ValidationIssue {
@@ -230,6 +304,50 @@ export interface DataValidationDetailedResult {
   issues: ValidationIssue[]
 }
 
+// 数据变更事件（/analytics/events/）
+export interface DataEventKpis {
+  total_passengers: number
+  passengers_in: number
+  passengers_out: number
+  total_revenue: number
+  train_count: number
+  station_count: number
+  min_date: string | null
+  max_date: string | null
+}
+
+export interface DataEventSnapshot {
+  versions: Record<string, number>
+  kpis: DataEventKpis
+}
+
+export interface DataChangeEvent {
+  tables: string[]
+  versions: Record<string, number>
+  kpis?: DataEventKpis
+  deltas?: Partial<Record<keyof DataEventKpis, number>>
+}
+
+// 后台任务（/jobs/）
+export type JobKind = 'import_data' | 'refresh_analytics' | 'archive_partitions' | 'export_flows'
+
+export interface Job {
+  id: string
+  kind: JobKind
+  params: Record<string, unknown>
+  status: 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+  status_display: string
+  progress: number
+  message: string
+  result: unknown
+  has_result_file: boolean
+  error: string
+  cancel_requested: boolean
+  created_at: string
+  started_at: string | null
+  finished_at: string | null
+}
+
 // API接口定义
 export const apiService = {
   // KPI数据
@@ -343,9 +461,20 @@ export const apiService = {
   },
 
   // 趋势数据
-  getTrendData: (timeRange: TimeRange, frequency: 'hourly' | 'daily' | 'weekly' | 'monthly') => {
+  getTrendData: (
+    timeRange: TimeRange,
+    frequency: 'hourly' | 'daily' | 'weekly' | 'monthly',
+    compare: 'yoy' | 'pop' = 'yoy'
+  ) => {
     return api.get<TrendData[]>('/analytics/trend/', {
-      params: { ...timeRange, frequency }
+      params: { ...timeRange, frequency, compare }
+    })
+  },
+
+  // 按日历属性（星期、节假日、运输高峰期等）分组的客流及上年同期对比
+  getCalendarData: (timeRange: TimeRange, groupBy: CalendarGroupBy = 'weekday') => {
+    return api.get<CalendarGroupData[]>('/analytics/calendar/', {
+      params: { ...timeRange, groupBy }
     })
   },
 
@@ -367,11 +496,53 @@ export const apiService = {
     })
   },
 
+  // 单趟列车时刻表（规范停站序列与区间运行时分）
+  getTrainTimetable: (trainId: number) => {
+    return api.get<TrainTimetable>(`/analytics/trains/${trainId}/`)
+  },
+
+  // 按车次/线路汇总的满载率分布（超员运行日占比高的排在前面）
+  getOccupancyDistribution: (timeRange: TimeRange, group: 'trains' | 'routes' = 'trains') => {
+    return api.get<OccupancyDistribution[]>(`/analytics/occupancy/${group}/`, { params: timeRange })
+  },
+
+  // 站点/线路日客流异常（数据缺失、突增、突降），按日期倒序分页
+  getFlowAnomalies: (
+    timeRange: TimeRange,
+    filters: { scope?: 'station' | 'route'; kind?: 'gap' | 'spike' | 'drop'; page?: number } = {}
+  ) => {
+    return api.get<{ count: number; next: string | null; previous: string | null; results: FlowAnomaly[] }>(
+      '/analytics/anomalies/',
+      {
+        params: {
+          operation_date__gte: timeRange.startDate,
+          operation_date__lte: timeRange.endDate,
+          ...filters
+        }
+      }
+    )
+  },
+
   // 数据刷新
   refreshData: (timeRange: TimeRange) => {
     return api.post('/analytics/refresh/', timeRange)
   },
 
+  // 订阅数据变更推送（断线后浏览器自动重连并重新收到快照），返回取消订阅函数
+  subscribeDataEvents: (handlers: {
+    onSnapshot?: (snapshot: DataEventSnapshot) => void
+    onChange?: (change: DataChangeEvent) => void
+  }) => {
+    const source = new EventSource(`${API_BASE_URL}/analytics/events/`)
+    source.addEventListener('snapshot', (event) => {
+      handlers.onSnapshot?.(JSON.parse((event as MessageEvent).data))
+    })
+    source.addEventListener('change', (event) => {
+      handlers.onChange?.(JSON.parse((event as MessageEvent).data))
+    })
+    return () => source.close()
+  },
+
   // 数据导出
   exportData: (timeRange: TimeRange, format: 'csv' | 'excel' | 'json') => {
     return api.get('/analytics/export/', {
@@ -467,8 +638,28 @@ export const apiService = {
     })
   },
 
-  // 数据统计
-  getDataStats: () => {
+  // 提交后台任务（相同类型与参数的未结束任务会被复用）
+  submitJob: (kind: JobKind, params: Record<string, unknown> = {}) => {
+    return api.post<Job>('/jobs/', { kind, params })
+  },
+
+  // 查询后台任务状态与进度
+  getJob: (id: string) => {
+    return api.get<Job>(`/jobs/${id}/`)
+  },
+
+  // 取消后台任务
+  cancelJob: (id: string) => {
+    return api.post<Job>(`/jobs/${id}/cancel/`)
+  },
+
+  // 下载后台任务结果文件
+  downloadJobResult: (id: string) => {
+    return api.get(`/jobs/${id}/result/`, { responseType: 'blob' })
+  },
+
+  // 数据统计（coverage 指定时附带各运行日/月的记录数）
+  getDataStats: (coverage?: 'day' | 'month', range?: { startDate?: string; endDate?: string }) => {
     return api.get<{
       totalRecords: number
       stations: number
@@ -479,7 +670,8 @@ export const apiService = {
         uploadedAt: string
         records: number
       }>
-    }>('/data/stats/')
+      coverage?: Array<{ date: string; records: number }>
+    }>('/data/stats/', { params: coverage ? { coverage, ...range } : undefined })
   }
 }
 
@@ -105,14 +105,20 @@ export const passengerService = {
   },
 
   /**
-   * 获取站点客流排名 - 使用Django站点排名API
+   * 获取站点客流排名 - 使用Django站点排名API（limit/offset 分页、metric 排名指标在后端完成）
    */
-  async getStationRankings(params: AnalysisRequest): Promise<StationRanking[]> {
+  async getStationRankings(
+    params: AnalysisRequest,
+    options: { limit?: number; offset?: number; metric?: 'total' | 'in' | 'out' | 'revenue' } = {}
+  ): Promise<StationRanking[]> {
     try {
       // 构建查询参数
       const queryParams = new URLSearchParams();
       if (params.startDate) queryParams.append('start_date', params.startDate);
       if (params.endDate) queryParams.append('end_date', params.endDate);
+      if (options.limit) queryParams.append('limit', String(options.limit));
+      if (options.offset) queryParams.append('offset', String(options.offset));
+      if (options.metric) queryParams.append('metric', options.metric);
 
       const response = await apiClient.get(`/passenger-flows/station_ranking/?${queryParams}`);
       const backendData = response;
@@ -217,10 +223,10 @@ export const passengerService = {
   async getSpatialDistribution(params: AnalysisRequest): Promise<SpatialDistribution[]> {
     try {
       // 获取站点排名数据
-      const stationRankings = await this.getStationRankings(params);
+      const stationRankings = await this.getStationRankings(params, { limit: 20 });
 
       // 模拟地理坐标（实际项目中应从数据库获取）
-      const spatialDistribution: SpatialDistribution[] = stationRankings.slice(0, 20).map((station, index) => {
+      const spatialDistribution: SpatialDistribution[] = stationRankings.map((station, index) => {
         // 为前20个站点生成模拟坐标（成都-重庆区域）
         const baseLat = 30.6595; // 成都纬度
         const baseLng = 104.0659; // 成都经度